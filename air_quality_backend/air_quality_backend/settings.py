@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'predictions.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -128,6 +130,103 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Repository root, home of data_processing.py and its outputs
+PROJECT_ROOT = BASE_DIR.parent
+
+# Trained models (written by data_processing.py in the project root)
+PREDICTION_MODEL_DIR = PROJECT_ROOT
+
+# Seconds between checks for retrained models on disk
+PREDICTION_MODEL_CHECK_INTERVAL = 5.0
+
+# joblib mmap_mode for model arrays, shared read-only across workers
+PREDICTION_MODEL_MMAP_MODE = 'r'
+
+# Bundle versions to serve instead of the manifest's current ones, e.g.
+# {'ground': '3'} to roll the ground model back
+PREDICTION_MODEL_VERSIONS = {}
+
+# Bundles kept per data type when a new version is published; the
+# manifest's current version and pinned versions are never pruned
+PREDICTION_MODEL_KEEP_VERSIONS = 3
+
+# Serve models through their compiled.npz NumPy export when present;
+# tree models only for requests of up to PREDICTION_COMPILED_MAX_ROWS rows
+PREDICTION_COMPILED_MODELS = True
+PREDICTION_COMPILED_MAX_ROWS = 32
+
+# Threads the async prediction views run model loading and inference on,
+# and how many calls may be running or queued before they answer 503
+PREDICTION_INFERENCE_THREADS = 4
+PREDICTION_INFERENCE_MAX_PENDING = 64
+
+# Largest number of scenarios accepted by predict-custom/batch/
+PREDICTION_BATCH_MAX_SCENARIOS = 10000
+
+# get_data_points page size: default and hard cap for ?limit=
+DATA_POINTS_PAGE_SIZE = 100
+DATA_POINTS_MAX_PAGE_SIZE = 1000
+
+# Memoized get_predictions results. BACKEND is 'locmem' (per-process LRU)
+# or 'django' (the CACHES entry named CACHE_ALIAS, shared by workers)
+PREDICTION_CACHE = {
+    'BACKEND': 'locmem',
+    'TTL': 300,
+    'MAX_ENTRIES': 256,
+    'CACHE_ALIAS': 'default',
+}
+
+# api/stream/ server-sent events: seconds between DataPoint polls and
+# between heartbeats, per-client queue length before a client is reset,
+# most rows replayed for a Last-Event-ID, and seconds before a stream
+# ends and the client reconnects
+EVENT_STREAM = {
+    'POLL_INTERVAL': 1.0,
+    'POLL_BATCH': 1000,
+    'QUEUE_SIZE': 1000,
+    'HEARTBEAT': 15.0,
+    'REPLAY_LIMIT': 1000,
+    'MAX_SECONDS': 300.0,
+}
+
+# Degree size of the grid cells DataPointRollup also keeps per-cell rows
+# for; None keeps only per-data-type rollups
+ROLLUP_CELL_SIZE = None
+
+# Where predict_next_7_days gets its 7-day window: 'raw' reads every
+# DataPoint in the window, giving exactly the features the models were
+# trained on; 'rollup' (opt-in) sums the hourly DataPointRollup rows in one
+# query, but approximates the median from hourly means and starts the
+# window on the hour, so its features drift slightly from training
+PREDICTION_WINDOW_SOURCE = 'raw'
+
+# Per data_type retention for apply_retention. Raw DataPoints older than
+# RAW_DAYS and hourly rollups older than HOURLY_DAYS are deleted; daily
+# rollups are kept. None keeps forever; at least 7 days either way
+DATAPOINT_RETENTION = {
+    'ground': {'RAW_DAYS': None, 'HOURLY_DAYS': None},
+    'satellite': {'RAW_DAYS': 30, 'HOURLY_DAYS': 365},
+}
+
+# JSON lines on stderr for the predictions app, at PREDICTIONS_LOG_LEVEL;
+# request and inference metrics are served separately at /metrics
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'predictions.log.JSONFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'predictions': {
+            'handlers': ['console'],
+            'level': os.environ.get('PREDICTIONS_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,237 @@
+import fcntl
+import importlib
+import json
+import os
+import platform
+import re
+import shutil
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import sklearn
+
+from .compiled import compile_model
+
+# Bump when the bundle layout or the meaning of metadata.json changes
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "models_manifest.json"
+MANIFEST_LOCK_NAME = MANIFEST_NAME + ".lock"
+ARTIFACTS_DIR = "artifacts"
+METADATA_NAME = "metadata.json"
+KEEP_VERSIONS = 3
+COMPRESSION = "zlib"
+# Read for the keep count and pinned versions when Django is not running,
+# as in data_processing.py
+DEFAULT_SETTINGS = "air_quality_backend.settings"
+
+_VERSION_DIR = re.compile(r"^v(\d+)$")
+
+Bundle = namedtuple("Bundle", ["metadata", "model", "scaler", "context"])
+
+
+class ArtifactStore:
+    """Versioned model bundles, written by data_processing.py and served by the registry.
+
+    Every published model is one directory, <root>/artifacts/<type>/v<N>/:
+
+        model.pkl, scaler.pkl   joblib pickles
+        compiled.npz            flat NumPy export (see compiled.py), when supported
+        context.pkl             trailing training rows for incremental updates, optional
+        metadata.json           files, feature schema, training metrics, timings,
+                                data fingerprint and library versions
+
+    A bundle is written into a scratch directory and renamed into place,
+    then <root>/models_manifest.json is replaced to point the data type at
+    it, so readers see the previous or the new version and never a partial
+    one. Writers take an exclusive flock on models_manifest.json.lock
+    around that read-modify-replace, so processes publishing different
+    data types at once do not drop each other's entries. Only the newest keep bundles of a data type stay on disk, plus the
+    manifest's current version and any version in pinned_versions
+    ({data_type: version}, the versions the registry is pinned to).
+
+    compress=0 writes plain pickles that the registry loads with mmap_mode,
+    sharing the arrays through the page cache; compress=1..9 writes zlib
+    pickles that are several times smaller but copied into memory on
+    load. metadata.json records which variant a bundle is.
+    """
+
+    def __init__(self, root, keep=KEEP_VERSIONS, pinned_versions=None):
+        self.root = str(root)
+        self.keep = keep
+        self.pinned_versions = {key: str(value) for key, value in (pinned_versions or {}).items()}
+
+    @classmethod
+    def from_settings(cls, root=None):
+        """Store with the backend's keep count and pins, with or without Django running
+
+        Outside Django (no DJANGO_SETTINGS_MODULE and nothing configured)
+        the default settings module is imported directly.
+        """
+        from django.conf import settings
+
+        if not settings.configured and "DJANGO_SETTINGS_MODULE" not in os.environ:
+            settings = importlib.import_module(DEFAULT_SETTINGS)
+        return cls(
+            root if root is not None else settings.PREDICTION_MODEL_DIR,
+            keep=getattr(settings, "PREDICTION_MODEL_KEEP_VERSIONS", KEEP_VERSIONS),
+            pinned_versions=getattr(settings, "PREDICTION_MODEL_VERSIONS", None),
+        )
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def bundle_dir(self, data_type, version):
+        return os.path.join(self.root, ARTIFACTS_DIR, data_type, f"v{version}")
+
+    def read_manifest(self):
+        """{data_type: entry} from the manifest, empty when there is none"""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def versions(self, data_type):
+        """Versions of data_type on disk, oldest first"""
+        try:
+            names = os.listdir(os.path.join(self.root, ARTIFACTS_DIR, data_type))
+        except FileNotFoundError:
+            return []
+        return sorted(int(match.group(1)) for match in map(_VERSION_DIR.match, names) if match)
+
+    def current_version(self, data_type):
+        """Version the manifest points data_type at, or None"""
+        entry = self.read_manifest().get(data_type)
+        return str(entry["version"]) if entry and "bundle" in entry else None
+
+    def read_metadata(self, data_type, version=None):
+        """metadata.json of a bundle (the current one by default), or None"""
+        version = version if version is not None else self.current_version(data_type)
+        if version is None:
+            return None
+        try:
+            with open(os.path.join(self.bundle_dir(data_type, version), METADATA_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load(self, data_type, version=None, mmap_mode=None):
+        """Bundle of a version (the current one by default), or None
+
+        mmap_mode only applies to uncompressed bundles.
+        """
+        metadata = self.read_metadata(data_type, version)
+        if metadata is None:
+            return None
+        bundle_dir = self.bundle_dir(data_type, metadata["version"])
+        files = metadata["files"]
+        mmap_mode = mmap_mode if metadata["mmap"] else None
+        context = None
+        if "context" in files:
+            context = joblib.load(os.path.join(bundle_dir, files["context"]))
+        return Bundle(
+            metadata,
+            joblib.load(os.path.join(bundle_dir, files["model"]), mmap_mode=mmap_mode),
+            joblib.load(os.path.join(bundle_dir, files["scaler"]), mmap_mode=mmap_mode),
+            context,
+        )
+
+    def publish(self, data_type, model, scaler, context=None, schema=None, metrics=None,
+                timings=None, data=None, info=None, compress=0):
+        """Write a new bundle, make it the current version and return its metadata
+
+        schema names the features and targets, metrics and timings are the
+        training report, data fingerprints the training data and info holds
+        anything else worth keeping (such as how the model was produced).
+        """
+        parent = os.path.join(self.root, ARTIFACTS_DIR, data_type)
+        os.makedirs(parent, exist_ok=True)
+        previous = self.read_manifest().get(data_type, {}).get("version")
+        known = self.versions(data_type) + ([int(previous)] if str(previous).isdigit() else [])
+        version = str(max(known, default=0) + 1)
+
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        try:
+            files = {"model": "model.pkl", "scaler": "scaler.pkl"}
+            compression = (COMPRESSION, compress) if compress else 0
+            joblib.dump(model, os.path.join(tmp_dir, files["model"]), compress=compression)
+            joblib.dump(scaler, os.path.join(tmp_dir, files["scaler"]), compress=compression)
+            if context is not None:
+                files["context"] = "context.pkl"
+                joblib.dump(context, os.path.join(tmp_dir, files["context"]), compress=compression)
+            try:
+                compile_model(model, scaler).save(os.path.join(tmp_dir, "compiled.npz"))
+                files["compiled"] = "compiled.npz"
+            except TypeError:
+                pass
+
+            metadata = {
+                "format": BUNDLE_FORMAT,
+                "data_type": data_type,
+                "version": version,
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "model_type": type(model).__name__,
+                "compression": f"{COMPRESSION}:{compress}" if compress else None,
+                "mmap": not compress,
+                "files": files,
+                "sizes": {name: os.path.getsize(os.path.join(tmp_dir, filename))
+                          for name, filename in files.items()},
+                "schema": schema,
+                "metrics": metrics or {},
+                "timings": timings or {},
+                "data": data or {},
+                "info": info or {},
+                "environment": {
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "sklearn": sklearn.__version__,
+                },
+            }
+            with open(os.path.join(tmp_dir, METADATA_NAME), "w") as f:
+                json.dump(metadata, f, indent=2, default=str)
+            os.rename(tmp_dir, self.bundle_dir(data_type, version))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self._point_manifest(data_type, metadata)
+        self._prune(data_type, int(version))
+        return metadata
+
+    def _point_manifest(self, data_type, metadata):
+        # The file paths are kept in the entry for readers that predate bundles
+        bundle = os.path.relpath(self.bundle_dir(data_type, metadata["version"]), self.root)
+        entry = {"version": metadata["version"], "bundle": bundle,
+                 "created_at": metadata["created_at"]}
+        for name, filename in metadata["files"].items():
+            entry[name] = os.path.join(bundle, filename)
+        entry["metadata"] = os.path.join(bundle, METADATA_NAME)
+
+        with self._manifest_lock():
+            manifest = self.read_manifest()
+            manifest[data_type] = entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".manifest-", suffix=".json")
+            with os.fdopen(fd, "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+
+    @contextmanager
+    def _manifest_lock(self):
+        # A sidecar file, since the manifest itself is replaced under the lock
+        with open(os.path.join(self.root, MANIFEST_LOCK_NAME), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _prune(self, data_type, newest):
+        protected = {self.current_version(data_type), self.pinned_versions.get(data_type)}
+        for version in self.versions(data_type):
+            if version <= newest - self.keep and str(version) not in protected:
+                shutil.rmtree(self.bundle_dir(data_type, version), ignore_errors=True)
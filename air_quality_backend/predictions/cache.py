@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    "BACKEND": "locmem",
+    "TTL": 300,
+    "MAX_ENTRIES": 256,
+    "CACHE_ALIAS": "default",
+}
+
+
+class LocMemLRUBackend:
+    """In-process LRU with per-entry expiry
+
+    Counters live apart from the entries and are never evicted: a
+    generation dropped by the LRU would restart at 0 and bring back keys
+    of entries that were invalidated.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class DjangoCacheBackend:
+    """Adapter over a configured Django cache, shared between workers"""
+
+    def __init__(self, alias="default"):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, timeout=ttl or None)
+
+    def incr(self, key):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, 0, timeout=None)
+            return self.cache.incr(key)
+
+    def counter(self, key):
+        return self.cache.get(key) or 0
+
+    def clear(self):
+        self.cache.clear()
+
+
+class PredictionCache:
+    """Memoized predictions keyed by data type, model version and data state
+
+    The key combines the model version, the latest timestamp of the data
+    type's DataPoints (one index seek, so hits stay cheap) and a
+    generation counter bumped by invalidate(): the DataPoint signals call
+    it for every save and delete, and load_datapoints, apply_retention
+    and rebuild_rollups for their bulk writes. New data or a new model
+    therefore misses immediately. With the locmem backend the counter is
+    per process, so bulk writes from another process are only seen when
+    they add a newer point or once TTL expires; TTL also bounds how long
+    a result lives as the 7-day window slides.
+    """
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+
+    @classmethod
+    def from_settings(cls):
+        config = dict(DEFAULTS, **getattr(settings, "PREDICTION_CACHE", {}))
+        if config["BACKEND"] == "django":
+            backend = DjangoCacheBackend(config["CACHE_ALIAS"])
+        elif config["BACKEND"] == "locmem":
+            backend = LocMemLRUBackend(config["MAX_ENTRIES"])
+        else:
+            raise ValueError(f"unknown PREDICTION_CACHE backend {config['BACKEND']!r}")
+        return cls(backend, ttl=config["TTL"])
+
+    def _generation(self, data_type):
+        return self.backend.counter(f"prediction-generation:{data_type}")
+
+    def key(self, data_type, model_version, latest):
+        latest = latest.isoformat() if latest is not None else "none"
+        generation = self._generation(data_type)
+        return f"prediction:{data_type}:{model_version}:{latest}:{generation}"
+
+    async def get_or_compute(self, data_type, model_version, latest, compute):
+        """(value, metadata) from the cache, awaiting compute() on a miss"""
+        key = self.key(data_type, model_version, latest)
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, computed_at = entry
+            return value, {"hit": True, "age": round(time.time() - computed_at, 3), "ttl": self.ttl}
+
+        value = await compute()
+        self.backend.set(key, (value, time.time()), self.ttl)
+        return value, {"hit": False, "age": 0.0, "ttl": self.ttl}
+
+    def invalidate(self, data_type):
+        self.backend.incr(f"prediction-generation:{data_type}")
+
+    def clear(self):
+        self.backend.clear()
+
+
+prediction_cache = PredictionCache.from_settings()
@@ -0,0 +1,133 @@
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import decorator_from_middleware
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+import numpy as np
+
+# Optional encoders; their renderers are only offered when installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DATAPOINT_COLUMNS = ("id", "data_type", "so2_value", "latitude", "longitude",
+                     "timestamp", "created_at")
+ROLLUP_COLUMNS = ("id", "granularity", "data_type", "cell", "bucket", "count",
+                  "so2_mean", "so2_std", "so2_min", "so2_max", "latest")
+ROLLUP_FETCH_COLUMNS = ("id", "granularity", "data_type", "cell", "bucket", "count",
+                        "so2_sum", "so2_sum_sq", "so2_min", "so2_max", "latest")
+
+
+def datapoint_columns(rows):
+    """{column: list} from DATAPOINT_COLUMNS values_list rows"""
+    columns = list(zip(*rows)) or [()] * len(DATAPOINT_COLUMNS)
+    return {name: list(values) for name, values in zip(DATAPOINT_COLUMNS, columns)}
+
+
+def rollup_columns(rows):
+    """{column: list} from ROLLUP_FETCH_COLUMNS rows, with means and stds derived"""
+    fetched = dict(zip(ROLLUP_FETCH_COLUMNS, list(zip(*rows)) or [()] * len(ROLLUP_FETCH_COLUMNS)))
+    count = np.asarray(fetched["count"], dtype=np.float64)
+    mean = np.asarray(fetched["so2_sum"], dtype=np.float64) / count
+    variance = np.asarray(fetched["so2_sum_sq"], dtype=np.float64) / count - mean ** 2
+    fetched["so2_mean"] = mean.tolist()
+    fetched["so2_std"] = np.sqrt(np.maximum(variance, 0.0)).tolist()
+    return {name: list(fetched[name]) for name in ROLLUP_COLUMNS}
+
+
+def _timestamps_to_iso(columns):
+    return {
+        name: [value.isoformat() if hasattr(value, "isoformat") else value for value in values]
+        for name, values in columns.items()
+    }
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """{"count": n, "columns": {name: [...]}} as JSON"""
+
+    media_type = "application/vnd.airquality.columns+json"
+    format = "columns"
+    columnar = True
+
+
+class MessagePackRenderer(BaseRenderer):
+    """The columnar payload as MessagePack, timestamps as ISO 8601 strings"""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    columnar = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if "columns" in data:
+            data = dict(data, columns=_timestamps_to_iso(data["columns"]))
+        return msgpack.packb(data, use_bin_type=True)
+
+
+class ArrowRenderer(BaseRenderer):
+    """The columns as an Arrow IPC stream; errors are sent as JSON"""
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+    render_style = "binary"
+    columnar = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if "columns" not in data:
+            renderer_context["response"]["Content-Type"] = "application/json"
+            return JSONRenderer().render(data)
+        table = pa.table(data["columns"])
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def data_point_renderers(default_renderers):
+    """get_data_points renderers: the defaults, then the columnar formats available"""
+    renderers = list(default_renderers) + [ColumnarJSONRenderer]
+    if msgpack is not None:
+        renderers.append(MessagePackRenderer)
+    if pa is not None:
+        renderers.append(ArrowRenderer)
+    return renderers
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that prefers brotli when installed and accepted"""
+
+    def process_response(self, request, response):
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if (
+            brotli is None
+            or "br" not in accept_encoding
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < 200
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=5)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(response.content))
+        response["Content-Encoding"] = "br"
+        return response
+
+
+compress_response = decorator_from_middleware(CompressionMiddleware)
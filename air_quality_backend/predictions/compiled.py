@@ -0,0 +1,190 @@
+import json
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import (
+    ARDRegression,
+    BayesianRidge,
+    ElasticNet,
+    ElasticNetCV,
+    HuberRegressor,
+    Lasso,
+    LassoCV,
+    LinearRegression,
+    Ridge,
+    RidgeCV,
+    SGDRegressor,
+)
+
+# Bump when the arrays written by CompiledModel.save change meaning
+FORMAT_VERSION = 1
+
+FORESTS = (RandomForestRegressor, ExtraTreesRegressor)
+# Regressors whose predict is X @ coef_ + intercept_
+LINEAR_MODELS = (LinearRegression, Ridge, RidgeCV, Lasso, LassoCV, ElasticNet, ElasticNetCV,
+                 BayesianRidge, ARDRegression, HuberRegressor, SGDRegressor)
+
+
+class CompiledModel:
+    """A fitted tree ensemble or linear model as flat NumPy arrays
+
+    The StandardScaler is part of the export, so predict takes raw feature
+    rows. Linear coefficients absorb the scaling. Trees keep sklearn's
+    thresholds and apply the scaler's input_mean/input_scale first, then
+    round to float32 as sklearn's trees do, so every row takes exactly the
+    branch it takes in sklearn; folding the scaling into the thresholds
+    would flip rows lying within float32 rounding of a split.
+
+    Nodes of all trees are stored in one set of arrays (feature,
+    threshold, left, right, value) and roots holds each tree's first node.
+    Leaves point to themselves, so prediction walks every (row, tree) pair
+    down max_depth levels with fancy indexing and no Python-level dispatch
+    per tree, then sums the leaf values: bias + scale * sum(leaves) covers
+    both forests (scale 1/n_trees) and gradient boosting (the init
+    constant and learning rate). Missing values are not supported.
+
+    Every pair walks max_depth levels however shallow its leaf, so the
+    walk wins on the few rows of a single request and loses to sklearn's
+    per-tree traversal on large batches.
+    """
+
+    def __init__(self, kind, n_features, bias, scale=1.0, coef=None, input_mean=None,
+                 input_scale=None, feature=None, threshold=None, left=None, right=None,
+                 value=None, roots=None, max_depth=0):
+        self.kind = kind
+        self.n_features = n_features
+        self.bias = np.asarray(bias, dtype=np.float64)
+        self.scale = float(scale)
+        self.coef = coef
+        self.input_mean = input_mean
+        self.input_scale = input_scale
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        # children[node, went_left]: one gather per level instead of two
+        self._children = None if left is None else np.stack([right, left], axis=1)
+
+    @property
+    def n_outputs(self):
+        return len(self.bias)
+
+    def predict(self, X):
+        """Predictions for raw (unscaled) feature rows, shaped like sklearn's"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected rows of {self.n_features} features, got shape {X.shape}")
+
+        if self.kind == "linear":
+            out = X @ self.coef + self.bias
+        else:
+            n_rows, n_trees = len(X), len(self.roots)
+            flat = ((X - self.input_mean) / self.input_scale).astype(np.float32).ravel()
+            # Offset of each (row, tree) pair's row in flat
+            row_start = np.repeat(np.arange(n_rows) * self.n_features, n_trees)
+            node = np.tile(self.roots, n_rows)
+            for _ in range(self.max_depth):
+                went_left = flat[row_start + self.feature[node]] <= self.threshold[node]
+                node = self._children[node, went_left.view(np.int8)]
+            out = self.bias + self.scale * self.value[node.reshape(n_rows, n_trees)].sum(axis=1)
+        return out[:, 0] if self.n_outputs == 1 else out
+
+    def save(self, path):
+        """Write the arrays to an .npz file"""
+        meta = {"format": FORMAT_VERSION, "kind": self.kind, "n_features": self.n_features,
+                "scale": self.scale, "max_depth": self.max_depth}
+        arrays = {"bias": self.bias}
+        for name in ("coef", "input_mean", "input_scale", "feature", "threshold", "left",
+                     "right", "value", "roots"):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        with open(path, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["format"] != FORMAT_VERSION:
+                raise ValueError(f"unsupported compiled model format {meta['format']}")
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+        return cls(meta["kind"], meta["n_features"], scale=meta["scale"],
+                   max_depth=meta["max_depth"], **arrays)
+
+
+def _scaler_arrays(scaler, n_features):
+    """(mean, scale) of a fitted StandardScaler, identity when there is none"""
+    mean = getattr(scaler, "mean_", None)
+    scale = getattr(scaler, "scale_", None)
+    return (
+        np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64),
+        np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64),
+    )
+
+
+def _flatten_trees(trees, mean, scale):
+    """Concatenate sklearn tree_ objects into global node arrays, scaler included"""
+    parts = {name: [] for name in ("feature", "threshold", "left", "right", "value")}
+    roots = []
+    offset = 0
+    for tree in trees:
+        n_nodes = tree.node_count
+        ids = np.arange(n_nodes)
+        leaf = tree.children_left == -1
+        feature = np.where(leaf, 0, tree.feature)
+        threshold = np.where(leaf, 0.0, tree.threshold)
+
+        parts["feature"].append(feature)
+        parts["threshold"].append(threshold)
+        parts["left"].append(np.where(leaf, ids, tree.children_left) + offset)
+        parts["right"].append(np.where(leaf, ids, tree.children_right) + offset)
+        parts["value"].append(tree.value[:, :, 0])
+        roots.append(offset)
+        offset += n_nodes
+
+    arrays = {name: np.concatenate(values) for name, values in parts.items()}
+    for name in ("feature", "left", "right"):
+        arrays[name] = arrays[name].astype(np.int32)
+    arrays["roots"] = np.asarray(roots, dtype=np.int32)
+    arrays["max_depth"] = max(tree.max_depth for tree in trees)
+    arrays["input_mean"] = mean
+    arrays["input_scale"] = scale
+    return arrays
+
+
+def compile_model(model, scaler=None):
+    """CompiledModel equivalent to model.predict(scaler.transform(X))
+
+    Supports random and extra-trees forests, squared-error gradient
+    boosting and the LINEAR_MODELS, single- or multi-output; raises
+    TypeError for anything else (AdaBoost, bagging and voting ensembles
+    and generalized linear models included).
+    """
+    if not isinstance(model, FORESTS + (GradientBoostingRegressor,) + LINEAR_MODELS):
+        raise TypeError(f"cannot compile {type(model).__name__}")
+    n_features = model.n_features_in_
+    mean, scale = _scaler_arrays(scaler, n_features)
+
+    if isinstance(model, GradientBoostingRegressor):
+        if model.loss != "squared_error":
+            raise TypeError(f"cannot compile gradient boosting with loss={model.loss!r}")
+        trees = [estimator.tree_ for estimator in np.ravel(model.estimators_)]
+        if model.init_ == "zero":
+            bias = np.zeros(1)
+        else:
+            bias = np.ravel(model.init_.predict(np.zeros((1, n_features))))
+        return CompiledModel("trees", n_features, bias, scale=model.learning_rate,
+                             **_flatten_trees(trees, mean, scale))
+
+    if isinstance(model, FORESTS):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        n_outputs = trees[0].value.shape[1]
+        return CompiledModel("trees", n_features, np.zeros(n_outputs), scale=1.0 / len(trees),
+                             **_flatten_trees(trees, mean, scale))
+
+    coef = np.atleast_2d(np.asarray(model.coef_, dtype=np.float64)).T / scale[:, None]
+    intercept = np.ravel(np.asarray(model.intercept_, dtype=np.float64))
+    return CompiledModel("linear", n_features, intercept - mean @ coef, coef=coef)
@@ -0,0 +1,194 @@
+from datetime import datetime
+
+import numpy as np
+
+# Request fields in model feature order; the cyclical encodings of month,
+# day and hour follow them to make up the 16 training features
+STAT_FIELDS = ("so2_mean", "so2_std", "so2_min", "so2_max", "so2_median")
+TIME_FIELDS = ("year", "month", "day", "day_of_week", "hour")
+N_FEATURES = len(STAT_FIELDS) + len(TIME_FIELDS) + 6
+
+
+def time_defaults(now=None):
+    """Values used for time fields a scenario leaves out"""
+    now = now or datetime.now()
+    return {
+        "year": now.year,
+        "month": now.month,
+        "day": now.day,
+        "day_of_week": now.weekday(),
+        "hour": now.hour,
+    }
+
+
+def scenario_columns(payload, max_rows=None):
+    """Normalise a batch payload into one float array per request field
+
+    Accepts a list of scenario objects, {"scenarios": [...]}, or the
+    columnar form {"columns": {"so2_mean": [...], ...}}. Missing stats
+    default to 0 and missing time fields to the current time, as in
+    predict_custom. Raises ValueError on malformed input.
+    """
+    defaults = time_defaults()
+
+    if isinstance(payload, dict) and "columns" in payload:
+        columns = payload["columns"]
+        if not isinstance(columns, dict) or not all(isinstance(v, list) for v in columns.values()):
+            raise ValueError("'columns' must be an object of field arrays")
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("'columns' arrays must all have the same length")
+        n_rows = lengths.pop() if lengths else 0
+        get_column = columns.get
+    else:
+        scenarios = payload.get("scenarios") if isinstance(payload, dict) else payload
+        if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+            raise ValueError("expected a list of scenario objects")
+        n_rows = len(scenarios)
+
+        def get_column(field):
+            if not any(field in scenario for scenario in scenarios):
+                return None
+            default = 0 if field in STAT_FIELDS else defaults[field]
+            return [scenario.get(field, default) for scenario in scenarios]
+
+    if n_rows == 0:
+        raise ValueError("no scenarios given")
+    if max_rows is not None and n_rows > max_rows:
+        raise ValueError(f"at most {max_rows} scenarios per request")
+
+    arrays = {}
+    for field in STAT_FIELDS + TIME_FIELDS:
+        values = get_column(field)
+        if values is None:
+            default = 0 if field in STAT_FIELDS else defaults[field]
+            arrays[field] = np.full(n_rows, float(default))
+            continue
+        try:
+            arrays[field] = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{field}' must hold numbers")
+        if arrays[field].shape != (n_rows,):
+            raise ValueError(f"'{field}' must hold one number per scenario")
+        if field in TIME_FIELDS:
+            # Same truncation as int() in predict_custom
+            arrays[field] = np.trunc(arrays[field])
+    return arrays
+
+
+def build_feature_matrix(columns):
+    """(n, 16) model input from per-field arrays, cyclical encodings included"""
+    return np.column_stack(
+        [columns[field] for field in STAT_FIELDS] + [time_feature_matrix(columns)]
+    )
+
+
+def time_feature_matrix(columns):
+    """(n, 11) time features: the TIME_FIELDS arrays, then their cyclical encodings"""
+    month = columns["month"]
+    day = columns["day"]
+    hour = columns["hour"]
+    return np.column_stack(
+        [columns[field] for field in TIME_FIELDS]
+        + [
+            np.sin(2 * np.pi * month / 12),
+            np.cos(2 * np.pi * month / 12),
+            np.sin(2 * np.pi * day / 31),
+            np.cos(2 * np.pi * day / 31),
+            np.sin(2 * np.pi * hour / 24),
+            np.cos(2 * np.pi * hour / 24),
+        ]
+    )
+
+
+def multi_output_features(payload, schema):
+    """(1, n) multi-output model input from recent readings of every pollutant
+
+    payload["recent"] maps each pollutant in the schema to its latest
+    readings, oldest first. The stats are taken over the last
+    schema["window_size"] of them, the window the model was trained on,
+    with schema["std_ddof"] for the std; fewer readings are an error.
+    Time fields of the last reading default to the current time, as in
+    predict_custom. Raises ValueError on malformed input.
+    """
+    recent = payload.get("recent") if isinstance(payload, dict) else None
+    if not isinstance(recent, dict):
+        raise ValueError("'recent' must map pollutants to lists of readings")
+
+    window_size = schema["window_size"]
+    stats = []
+    for pollutant in schema["pollutants"]:
+        try:
+            values = np.asarray(recent[pollutant], dtype=np.float64)
+        except KeyError:
+            raise ValueError(f"'recent' has no readings for '{pollutant}'")
+        except (TypeError, ValueError):
+            raise ValueError(f"'{pollutant}' must hold numbers")
+        if values.ndim != 1 or len(values) < window_size:
+            raise ValueError(f"'{pollutant}' needs at least {window_size} readings")
+        values = values[-window_size:]
+        if np.isnan(values).any():
+            raise ValueError(f"'{pollutant}' readings must not be NaN")
+        stats.extend([values.mean(), values.std(ddof=schema.get("std_ddof", 1)),
+                      values.min(), values.max(), np.median(values)])
+
+    defaults = time_defaults()
+    try:
+        times = {field: np.array([float(int(payload.get(field, defaults[field])))])
+                 for field in TIME_FIELDS}
+    except (TypeError, ValueError):
+        raise ValueError("time fields must be integers")
+    return np.column_stack([np.array([stats]), time_feature_matrix(times)])
+
+
+def window_feature_vector(so2_values, latest):
+    """(1, 16) model input from a window of SO2 values and its latest timestamp
+
+    Matches the backend's historical feature vector: population std
+    (NumPy's default ddof=0) and time features of the latest reading.
+    """
+    return stats_feature_vector({
+        "so2_mean": np.mean(so2_values),
+        "so2_std": np.std(so2_values),
+        "so2_min": np.min(so2_values),
+        "so2_max": np.max(so2_values),
+        "so2_median": np.median(so2_values),
+    }, latest)
+
+
+def rollup_window_stats(summaries):
+    """Window stats from (count, sum, sum_sq, min, max, ...) bucket rows
+
+    Mean, population std, min and max are exact up to rounding. The median
+    is the count-weighted median of the bucket means, an approximation of
+    the median of the raw values.
+    """
+    summaries = np.array([row[:5] for row in summaries], dtype=np.float64)
+    counts, sums, sum_sqs, mins, maxs = summaries.T
+    n = counts.sum()
+    mean = sums.sum() / n
+
+    bucket_means = sums / counts
+    order = np.argsort(bucket_means, kind="stable")
+    cumulative = np.cumsum(counts[order])
+    median = bucket_means[order][np.searchsorted(cumulative, n / 2)]
+
+    return {
+        "so2_mean": mean,
+        "so2_std": np.sqrt(max(sum_sqs.sum() / n - mean ** 2, 0.0)),
+        "so2_min": mins.min(),
+        "so2_max": maxs.max(),
+        "so2_median": median,
+    }
+
+
+def stats_feature_vector(stats, latest):
+    """(1, 16) model input from the five window stats and the latest timestamp"""
+    return build_feature_matrix({
+        **{field: np.array([stats[field]]) for field in STAT_FIELDS},
+        "year": np.array([latest.year]),
+        "month": np.array([latest.month]),
+        "day": np.array([latest.day]),
+        "day_of_week": np.array([latest.weekday()]),
+        "hour": np.array([latest.hour]),
+    })
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class PoolSaturated(Exception):
+    """More inference calls are waiting than the pool admits"""
+
+
+class InferencePool:
+    """Bounded thread pool that async views hand CPU-bound work to
+
+    sklearn's predict and the model loads behind registry.get release the
+    GIL for most of their work, so running them here keeps the event loop
+    serving other requests. At most max_pending calls may be running or
+    queued; further calls fail fast with PoolSaturated instead of queueing
+    without limit.
+    """
+
+    def __init__(self, max_workers=4, max_pending=64):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="inference")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_workers=getattr(settings, "PREDICTION_INFERENCE_THREADS", 4),
+            max_pending=getattr(settings, "PREDICTION_INFERENCE_MAX_PENDING", 64),
+        )
+
+    async def run(self, fn, *args):
+        """Await fn(*args) run on a pool thread"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolSaturated(f"{self._pending} inference calls already pending")
+            self._pending += 1
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+inference_pool = InferencePool.from_settings()
@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from .models import DataPoint
+
+# Timestamps per existing-row lookup, well below SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+
+def frame_rows(frame, value_column="so2", latitude=None, longitude=None):
+    """(timestamp, so2_value, latitude, longitude) tuples from a processed frame
+
+    Timestamps are the frame's naive UTC 'date' column made timezone-aware
+    and truncated to the microseconds the database stores, so keys compare
+    equal to rows read back. Frames without latitude/longitude columns (the
+    ground CSV) take the fixed coordinates given, or None.
+    """
+    timestamps = pd.to_datetime(frame["date"])
+    if timestamps.dt.tz is None:
+        timestamps = timestamps.dt.tz_localize("UTC")
+    timestamps = timestamps.dt.floor("us").dt.to_pydatetime()
+
+    values = frame[value_column].to_numpy(dtype=np.float64)
+    n_rows = len(frame)
+    if "latitude" in frame:
+        lats = frame["latitude"].to_numpy(dtype=np.float64).tolist()
+        lons = frame["longitude"].to_numpy(dtype=np.float64).tolist()
+    else:
+        lats = [latitude] * n_rows
+        lons = [longitude] * n_rows
+
+    return [
+        (timestamp, value, _coordinate(lat), _coordinate(lon))
+        for timestamp, value, lat, lon in zip(timestamps, values.tolist(), lats, lons)
+        if not math.isnan(value)
+    ]
+
+
+def _coordinate(value):
+    return None if value is None or math.isnan(value) else value
+
+
+def upsert_datapoints(data_type, rows):
+    """Insert or update DataPoints keyed on (data_type, timestamp, lat, lon)
+
+    Existing keys are looked up by the batch's distinct timestamps, in
+    IN-lists of at most LOOKUP_CHUNK (served by the (data_type, timestamp)
+    index), so only rows sharing a timestamp with the batch are read even
+    when it is spread over a long period; coordinates are matched in
+    Python. Matches are updated in place and the rest bulk-created.
+    Duplicate keys within rows collapse to the last value. Call inside a
+    transaction. Returns the created and the updated DataPoints; bulk
+    writes send no signals, so the caller maintains the rollups.
+    """
+    if not rows:
+        return [], []
+
+    latest = {}
+    for timestamp, value, lat, lon in rows:
+        latest[(timestamp, lat, lon)] = value
+
+    timestamps = sorted({key[0] for key in latest})
+    updates = []
+    for start in range(0, len(timestamps), LOOKUP_CHUNK):
+        existing = DataPoint.objects.filter(
+            data_type=data_type, timestamp__in=timestamps[start:start + LOOKUP_CHUNK]
+        ).values_list("timestamp", "latitude", "longitude", "id", "so2_value")
+        for timestamp, lat, lon, pk, old_value in existing.iterator(chunk_size=10000):
+            value = latest.pop((timestamp, lat, lon), None)
+            if value is not None and value != old_value:
+                updates.append(DataPoint(id=pk, data_type=data_type, so2_value=value,
+                                         timestamp=timestamp))
+
+    created = DataPoint.objects.bulk_create([
+        DataPoint(data_type=data_type, so2_value=value, latitude=lat, longitude=lon,
+                  timestamp=timestamp)
+        for (timestamp, lat, lon), value in latest.items()
+    ])
+    if updates:
+        DataPoint.objects.bulk_update(updates, ["so2_value"])
+    return created, updates
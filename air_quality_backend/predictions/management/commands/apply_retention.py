@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions import retention
+from predictions.cache import prediction_cache
+
+
+def _megabytes(n_bytes):
+    return f"{n_bytes / 2**20:,.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire raw DataPoints and hourly rollups past the DATAPOINT_RETENTION "
+        "policy of their data type, deleting in bounded batches. Daily rollups "
+        "are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-type", action="append", dest="data_types",
+                            help="only apply this data type's policy (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=10000,
+                            help="rows deleted per transaction")
+        parser.add_argument("--pause", type=float, default=0.0,
+                            help="seconds to sleep between batches")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="report what would be deleted without deleting")
+        parser.add_argument("--vacuum", action="store_true",
+                            help="VACUUM afterwards to shrink the SQLite file")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        try:
+            policies = retention.policies()
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options["data_types"]:
+            unknown = set(options["data_types"]) - set(policies)
+            if unknown:
+                raise CommandError(f"no retention policy for {', '.join(sorted(unknown))}")
+            policies = {data_type: policies[data_type] for data_type in options["data_types"]}
+
+        space_before = retention.database_space()
+        start = time.perf_counter()
+        total = 0
+
+        for data_type, policy in policies.items():
+            deleted = 0
+            for label, queryset in retention.expired(data_type, policy).items():
+                if options["dry_run"]:
+                    n_rows = queryset.count()
+                    self.stdout.write(f"{data_type}: would delete {n_rows} {label}")
+                    continue
+                n_rows = retention.delete_in_batches(queryset, options["batch_size"],
+                                                     options["pause"])
+                deleted += n_rows
+                self.stdout.write(f"{data_type}: deleted {n_rows} {label}")
+            if deleted:
+                prediction_cache.invalidate(data_type)
+            total += deleted
+
+        if options["dry_run"]:
+            return
+
+        if options["vacuum"]:
+            retention.vacuum()
+        space_after = retention.database_space()
+
+        summary = f"{total} rows deleted in {time.perf_counter() - start:.1f}s"
+        if space_before is not None:
+            size_before, free_before = space_before
+            size_after, free_after = space_after
+            summary += (
+                f"; {_megabytes((size_before - free_before) - (size_after - free_after))} "
+                f"of pages freed, database file {_megabytes(size_before)} -> "
+                f"{_megabytes(size_after)}"
+            )
+            if not options["vacuum"] and free_after:
+                summary += f" ({_megabytes(free_after)} free for reuse; --vacuum to shrink)"
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from predictions import retention, rollups
+from predictions.cache import prediction_cache
+from predictions.loading import frame_rows, upsert_datapoints
+from predictions.models import LoadCheckpoint
+
+
+def _processor_module():
+    # data_processing.py lives in the project root, outside the Django project
+    if str(settings.PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(settings.PROJECT_ROOT))
+    import data_processing
+    return data_processing
+
+
+class Command(BaseCommand):
+    help = (
+        "Load processed ground CSV and satellite granules into DataPoint in batched, "
+        "transactional upserts keyed on (data_type, timestamp, latitude, longitude). "
+        "Progress is checkpointed with every batch, so an interrupted run resumes "
+        "where it stopped. Rows older than the data type's DATAPOINT_RETENTION "
+        "RAW_DAYS are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ground-csv", help="ground sensor CSV to load")
+        parser.add_argument("--satellite-dir", help="directory of HDF5 satellite granules")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--ground-latitude", type=float, default=None,
+                            help="station latitude stored on ground rows")
+        parser.add_argument("--ground-longitude", type=float, default=None,
+                            help="station longitude stored on ground rows")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="processes used to read satellite granules")
+        parser.add_argument("--cache-dir", default=None,
+                            help="processed-frame cache used by AirQualityDataProcessor")
+        parser.add_argument("--restart", action="store_true",
+                            help="ignore any checkpoint and load from the first row")
+
+    def handle(self, *args, **options):
+        if not options["ground_csv"] and not options["satellite_dir"]:
+            raise CommandError("give --ground-csv and/or --satellite-dir")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        data_processing = _processor_module()
+        processor = data_processing.AirQualityDataProcessor(cache_dir=options["cache_dir"])
+
+        if options["ground_csv"]:
+            path = os.path.abspath(options["ground_csv"])
+            fingerprint = [data_processing.fingerprint(path)]
+
+            def ground_frames():
+                yield processor.process_ground_data(path)
+
+            self.load("ground", path, fingerprint, ground_frames, options)
+
+        if options["satellite_dir"]:
+            path = os.path.abspath(options["satellite_dir"])
+            fingerprint = [
+                data_processing.fingerprint(os.path.join(path, name))
+                for name in data_processing.satellite_granule_names(path)
+            ]
+
+            def satellite_frames():
+                return processor.stream_satellite_data(path, workers=options["workers"])
+
+            self.load("satellite", path, fingerprint, satellite_frames, options)
+
+    def load(self, data_type, path, fingerprint, frames, options):
+        """Stream rows from frames() into DataPoint, resuming from the checkpoint"""
+        digest = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+        checkpoint, _ = LoadCheckpoint.objects.get_or_create(
+            source=f"{data_type}:{path}", defaults={"fingerprint": digest}
+        )
+        if options["restart"] or checkpoint.fingerprint != digest:
+            if checkpoint.rows_done and not options["restart"]:
+                self.stdout.write(f"{data_type}: source changed since the last run, starting over")
+            checkpoint.fingerprint = digest
+            checkpoint.rows_done = 0
+            checkpoint.completed = False
+            checkpoint.save()
+        elif checkpoint.completed:
+            self.stdout.write(f"{data_type}: {path} already loaded ({checkpoint.rows_done} rows)")
+            return
+        elif checkpoint.rows_done:
+            self.stdout.write(f"{data_type}: resuming after {checkpoint.rows_done} rows")
+
+        # Days apply_retention has expired live on only as daily rollups;
+        # loading their rows again would bring the raw rows back and count
+        # them into those rollups a second time
+        raw_days = retention.policies().get(data_type, {}).get("RAW_DAYS")
+        expired_before = retention.cutoff(raw_days) if raw_days is not None else None
+
+        skip = checkpoint.rows_done
+        batch_size = options["batch_size"]
+        created = updated = seen = processed = expired = 0
+        start = time.perf_counter()
+
+        for frame in frames():
+            rows = frame_rows(frame, latitude=options["ground_latitude"],
+                              longitude=options["ground_longitude"])
+            if skip >= len(rows):
+                skip -= len(rows)
+                seen += len(rows)
+                continue
+            seen += skip
+            rows = rows[skip:]
+            skip = 0
+
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                current = batch
+                if expired_before is not None:
+                    current = [row for row in batch if row[0] >= expired_before]
+                    expired += len(batch) - len(current)
+                with transaction.atomic():
+                    new_points, updated_points = upsert_datapoints(data_type, current)
+                    rollups.apply_points(new_points)
+                    rollups.rebuild(data_type, [point.timestamp for point in updated_points])
+                    seen += len(batch)
+                    checkpoint.rows_done = seen
+                    checkpoint.save(update_fields=["rows_done", "updated_at"])
+                created += len(new_points)
+                updated += len(updated_points)
+                processed += len(batch)
+
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{data_type}: {seen} rows ({processed / elapsed:,.0f} rows/s)",
+                    ending="\r",
+                )
+
+        checkpoint.completed = True
+        checkpoint.save(update_fields=["completed", "updated_at"])
+        # Updated rows change neither the count nor the latest timestamp
+        prediction_cache.invalidate(data_type)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"{data_type}: {created} created, {updated} updated, {processed} rows in "
+            f"{elapsed:.1f}s ({processed / max(elapsed, 1e-9):,.0f} rows/s)"
+        ))
+        if expired:
+            self.stdout.write(
+                f"{data_type}: skipped {expired} rows older than the {raw_days}-day raw retention"
+            )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from predictions import rollups
+from predictions.cache import prediction_cache
+from predictions.models import DataPointRollup
+from predictions.registry import DATA_TYPES
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute DataPointRollup from the raw DataPoint table, e.g. after rows "
+        "were written with raw SQL or ROLLUP_CELL_SIZE changed."
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            rollups.rebuild_all()
+        for data_type in DATA_TYPES:
+            prediction_cache.invalidate(data_type)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{DataPointRollup.objects.count()} rollup rows in {time.perf_counter() - start:.1f}s"
+        ))
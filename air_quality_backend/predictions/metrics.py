@@ -0,0 +1,171 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INFERENCE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonic count per label set, in Prometheus text format"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in Prometheus text format"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), n, total) for key, (counts, n, total) in self._series.items()}
+        for key, (counts, n, total) in sorted(series.items()):
+            for bound, count in zip(self.buckets, counts):
+                labels = _label_text(self.labelnames + ("le",), key + (repr(float(bound)),))
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _label_text(self.labelnames + ("le",), key + ("+Inf",))
+            yield f"{self.name}_bucket{labels} {n}"
+            yield f"{self.name}_count{_label_text(self.labelnames, key)} {n}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, key)} {total}"
+
+
+request_latency = Histogram(
+    "predictions_http_request_duration_seconds",
+    "Time from request to response headers, per view",
+    ("view", "method", "status"),
+)
+request_exceptions = Counter(
+    "predictions_http_exceptions_total",
+    "Exceptions a view caught and turned into an error response, or raised",
+    ("view", "exception"),
+)
+request_queries = Histogram(
+    "predictions_http_request_db_queries",
+    "Database queries run while handling one request, per view",
+    ("view",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+query_latency = Histogram(
+    "predictions_db_query_duration_seconds",
+    "Database query time, per view",
+    ("view",),
+)
+inference_latency = Histogram(
+    "predictions_inference_duration_seconds",
+    "Time in scaler.transform and model.predict, or in the compiled predictor, per data type",
+    ("data_type", "stage"),
+    buckets=INFERENCE_BUCKETS,
+)
+
+REGISTRY = (request_latency, request_exceptions, request_queries, query_latency,
+            inference_latency)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    """Queries attributed to the request being handled"""
+
+    def __init__(self):
+        self.view = "unmatched"
+        self.queries = 0
+
+
+# Set by MetricsMiddleware; context variables follow the request into the
+# sync_to_async threads the async ORM runs queries on
+current_request = contextvars.ContextVar("predictions_current_request", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper timing every query of a tracked request"""
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        query_latency.observe(time.perf_counter() - start, view=stats.view)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver adding record_query to each new connection"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_exception(exception):
+    """Count an exception against the view of the request being handled"""
+    stats = current_request.get()
+    view = stats.view if stats is not None else "unmatched"
+    request_exceptions.inc(view=view, exception=type(exception).__name__)
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='datapoint',
+            index=models.Index(fields=['data_type', 'timestamp'], name='datapoint_type_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datapoint',
+            index=models.Index(fields=['timestamp'], name='datapoint_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datapoint',
+            index=models.Index(fields=['latitude', 'longitude'], name='datapoint_lat_lon_idx'),
+        ),
+    ]
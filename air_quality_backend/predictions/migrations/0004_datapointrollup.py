@@ -0,0 +1,100 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:41
+
+import datetime
+
+from django.db import migrations, models
+
+
+# Frozen copy of predictions.rollups as of this migration, so later changes
+# to the app cannot change what it does. ROLLUP_CELL_SIZE was None: only the
+# per-data-type rows (cell '') are backfilled; run rebuild_rollups after
+# setting a cell size.
+FIELDS = ['count', 'so2_sum', 'so2_sum_sq', 'so2_min', 'so2_max', 'latest']
+
+
+def bucket_start(timestamp, granularity):
+    timestamp = timestamp.astimezone(datetime.timezone.utc)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def summarize(rows):
+    summaries = {}
+    for data_type, timestamp, value in rows:
+        for granularity in ('hour', 'day'):
+            key = (granularity, data_type, bucket_start(timestamp, granularity))
+            summary = summaries.get(key)
+            if summary is None:
+                summaries[key] = [1, value, value * value, value, value, timestamp]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] += value * value
+                summary[3] = min(summary[3], value)
+                summary[4] = max(summary[4], value)
+                summary[5] = max(summary[5], timestamp)
+    return summaries
+
+
+def backfill_rollups(apps, schema_editor):
+    """Roll up the existing DataPoints, one UTC day in memory at a time"""
+    DataPoint = apps.get_model('predictions', 'DataPoint')
+    DataPointRollup = apps.get_model('predictions', 'DataPointRollup')
+    db = schema_editor.connection.alias
+
+    def flush(day_rows):
+        DataPointRollup.objects.using(db).bulk_create(
+            [DataPointRollup(granularity=granularity, data_type=data_type, cell='',
+                             bucket=bucket, **dict(zip(FIELDS, summary)))
+             for (granularity, data_type, bucket), summary in summarize(day_rows).items()],
+            batch_size=5000,
+        )
+
+    rows = DataPoint.objects.using(db).order_by('data_type', 'timestamp').values_list(
+        'data_type', 'timestamp', 'so2_value'
+    )
+    day_rows, current = [], None
+    for row in rows.iterator(chunk_size=10000):
+        day = (row[0], bucket_start(row[1], 'day'))
+        if day != current and day_rows:
+            flush(day_rows)
+            day_rows = []
+        current = day
+        day_rows.append(row)
+    if day_rows:
+        flush(day_rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0003_loadcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataPointRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('data_type', models.CharField(choices=[('ground', 'Ground Sensor'), ('satellite', 'Satellite')], max_length=20)),
+                ('cell', models.CharField(blank=True, default='', max_length=32)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('so2_sum', models.FloatField(default=0.0)),
+                ('so2_sum_sq', models.FloatField(default=0.0)),
+                ('so2_min', models.FloatField()),
+                ('so2_max', models.FloatField()),
+                ('latest', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-bucket'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='datapointrollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'data_type', 'cell', 'bucket'), name='rollup_bucket_unique'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -23,6 +23,63 @@ class DataPoint(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Every hot query filters by data_type and walks timestamps;
+            # SQLite appends the rowid (id) so (timestamp, id) keysets use it too
+            models.Index(fields=['data_type', 'timestamp'], name='datapoint_type_ts_idx'),
+            models.Index(fields=['timestamp'], name='datapoint_ts_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='datapoint_lat_lon_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.data_type} - {self.so2_value:.4f} at {self.timestamp}"
\ No newline at end of file
+        return f"{self.data_type} - {self.so2_value:.4f} at {self.timestamp}"
+
+class LoadCheckpoint(models.Model):
+    """Progress of a load_datapoints run, committed with each batch"""
+    source = models.CharField(max_length=500, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    rows_done = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.source} - {self.rows_done} rows"
+
+class DataPointRollup(models.Model):
+    """SO2 summary of one hour or day of DataPoints, per type and optional cell
+
+    cell is '' for the whole data type, or the 'lat_index:lon_index' of a
+    ROLLUP_CELL_SIZE degree grid cell. Sums rather than means are stored
+    so new points fold in without reading the raw rows back.
+    """
+    granularity = models.CharField(max_length=4, choices=[('hour', 'Hourly'), ('day', 'Daily')])
+    data_type = models.CharField(max_length=20, choices=[('ground', 'Ground Sensor'), ('satellite', 'Satellite')])
+    cell = models.CharField(max_length=32, blank=True, default='')
+    bucket = models.DateTimeField()
+    count = models.BigIntegerField(default=0)
+    so2_sum = models.FloatField(default=0.0)
+    so2_sum_sq = models.FloatField(default=0.0)
+    so2_min = models.FloatField()
+    so2_max = models.FloatField()
+    latest = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            # Also the index behind every rollup read: equality on the first
+            # three columns, then a bucket range
+            models.UniqueConstraint(fields=['granularity', 'data_type', 'cell', 'bucket'],
+                                    name='rollup_bucket_unique'),
+        ]
+    
+    @property
+    def so2_mean(self):
+        return self.so2_sum / self.count
+    
+    @property
+    def so2_std(self):
+        # Population std, as window_feature_vector uses
+        return max(self.so2_sum_sq / self.count - self.so2_mean ** 2, 0.0) ** 0.5
+    
+    def __str__(self):
+        return f"{self.data_type} {self.granularity} {self.bucket} - {self.count} points"
@@ -0,0 +1,63 @@
+import base64
+import json
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(timestamp, pk):
+    """Opaque cursor pointing just past the row (timestamp, pk)"""
+    raw = json.dumps([timestamp.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(timestamp, pk) from a cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        iso_timestamp, pk = json.loads(base64.urlsafe_b64decode(padded))
+        timestamp = parse_datetime(iso_timestamp)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+    if timestamp is None or not isinstance(pk, int):
+        raise ValueError("invalid cursor")
+    return timestamp, pk
+
+
+def page_size(value):
+    """Requested page size, defaulted and capped at DATA_POINTS_MAX_PAGE_SIZE"""
+    if value in (None, ""):
+        return settings.DATA_POINTS_PAGE_SIZE
+    size = int(value)
+    if size < 1:
+        raise ValueError("limit must be positive")
+    return min(size, settings.DATA_POINTS_MAX_PAGE_SIZE)
+
+
+def keyset_page(queryset, cursor, limit, key=None, field="timestamp"):
+    """One page of queryset, newest first, and the cursor for the next page
+
+    Rows are ordered by (field, id) descending and the cursor carries the
+    last row's pair, so each page is an index range scan that costs the
+    same however deep the client has paged, unlike OFFSET. key extracts
+    (timestamp, id) from a row, for values_list querysets.
+    """
+    queryset = queryset.order_by(f"-{field}", "-id")
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        # field <= cursor keeps this a single index range scan; an OR of
+        # the two keyset conditions makes SQLite fall back to a slower plan
+        queryset = queryset.filter(**{f"{field}__lte": timestamp}).exclude(
+            **{field: timestamp, "id__gte": pk}
+        )
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    if key is None:
+        timestamp, pk = getattr(rows[-1], field), rows[-1].pk
+    else:
+        timestamp, pk = key(rows[-1])
+    return rows, encode_cursor(timestamp, pk)
@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import joblib
+from django.conf import settings
+
+from .artifacts import MANIFEST_NAME, METADATA_NAME, ArtifactStore
+from .compiled import CompiledModel
+
+logger = logging.getLogger(__name__)
+
+DATA_TYPES = ("ground", "satellite")
+# Multi-output models predicting every pollutant and day ahead, trained by
+# data_processing.py --multi-output next to the single-target ones
+MULTI_OUTPUT_TYPES = tuple(f"{data_type}_multi" for data_type in DATA_TYPES)
+
+LoadedModel = namedtuple(
+    "LoadedModel",
+    ["data_type", "model", "scaler", "version", "model_path", "loaded_at", "schema", "compiled",
+     "metadata"],
+    defaults=(None, None, None),
+)
+
+# Files of one model version as found on disk; schema, compiled and
+# metadata (a bundle's metadata.json) are optional
+ModelSource = namedtuple(
+    "ModelSource",
+    ["version", "model_path", "scaler_path", "schema_path", "compiled_path", "metadata_path"],
+    defaults=(None,),
+)
+
+
+class ModelRegistry:
+    """Lazily loaded, hot-swappable ground/satellite models.
+
+    Models are loaded on first use and the source files are re-checked at
+    most every check_interval seconds. When the version changes, the new
+    model is loaded next to the old one and swapped in with a single
+    reference assignment, so requests already holding the previous
+    LoadedModel finish with it and nothing is dropped. A failed load (for
+    example a half-written file) keeps serving the previous version.
+
+    Versions come from models_manifest.json in model_dir when present.
+    Entries written by ArtifactStore (see artifacts.py) point at a bundle
+    directory whose metadata.json is loaded as LoadedModel.metadata; its
+    "schema" becomes LoadedModel.schema. pinned_versions ({data_type:
+    version}) serves a given bundle instead of the manifest's current one,
+    for example to roll back. Older manifests list the files directly:
+
+        {"ground": {"version": "3", "model": "ground_model_v3.pkl",
+                    "scaler": "ground_scaler_v3.pkl"}, ...}
+
+    Without a manifest, versions come from the size and mtime of the
+    loose <type>_model.pkl and <type>_scaler.pkl files. A "schema" entry,
+    or a loose <type>_schema.json, describes the inputs and outputs of
+    multi-output models. Likewise a "compiled" entry, or a loose
+    <type>_compiled.npz at least as new as the model and scaler, is loaded
+    as LoadedModel.compiled (see compiled.py) unless use_compiled is off;
+    a compiled file that fails to load only disables the fast path.
+
+    Files are loaded with joblib's mmap_mode, so the NumPy arrays inside
+    uncompressed pickles are mapped from the page cache and shared
+    read-only between all gunicorn workers on the host rather than copied
+    into each one. Compressed bundles cannot be mapped and are read into
+    memory.
+    """
+
+    def __init__(self, model_dir, check_interval=5.0, mmap_mode="r", use_compiled=True,
+                 pinned_versions=None):
+        self.model_dir = str(model_dir)
+        self.check_interval = check_interval
+        self.mmap_mode = mmap_mode
+        self.use_compiled = use_compiled
+        self.store = ArtifactStore(self.model_dir, pinned_versions=pinned_versions)
+        self.pinned_versions = self.store.pinned_versions
+        self._entries = {}
+        self._checked_at = {}
+        self._locks = {
+            data_type: threading.Lock() for data_type in DATA_TYPES + MULTI_OUTPUT_TYPES
+        }
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.PREDICTION_MODEL_DIR,
+            check_interval=getattr(settings, "PREDICTION_MODEL_CHECK_INTERVAL", 5.0),
+            mmap_mode=getattr(settings, "PREDICTION_MODEL_MMAP_MODE", "r"),
+            use_compiled=getattr(settings, "PREDICTION_COMPILED_MODELS", True),
+            pinned_versions=getattr(settings, "PREDICTION_MODEL_VERSIONS", None),
+        )
+
+    def get(self, data_type):
+        """Current LoadedModel for data_type, or None if no model is available"""
+        if data_type not in self._locks:
+            return None
+
+        now = time.monotonic()
+        if now - self._checked_at.get(data_type, float("-inf")) >= self.check_interval:
+            self._refresh(data_type, now)
+        return self._entries.get(data_type)
+
+    def available(self):
+        """Loaded models keyed by data type"""
+        entries = {}
+        for data_type in DATA_TYPES:
+            entry = self.get(data_type)
+            if entry is not None:
+                entries[data_type] = entry
+        return entries
+
+    def preload(self):
+        """Load every model now, e.g. in a gunicorn --preload master"""
+        return self.available()
+
+    def _refresh(self, data_type, now):
+        # Only one thread reloads a data type; the others keep using the
+        # current entry instead of waiting
+        lock = self._locks[data_type]
+        if not lock.acquire(blocking=data_type not in self._entries):
+            return
+        try:
+            self._checked_at[data_type] = now
+            source = self._resolve(data_type)
+            current = self._entries.get(data_type)
+            if source is None:
+                if current is not None:
+                    logger.warning("model files for %s disappeared, keeping version %s",
+                                   data_type, current.version)
+                return
+            version = source.version
+            if current is not None and current.version == version:
+                return
+
+            try:
+                metadata = schema = None
+                mmap_mode = self.mmap_mode
+                if source.metadata_path is not None:
+                    with open(source.metadata_path) as f:
+                        metadata = json.load(f)
+                    schema = metadata.get("schema")
+                    if not metadata.get("mmap", True):
+                        mmap_mode = None
+                model = joblib.load(source.model_path, mmap_mode=mmap_mode)
+                scaler = joblib.load(source.scaler_path, mmap_mode=mmap_mode)
+                if source.schema_path is not None and os.path.exists(source.schema_path):
+                    with open(source.schema_path) as f:
+                        schema = json.load(f)
+            except Exception:
+                logger.exception("failed to load %s model version %s", data_type, version)
+                return
+
+            compiled = None
+            if self.use_compiled and source.compiled_path is not None:
+                try:
+                    compiled = CompiledModel.load(source.compiled_path)
+                except Exception:
+                    logger.exception("failed to load compiled %s model version %s, "
+                                     "serving it through sklearn", data_type, version)
+
+            self._entries[data_type] = LoadedModel(
+                data_type, model, scaler, version, source.model_path, time.time(), schema,
+                compiled, metadata,
+            )
+            logger.info("loaded %s model version %s from %s%s", data_type, version,
+                        source.model_path, " (compiled)" if compiled is not None else "")
+        finally:
+            lock.release()
+
+    def _resolve(self, data_type):
+        """ModelSource of the pinned or newest model on disk, or None"""
+        pinned = self.pinned_versions.get(data_type)
+        if pinned is not None:
+            source = self._bundle_source(data_type, pinned)
+            if source is None:
+                logger.error("pinned %s model version %s is not on disk", data_type, pinned)
+            return source
+
+        manifest_path = os.path.join(self.model_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path) as f:
+                    entry = json.load(f).get(data_type)
+            except (OSError, ValueError):
+                logger.exception("unreadable model manifest %s", manifest_path)
+                entry = None
+            if entry and "bundle" in entry:
+                return self._bundle_source(data_type, entry["version"])
+            if entry:
+                schema = entry.get("schema")
+                compiled = entry.get("compiled")
+                return ModelSource(
+                    str(entry["version"]),
+                    os.path.join(self.model_dir, entry["model"]),
+                    os.path.join(self.model_dir, entry["scaler"]),
+                    os.path.join(self.model_dir, schema) if schema else None,
+                    os.path.join(self.model_dir, compiled) if compiled else None,
+                )
+
+        model_path = os.path.join(self.model_dir, f"{data_type}_model.pkl")
+        scaler_path = os.path.join(self.model_dir, f"{data_type}_scaler.pkl")
+        try:
+            model_stat = os.stat(model_path)
+            scaler_stat = os.stat(scaler_path)
+        except OSError:
+            return None
+        stats = [model_stat, scaler_stat]
+
+        # A compiled export older than the model belongs to a previous
+        # training run; it is picked up (as a new version) once rewritten
+        compiled_path = os.path.join(self.model_dir, f"{data_type}_compiled.npz")
+        try:
+            compiled_stat = os.stat(compiled_path)
+        except OSError:
+            compiled_stat = None
+        if compiled_stat is None or compiled_stat.st_mtime_ns < max(s.st_mtime_ns for s in stats):
+            compiled_path = None
+        else:
+            stats.append(compiled_stat)
+
+        version = "{}-{}".format(
+            max(stat.st_mtime_ns for stat in stats), sum(stat.st_size for stat in stats)
+        )
+        schema_path = os.path.join(self.model_dir, f"{data_type}_schema.json")
+        return ModelSource(version, model_path, scaler_path, schema_path, compiled_path)
+
+    def _bundle_source(self, data_type, version):
+        """ModelSource of an ArtifactStore bundle, or None if it is not on disk"""
+        bundle_dir = self.store.bundle_dir(data_type, version)
+        metadata_path = os.path.join(bundle_dir, METADATA_NAME)
+        try:
+            with open(metadata_path) as f:
+                files = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            return None
+        compiled = files.get("compiled")
+        return ModelSource(
+            str(version),
+            os.path.join(bundle_dir, files["model"]),
+            os.path.join(bundle_dir, files["scaler"]),
+            None,
+            os.path.join(bundle_dir, compiled) if compiled else None,
+            metadata_path,
+        )
@@ -0,0 +1,111 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .models import DataPoint, DataPointRollup
+from .rollups import bucket_start
+
+# The 7-day prediction window has to survive retention
+MIN_DAYS = 7
+
+
+def policies():
+    """{data_type: {"RAW_DAYS": n or None, "HOURLY_DAYS": n or None}} from settings
+
+    Raises ValueError for a policy that would cut into the 7-day window.
+    """
+    configured = {}
+    for data_type, policy in getattr(settings, "DATAPOINT_RETENTION", {}).items():
+        policy = {"RAW_DAYS": None, "HOURLY_DAYS": None, **policy}
+        for name, days in policy.items():
+            if days is not None and days < MIN_DAYS:
+                raise ValueError(f"{data_type} {name} must be at least {MIN_DAYS} days")
+        configured[data_type] = policy
+    return configured
+
+
+def cutoff(days, now=None):
+    """Start of the UTC day days before today; rows older than it expire
+
+    Aligned to a day so raw rows go a whole day at a time, matching the
+    daily rollups that outlive them.
+    """
+    return bucket_start(now or timezone.now(), "day") - timedelta(days=days)
+
+
+def expired(data_type, policy, now=None):
+    """{label: queryset} of the raw rows and hourly rollups policy expires"""
+    querysets = {}
+    if policy["RAW_DAYS"] is not None:
+        querysets["raw points"] = DataPoint.objects.filter(
+            data_type=data_type, timestamp__lt=cutoff(policy["RAW_DAYS"], now)
+        )
+    if policy["HOURLY_DAYS"] is not None:
+        querysets["hourly rollups"] = DataPointRollup.objects.filter(
+            granularity="hour", data_type=data_type, bucket__lt=cutoff(policy["HOURLY_DAYS"], now)
+        )
+    return querysets
+
+
+def _delete_ids(model, ids, using):
+    """DELETE the rows of model with these primary keys in one statement
+
+    Deliberately bypasses Model.delete()/QuerySet.delete(): DataPoint and
+    DataPointRollup have no reverse foreign keys, so there are no cascades
+    to collect, and their post_delete signals would rebuild, and so erase,
+    the rollups of the expired days. Returns the number of rows deleted.
+    Call inside a transaction.
+    """
+    db = connections[using]
+    table = db.ops.quote_name(model._meta.db_table)
+    pk = db.ops.quote_name(model._meta.pk.column)
+    # Older SQLite builds bind at most 999 parameters per statement
+    chunk = db.features.max_query_params or len(ids)
+    deleted = 0
+    with db.cursor() as cursor:
+        for start in range(0, len(ids), chunk):
+            part = ids[start:start + chunk]
+            placeholders = ", ".join(["%s"] * len(part))
+            cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({placeholders})", part)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def delete_in_batches(queryset, batch_size, pause=0.0):
+    """Delete queryset batch_size rows per transaction; returns rows deleted
+
+    Each batch selects up to batch_size ids and deletes them in its own short
+    transaction, so writers wait for one batch at most. The delete sends no
+    signals (see _delete_ids).
+    """
+    deleted = 0
+    while True:
+        # Unordered, so the LIMIT stops the index range scan early
+        ids = list(queryset.order_by().values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic(using=queryset.db):
+            deleted += _delete_ids(queryset.model, ids, queryset.db)
+        if pause:
+            time.sleep(pause)
+
+
+def database_space():
+    """(allocated bytes, free bytes) of the SQLite database, None elsewhere"""
+    if connection.vendor != "sqlite":
+        return None
+    with connection.cursor() as cursor:
+        page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+        page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+        freelist = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_count * page_size, freelist * page_size
+
+
+def vacuum():
+    """Return free pages to the filesystem (SQLite VACUUM; locks the database)"""
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM")
@@ -0,0 +1,199 @@
+import math
+from datetime import timedelta, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import DataPoint, DataPointRollup
+
+GRANULARITIES = ("hour", "day")
+_FIELDS = ["count", "so2_sum", "so2_sum_sq", "so2_min", "so2_max", "latest"]
+
+
+def aware_timestamp(value):
+    """value as the aware datetime a DateTimeField stores
+
+    Model instances keep whatever was assigned to timestamp, so a point
+    created with an ISO string or a naive datetime still has one after
+    save(); naive values are taken in the default time zone, as Django
+    does when it writes them.
+    """
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"invalid timestamp {value!r}")
+        value = parsed
+    if django_timezone.is_naive(value):
+        value = django_timezone.make_aware(value)
+    return value
+
+
+def bucket_start(timestamp, granularity):
+    """Start of the hour or UTC day containing a timestamp"""
+    timestamp = aware_timestamp(timestamp).astimezone(timezone.utc)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def cell_key(latitude, longitude, cell_size):
+    """'lat_index:lon_index' of the grid cell holding a point, '' if it has none"""
+    if not cell_size or latitude is None or longitude is None:
+        return ""
+    return f"{math.floor(latitude / cell_size)}:{math.floor(longitude / cell_size)}"
+
+
+def summarize(rows, cell_size=None):
+    """Rollup values keyed by (granularity, data_type, cell, bucket)
+
+    rows are (data_type, timestamp, so2_value, latitude, longitude).
+    Every row counts towards its data type's '' rows, and towards its grid
+    cell's rows too when cell_size is set.
+    """
+    summaries = {}
+    for data_type, timestamp, value, latitude, longitude in rows:
+        cells = [""]
+        cell = cell_key(latitude, longitude, cell_size)
+        if cell:
+            cells.append(cell)
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(timestamp, granularity)
+            for cell in cells:
+                key = (granularity, data_type, cell, bucket)
+                summary = summaries.get(key)
+                if summary is None:
+                    summaries[key] = [1, value, value * value, value, value, timestamp]
+                else:
+                    summary[0] += 1
+                    summary[1] += value
+                    summary[2] += value * value
+                    summary[3] = min(summary[3], value)
+                    summary[4] = max(summary[4], value)
+                    summary[5] = max(summary[5], timestamp)
+    return summaries
+
+
+def _rollup(key, summary):
+    granularity, data_type, cell, bucket = key
+    return DataPointRollup(granularity=granularity, data_type=data_type, cell=cell,
+                           bucket=bucket, **dict(zip(_FIELDS, summary)))
+
+
+def apply_points(points):
+    """Fold newly inserted DataPoints into their rollup rows
+
+    Reads the touched rollup rows with one query, merges in Python and
+    writes them back with one bulk_update and one bulk_create. Only valid
+    for new points: an updated or deleted value cannot be subtracted from
+    a min or max, so those go through rebuild().
+    """
+    summaries = summarize(
+        ((p.data_type, aware_timestamp(p.timestamp), p.so2_value, p.latitude, p.longitude)
+         for p in points),
+        settings.ROLLUP_CELL_SIZE,
+    )
+    if not summaries:
+        return
+
+    buckets = [key[3] for key in summaries]
+    with transaction.atomic():
+        existing = DataPointRollup.objects.select_for_update().filter(
+            data_type__in={key[1] for key in summaries},
+            cell__in={key[2] for key in summaries},
+            bucket__gte=min(buckets),
+            bucket__lte=max(buckets),
+        )
+        updates = []
+        for rollup in existing:
+            summary = summaries.pop(
+                (rollup.granularity, rollup.data_type, rollup.cell, rollup.bucket), None
+            )
+            if summary is None:
+                continue
+            rollup.count += summary[0]
+            rollup.so2_sum += summary[1]
+            rollup.so2_sum_sq += summary[2]
+            rollup.so2_min = min(rollup.so2_min, summary[3])
+            rollup.so2_max = max(rollup.so2_max, summary[4])
+            rollup.latest = max(rollup.latest, summary[5])
+            updates.append(rollup)
+
+        if updates:
+            DataPointRollup.objects.bulk_update(updates, _FIELDS)
+        DataPointRollup.objects.bulk_create(
+            [_rollup(key, summary) for key, summary in summaries.items()]
+        )
+
+
+def _in_days(field, days):
+    condition = Q()
+    for day in days:
+        condition |= Q(**{f"{field}__gte": day, f"{field}__lt": day + timedelta(days=1)})
+    return condition
+
+
+def rebuild(data_type, timestamps):
+    """Recompute every rollup row of the UTC days holding timestamps
+
+    Used after DataPoints are updated or deleted. Whole days are redone so
+    the hourly and daily rows of a cell stay consistent with each other.
+    """
+    days = {bucket_start(timestamp, "day") for timestamp in timestamps}
+    if not days:
+        return
+
+    raw = DataPoint.objects.filter(_in_days("timestamp", days), data_type=data_type).values_list(
+        "data_type", "timestamp", "so2_value", "latitude", "longitude"
+    )
+
+    with transaction.atomic():
+        DataPointRollup.objects.filter(_in_days("bucket", days), data_type=data_type).delete()
+        summaries = summarize(raw.order_by().iterator(chunk_size=10000), settings.ROLLUP_CELL_SIZE)
+        DataPointRollup.objects.bulk_create(
+            [_rollup(key, summary) for key, summary in summaries.items()]
+        )
+
+
+def rebuild_all():
+    """Recompute rollups from the raw table, one UTC day in memory at a time
+
+    Rollups older than a data type's oldest raw row are the only record
+    left of days apply_retention expired, so they are kept.
+    """
+    oldest = DataPoint.objects.order_by().values("data_type").annotate(first=Min("timestamp"))
+    for row in oldest:
+        DataPointRollup.objects.filter(
+            data_type=row["data_type"], bucket__gte=bucket_start(row["first"], "day")
+        ).delete()
+    rows = DataPoint.objects.order_by("data_type", "timestamp").values_list(
+        "data_type", "timestamp", "so2_value", "latitude", "longitude"
+    )
+
+    def flush(day_rows):
+        DataPointRollup.objects.bulk_create(
+            [_rollup(key, summary)
+             for key, summary in summarize(day_rows, settings.ROLLUP_CELL_SIZE).items()],
+            batch_size=5000,
+        )
+
+    day_rows, current = [], None
+    for row in rows.iterator(chunk_size=10000):
+        day = (row[0], bucket_start(row[1], "day"))
+        if day != current and day_rows:
+            flush(day_rows)
+            day_rows = []
+        current = day
+        day_rows.append(row)
+    if day_rows:
+        flush(day_rows)
+
+
+def window_summaries(data_type, since, cell=""):
+    """Hourly (count, sum, sum_sq, min, max, latest) rows from since's hour on"""
+    return DataPointRollup.objects.filter(
+        granularity="hour", data_type=data_type, cell=cell,
+        bucket__gte=bucket_start(since, "hour"),
+    ).order_by().values_list(*_FIELDS)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import PredictionResult, DataPoint
+from .models import PredictionResult, DataPoint, DataPointRollup
 
 class PredictionResultSerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,3 +10,12 @@ class DataPointSerializer(serializers.ModelSerializer):
     class Meta:
         model = DataPoint
         fields = '__all__'
+
+class DataPointRollupSerializer(serializers.ModelSerializer):
+    so2_mean = serializers.FloatField(read_only=True)
+    so2_std = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DataPointRollup
+        fields = ['id', 'granularity', 'data_type', 'cell', 'bucket', 'count',
+                  'so2_mean', 'so2_std', 'so2_min', 'so2_max', 'latest']
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import rollups
+from .cache import prediction_cache
+from .models import DataPoint
+
+
+@receiver([post_save, post_delete], sender=DataPoint)
+def invalidate_predictions(sender, instance, **kwargs):
+    """Drop cached predictions for the data type a DataPoint write touched"""
+    prediction_cache.invalidate(instance.data_type)
+
+
+@receiver(post_save, sender=DataPoint)
+def roll_up_saved_point(sender, instance, created, raw=False, **kwargs):
+    """Keep DataPointRollup in step with single-row saves
+
+    Bulk writes skip signals; their callers (load_datapoints) call
+    rollups.apply_points and rollups.rebuild themselves. A save that moves
+    a point to another day leaves the old day stale until rebuild_rollups.
+    """
+    if raw:
+        return
+    instance.timestamp = rollups.aware_timestamp(instance.timestamp)
+    if created:
+        rollups.apply_points([instance])
+    else:
+        rollups.rebuild(instance.data_type, [instance.timestamp])
+
+
+@receiver(post_delete, sender=DataPoint)
+def roll_up_deleted_point(sender, instance, **kwargs):
+    rollups.rebuild(instance.data_type, [rollups.aware_timestamp(instance.timestamp)])
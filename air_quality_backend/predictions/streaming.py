@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+
+from .models import DataPoint
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "POLL_INTERVAL": 1.0,
+    "POLL_BATCH": 1000,
+    "QUEUE_SIZE": 1000,
+    "HEARTBEAT": 15.0,
+    "REPLAY_LIMIT": 1000,
+    "MAX_SECONDS": 300.0,
+    "RETRY_MS": 3000,
+}
+
+DATAPOINT_FIELDS = ("id", "data_type", "so2_value", "latitude", "longitude", "timestamp")
+
+
+def stream_settings():
+    return dict(DEFAULTS, **getattr(settings, "EVENT_STREAM", {}))
+
+
+def format_event(event, data, event_id=None):
+    """One text/event-stream message"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+    """One client's data types and bounded queue of (data_type, event_id, message)
+
+    When the client reads slower than events arrive the queue fills up;
+    the subscription is then marked lagged and further events are
+    dropped until the stream has told the client to resynchronise.
+    """
+
+    def __init__(self, data_types, queue_size):
+        self.data_types = frozenset(data_types)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+
+    def offer(self, item):
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.lagged = False
+
+
+class EventBroadcaster:
+    """Fans new DataPoints and refreshed predictions out to stream subscribers
+
+    A single poller task per process, running only while someone is
+    subscribed, asks the database for DataPoints with an id above the last
+    one it saw. Polling the table rather than listening to signals also
+    picks up rows inserted by other processes such as load_datapoints.
+    Ids are assumed to become visible in increasing order, as SQLite's
+    serialized writers guarantee. Each new row is formatted once and
+    offered to the matching subscribers; when a poll brings rows of a data
+    type, predict(data_type) is awaited and its result published too.
+    """
+
+    def __init__(self, poll_interval=1.0, poll_batch=1000, queue_size=1000, predict=None):
+        self.poll_interval = poll_interval
+        self.poll_batch = poll_batch
+        self.queue_size = queue_size
+        self.predict = predict
+        self.last_id = None
+        self._subscribers = set()
+        self._task = None
+        self._ready = None
+
+    @classmethod
+    def from_settings(cls, predict=None):
+        config = stream_settings()
+        return cls(config["POLL_INTERVAL"], config["POLL_BATCH"], config["QUEUE_SIZE"], predict)
+
+    async def subscribe(self, data_types):
+        """New Subscription, once the poller knows the id it publishes after"""
+        subscription = Subscription(data_types, self.queue_size)
+        self._subscribers.add(subscription)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._ready = asyncio.Event()
+            self._task = loop.create_task(self._poll())
+        await self._ready.wait()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    async def current_id(self):
+        return (await DataPoint.objects.aaggregate(latest=Max("id")))["latest"] or 0
+
+    async def replay(self, data_types, after_id, limit):
+        """Rows of data_types with an id above after_id, and whether more than limit exist"""
+        rows = [
+            row async for row in DataPoint.objects.filter(
+                id__gt=after_id, data_type__in=data_types
+            ).order_by("id").values(*DATAPOINT_FIELDS)[:limit + 1]
+        ]
+        return rows[:limit], len(rows) > limit
+
+    def _publish(self, data_type, event_id, message):
+        for subscription in self._subscribers:
+            if data_type in subscription.data_types:
+                subscription.offer((data_type, event_id, message))
+
+    async def _poll(self):
+        # A restarted poller starts from now; reconnecting clients catch up
+        # through replay()
+        try:
+            self.last_id = await self.current_id()
+        finally:
+            self._ready.set()
+        while self._subscribers:
+            try:
+                rows = [
+                    row async for row in DataPoint.objects.filter(
+                        id__gt=self.last_id
+                    ).order_by("id").values(*DATAPOINT_FIELDS)[:self.poll_batch]
+                ]
+                for row in rows:
+                    self._publish(row["data_type"], row["id"],
+                                  format_event("datapoint", row, row["id"]))
+                if rows:
+                    self.last_id = rows[-1]["id"]
+                    if self.predict is not None:
+                        await self._publish_predictions({row["data_type"] for row in rows})
+                if len(rows) == self.poll_batch:
+                    continue
+            except Exception:
+                logger.exception("event stream poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _publish_predictions(self, data_types):
+        for data_type in sorted(data_types):
+            entry = await self.predict(data_type)
+            if entry is not None:
+                self._publish(data_type, None, format_event("prediction", entry))
+
+
+async def event_stream(broadcaster, data_types, last_event_id=None, heartbeat=15.0,
+                       max_seconds=300.0, replay_limit=1000, retry_ms=3000):
+    """text/event-stream messages for one client
+
+    Subscribes before replaying the rows after last_event_id, so nothing
+    inserted in between is missed, and skips live rows the replay already
+    sent. A replay longer than replay_limit, or a client that falls
+    behind its queue, gets a 'reset' event whose id jumps to the newest
+    row: the client should refetch over REST and carries on live from
+    there. Comment heartbeats keep idle connections open; after
+    max_seconds the stream ends and EventSource reconnects with
+    Last-Event-ID, which bounds how long a vanished client is held.
+    """
+    subscription = await broadcaster.subscribe(data_types)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        yield f"retry: {retry_ms}\n\n"
+
+        sent_id = last_event_id
+        if last_event_id is not None:
+            rows, truncated = await broadcaster.replay(data_types, last_event_id, replay_limit)
+            if truncated:
+                sent_id = await broadcaster.current_id()
+                yield format_event("reset", {"reason": "replay_limit"}, sent_id)
+            else:
+                for row in rows:
+                    sent_id = row["id"]
+                    yield format_event("datapoint", row, row["id"])
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                data_type, event_id, message = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=min(heartbeat, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+
+            if subscription.lagged:
+                subscription.drain()
+                sent_id = broadcaster.last_id
+                yield format_event("reset", {"reason": "lagged"}, sent_id)
+                continue
+            if event_id is not None and sent_id is not None and event_id <= sent_id:
+                continue
+            if event_id is not None:
+                sent_id = event_id
+            yield message
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -1,3 +1,1486 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import h5py
+import joblib
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from sklearn.ensemble import (
+    AdaBoostRegressor,
+    BaggingRegressor,
+    ExtraTreesRegressor,
+    GradientBoostingRegressor,
+    RandomForestRegressor,
+    VotingRegressor,
+)
+from sklearn.linear_model import LinearRegression, PoissonRegressor, Ridge
+from sklearn.preprocessing import StandardScaler
+
+from . import metrics, rollups, views
+from .artifacts import ArtifactStore
+from .cache import LocMemLRUBackend, prediction_cache
+from .compiled import CompiledModel, compile_model
+from .features import TIME_FIELDS, multi_output_features, rollup_window_stats
+from .inference import InferencePool
+from .loading import upsert_datapoints
+from .management.commands.load_datapoints import _processor_module
+from .streaming import EventBroadcaster, event_stream
+from .models import DataPoint, DataPointRollup, LoadCheckpoint
+from .registry import ModelRegistry
+
+
+def write_model(model_dir, data_type, intercept, suffix="", slope=0.0):
+    """Dump a linear model (intercept + slope * so2_mean) and a fitted scaler"""
+    X = np.random.default_rng(0).normal(size=(32, 16))
+    scaler = StandardScaler().fit(X)
+    model = LinearRegression().fit(scaler.transform(X), intercept + slope * X[:, 0])
+    model_name = f"{data_type}_model{suffix}.pkl"
+    scaler_name = f"{data_type}_scaler{suffix}.pkl"
+    joblib.dump(model, os.path.join(model_dir, model_name))
+    joblib.dump(scaler, os.path.join(model_dir, scaler_name))
+    return model_name, scaler_name
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir)
+        self.features = np.zeros((1, 16))
+
+    def predict(self, loaded):
+        return loaded.model.predict(loaded.scaler.transform(self.features))[0]
+
+    def test_loads_lazily_and_reports_missing_models(self):
+        registry = ModelRegistry(self.model_dir, check_interval=0)
+        write_model(self.model_dir, "ground", 3.0)
+
+        self.assertEqual(registry._entries, {})
+        self.assertAlmostEqual(self.predict(registry.get("ground")), 3.0)
+        self.assertIsNone(registry.get("satellite"))
+        self.assertEqual(list(registry.available()), ["ground"])
+
+    def test_swaps_in_retrained_model(self):
+        registry = ModelRegistry(self.model_dir, check_interval=0)
+        write_model(self.model_dir, "ground", 3.0)
+        before = registry.get("ground")
+
+        write_model(self.model_dir, "ground", 5.0)
+        os.utime(os.path.join(self.model_dir, "ground_model.pkl"), ns=(1, 10**18))
+        after = registry.get("ground")
+
+        self.assertNotEqual(before.version, after.version)
+        self.assertAlmostEqual(self.predict(after), 5.0)
+        # A request holding the old entry keeps a working model
+        self.assertAlmostEqual(self.predict(before), 3.0)
+
+    def test_manifest_selects_version(self):
+        registry = ModelRegistry(self.model_dir, check_interval=0)
+        write_model(self.model_dir, "ground", 3.0)
+        model_name, scaler_name = write_model(self.model_dir, "ground", 7.0, suffix="_v2")
+        with open(os.path.join(self.model_dir, "models_manifest.json"), "w") as f:
+            json.dump({"ground": {"version": "2", "model": model_name, "scaler": scaler_name}}, f)
+
+        loaded = registry.get("ground")
+        self.assertEqual(loaded.version, "2")
+        self.assertAlmostEqual(self.predict(loaded), 7.0)
+
+    def test_failed_reload_keeps_previous_model(self):
+        registry = ModelRegistry(self.model_dir, check_interval=0)
+        write_model(self.model_dir, "ground", 3.0)
+        before = registry.get("ground")
+
+        with open(os.path.join(self.model_dir, "ground_model.pkl"), "wb") as f:
+            f.write(b"truncated")
+        with self.assertLogs("predictions.registry", level="ERROR"):
+            self.assertIs(registry.get("ground"), before)
+
+
+class CompiledModelTests(TestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir)
+        rng = np.random.default_rng(0)
+        self.X = rng.normal(5.0, 3.0, size=(400, 16))
+        self.y = 2.0 * self.X[:, 0] + np.sin(self.X[:, 1]) + rng.normal(0, 0.1, 400)
+        self.scaler = StandardScaler().fit(self.X)
+        # Training rows sit next to the split thresholds, fresh rows anywhere
+        self.rows = np.vstack([self.X[:50], rng.normal(5.0, 3.0, size=(50, 16))])
+
+    def round_trip(self, model):
+        path = os.path.join(self.model_dir, "model.npz")
+        compile_model(model, self.scaler).save(path)
+        return CompiledModel.load(path)
+
+    def test_matches_sklearn(self):
+        multi = np.column_stack([self.y, self.X[:, 2]])
+        for model, y in ((RandomForestRegressor(n_estimators=10, random_state=0), self.y),
+                         (RandomForestRegressor(n_estimators=10, random_state=0), multi),
+                         (ExtraTreesRegressor(n_estimators=10, random_state=0), self.y),
+                         (GradientBoostingRegressor(n_estimators=20, random_state=0), self.y),
+                         (LinearRegression(), multi),
+                         (Ridge(alpha=0.5), self.y)):
+            model.fit(self.scaler.transform(self.X), y)
+            expected = model.predict(self.scaler.transform(self.rows))
+            np.testing.assert_allclose(self.round_trip(model).predict(self.rows), expected,
+                                       rtol=1e-12, atol=1e-12)
+
+    def test_unsupported_ensembles_are_type_errors(self):
+        for model in (AdaBoostRegressor(n_estimators=5, random_state=0),
+                      BaggingRegressor(n_estimators=5, random_state=0),
+                      VotingRegressor([("linear", LinearRegression())])):
+            model.fit(self.scaler.transform(self.X), self.y)
+            with self.assertRaises(TypeError):
+                compile_model(model, self.scaler)
+        # Linear in its features, but predicts through a log link
+        with self.assertRaises(TypeError):
+            compile_model(PoissonRegressor().fit(self.scaler.transform(self.X), np.abs(self.y)))
+
+        metadata = ArtifactStore(self.model_dir).publish("ground", model, self.scaler)
+        self.assertNotIn("compiled", metadata["files"])
+
+    def test_registry_ignores_stale_exports(self):
+        registry = ModelRegistry(self.model_dir, check_interval=0)
+        write_model(self.model_dir, "ground", 3.0)
+        model = joblib.load(os.path.join(self.model_dir, "ground_model.pkl"))
+        scaler = joblib.load(os.path.join(self.model_dir, "ground_scaler.pkl"))
+        compile_model(model, scaler).save(os.path.join(self.model_dir, "ground_compiled.npz"))
+        self.assertIsNotNone(registry.get("ground").compiled)
+
+        write_model(self.model_dir, "ground", 5.0)
+        os.utime(os.path.join(self.model_dir, "ground_model.pkl"), ns=(1, 10**19))
+        loaded = registry.get("ground")
+        self.assertIsNone(loaded.compiled)
+        self.assertAlmostEqual(views.run_model(loaded, np.zeros((1, 16)))[0], 5.0)
+
+    def test_views_predict_through_the_export(self):
+        write_model(self.model_dir, "ground", 1.0, slope=2.0)
+        model = joblib.load(os.path.join(self.model_dir, "ground_model.pkl"))
+        scaler = joblib.load(os.path.join(self.model_dir, "ground_scaler.pkl"))
+        compile_model(model, scaler).save(os.path.join(self.model_dir, "ground_compiled.npz"))
+        registry = ModelRegistry(self.model_dir, check_interval=0)
+
+        with mock.patch.object(views, "registry", registry), \
+                mock.patch.object(scaler.__class__, "transform", side_effect=AssertionError):
+            response = self.client.post(reverse("predict_custom"), {"so2_mean": 4.0},
+                                        content_type="application/json")
+        self.assertAlmostEqual(response.data["ground"]["prediction"], 1.0 + 2.0 * 4.0)
+
+
+class ArtifactStoreTests(TestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir)
+        self.store = ArtifactStore(self.model_dir)
+        self.X = np.random.default_rng(0).normal(size=(32, 16))
+        self.scaler = StandardScaler().fit(self.X)
+
+    def publish(self, intercept, **kwargs):
+        model = LinearRegression().fit(self.scaler.transform(self.X), np.full(32, intercept))
+        return self.store.publish(
+            "ground", model, self.scaler, metrics={"best_model": "LinearRegression",
+                                                  "best_r2": 0.5, "models": {}},
+            data={"rows": 32}, info={"method": "full"}, **kwargs
+        )
+
+    def test_registry_serves_current_bundle_with_metadata(self):
+        registry = ModelRegistry(self.model_dir, check_interval=0)
+        self.publish(3.0)
+        self.assertEqual(registry.get("ground").version, "1")
+
+        self.publish(5.0)
+        loaded = registry.get("ground")
+        self.assertEqual(loaded.version, "2")
+        self.assertAlmostEqual(loaded.compiled.predict(self.X[:1])[0], 5.0)
+        self.assertEqual(loaded.metadata["data"], {"rows": 32})
+
+        with mock.patch.object(views, "registry", registry):
+            info = self.client.get(reverse("get_model_info")).json()["ground"]
+        self.assertEqual(info["version"], "2")
+        self.assertEqual(info["model_type"], "LinearRegression")
+        self.assertEqual(views.model_name(loaded), "LinearRegression")
+        self.assertEqual(info["last_trained"], loaded.metadata["created_at"])
+        self.assertEqual(info["metrics"]["best_r2"], 0.5)
+        self.assertTrue(info["storage"]["mmap"])
+
+    def test_compressed_bundles_pinning_and_pruning(self):
+        for intercept in (1.0, 2.0, 3.0, 4.0):
+            metadata = self.publish(intercept, compress=3)
+        self.assertEqual(metadata["compression"], "zlib:3")
+        self.assertEqual(self.store.versions("ground"), [2, 3, 4])
+
+        registry = ModelRegistry(self.model_dir, check_interval=0, pinned_versions={"ground": 3})
+        loaded = registry.get("ground")
+        self.assertEqual(loaded.version, "3")
+        self.assertAlmostEqual(loaded.model.predict(loaded.scaler.transform(self.X[:1]))[0], 3.0)
+        self.assertFalse(loaded.metadata["mmap"])
+
+    @override_settings(PREDICTION_MODEL_KEEP_VERSIONS=2, PREDICTION_MODEL_VERSIONS={"ground": "1"})
+    def test_pinned_and_current_versions_survive_pruning(self):
+        self.store = ArtifactStore.from_settings(self.model_dir)
+        for intercept in (1.0, 2.0, 3.0, 4.0, 5.0):
+            self.publish(intercept)
+        self.assertEqual(self.store.versions("ground"), [1, 4, 5])
+        registry = ModelRegistry(self.model_dir, check_interval=0, pinned_versions={"ground": "1"})
+        self.assertEqual(registry.get("ground").version, "1")
+
+        # A manifest rolled back by hand keeps its version as well
+        manifest_path = os.path.join(self.model_dir, "models_manifest.json")
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest["ground"]["version"] = "4"
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+        self.store.pinned_versions = {}
+        self.store._prune("ground", 6)
+        self.assertEqual(self.store.versions("ground"), [4, 5])
+
+
+    def test_concurrent_publishers_keep_each_others_entries(self):
+        read_manifest = ArtifactStore.read_manifest
+
+        def slow_read(store):
+            # Widens the window between reading and replacing the manifest
+            manifest = read_manifest(store)
+            threading.Event().wait(0.05)
+            return manifest
+
+        model = LinearRegression().fit(self.X, np.zeros(32))
+        publishers = [
+            threading.Thread(target=ArtifactStore(self.model_dir).publish,
+                             args=(data_type, model, self.scaler))
+            for data_type in ("ground", "satellite")
+        ]
+        with mock.patch.object(ArtifactStore, "read_manifest", slow_read):
+            for publisher in publishers:
+                publisher.start()
+            for publisher in publishers:
+                publisher.join()
+        self.assertEqual(sorted(self.store.read_manifest()), ["ground", "satellite"])
+
+    def test_processor_reads_settings_only_when_it_needs_the_store(self):
+        dp = _processor_module()
+        with mock.patch.object(dp, "artifact_store", wraps=dp.artifact_store) as artifact_store:
+            processor = dp.AirQualityDataProcessor(model_dir=self.model_dir)
+            artifact_store.assert_not_called()
+            self.assertIs(processor.store, processor.store)
+        artifact_store.assert_called_once_with(self.model_dir)
+
+
+class IncrementalUpdateTests(TestCase):
+    """AirQualityDataProcessor.update_models against a published bundle"""
+
+    def setUp(self):
+        self.dp = _processor_module()
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir)
+        self.processor = self.dp.AirQualityDataProcessor(model_dir=self.model_dir)
+        data = self.hourly_frame(0, 120)
+        X, y = self.dp.build_window_features(data)
+        self.scaler = StandardScaler().fit(X)
+        self.data = data
+
+    def hourly_frame(self, start, n_rows):
+        rng = np.random.default_rng(start)
+        dates = pd.date_range("2024-01-01", periods=start + n_rows, freq="h")[start:]
+        return self.dp.add_time_features(pd.DataFrame({"date": dates,
+                                                       "so2": rng.normal(8.0, 1.5, n_rows)}))
+
+    def publish(self, model):
+        X, y = self.dp.build_window_features(self.data)
+        model.fit(self.scaler.transform(X), y)
+        return self.processor.store.publish("ground", model, self.scaler,
+                                            context=self.data.tail(self.dp.CONTEXT_ROWS))
+
+    def update(self, n_rows, **kwargs):
+        frame = self.hourly_frame(len(self.data), n_rows)
+        with redirect_stdout(StringIO()):
+            return self.processor.update_models({"ground": frame}, **kwargs).get("ground")
+
+    def test_warm_start_adds_trees_on_windows_completed_by_new_rows(self):
+        self.publish(RandomForestRegressor(n_estimators=5, random_state=0))
+        metadata = self.update(10, extra_trees=3)
+
+        # The stored context completes one window per new row
+        self.assertEqual(metadata["info"], {"method": "warm_start", "base_version": "1",
+                                            "n_windows": 10})
+        self.assertEqual(self.processor.store.current_version("ground"), "2")
+        bundle = self.processor.store.load("ground")
+        self.assertEqual(len(bundle.model.estimators_), 8)
+        self.assertEqual(bundle.context["date"].iloc[-1], pd.Timestamp("2024-01-06 09:00"))
+        self.assertEqual(len(bundle.context), self.dp.CONTEXT_ROWS)
+
+        metadata = self.update(10, extra_trees=3, max_trees=9)
+        self.assertEqual(metadata["version"], "3")
+        self.assertEqual(len(self.processor.store.load("ground").model.estimators_), 9)
+
+    def test_no_new_windows_only_moves_the_context(self):
+        self.publish(RandomForestRegressor(n_estimators=5, random_state=0))
+        metadata = self.update(0)
+
+        self.assertEqual(metadata["info"]["method"], "context_only")
+        self.assertEqual(metadata["info"]["n_windows"], 0)
+        self.assertEqual(self.processor.store.current_version("ground"), "2")
+        self.assertEqual(len(self.processor.store.load("ground").model.estimators_), 5)
+
+    def test_models_without_incremental_fit_are_not_republished(self):
+        self.publish(LinearRegression())
+        self.assertIsNone(self.update(10))
+        self.assertEqual(self.processor.store.current_version("ground"), "1")
+
+
+def reference_window_features(dp, data, window_size=7, prediction_days=7):
+    """The original row-by-row iloc loop that build_window_features replaced"""
+    features, targets = [], []
+    for i in range(window_size, len(data) - prediction_days + 1):
+        window = data.iloc[i - window_size:i]
+        so2 = window["so2"]
+        features.append([so2.mean(), so2.std(), so2.min(), so2.max(), so2.median()]
+                        + window.iloc[-1][dp.TIME_FEATURE_COLUMNS].tolist())
+        targets.append(data.iloc[i:i + prediction_days]["so2"].mean())
+    n_features = 5 + len(dp.TIME_FEATURE_COLUMNS)
+    return (np.array(features, dtype=np.float64).reshape(len(targets), n_features),
+            np.array(targets, dtype=np.float64))
+
+
+class WindowFeatureTests(TestCase):
+    """build_window_features against the loop it replaced"""
+
+    def setUp(self):
+        self.dp = _processor_module()
+
+    def frame(self, values):
+        dates = pd.date_range("2024-01-01", periods=len(values), freq="h")
+        return self.dp.add_time_features(pd.DataFrame({"date": dates, "so2": values}))
+
+    def assertMatchesLoop(self, data, chunk_size=1_000_000):
+        X_ref, y_ref = reference_window_features(self.dp, data)
+        with warnings.catch_warnings():
+            # Windows with no values left warn in the nan-aware reducers
+            warnings.simplefilter("ignore", RuntimeWarning)
+            X, y = self.dp.build_window_features(data, chunk_size=chunk_size)
+        self.assertEqual(X.shape, (len(y_ref), 16))
+        np.testing.assert_array_equal(X, X_ref)
+        np.testing.assert_array_equal(y, y_ref)
+
+    def test_matches_loop_across_chunk_boundaries(self):
+        data = self.frame(np.random.default_rng(0).normal(8.0, 1.5, 200))
+        for chunk_size in (1, 7, 97, 1_000_000):
+            self.assertMatchesLoop(data, chunk_size)
+
+    def test_matches_loop_with_nan_gaps(self):
+        values = np.random.default_rng(1).normal(8.0, 1.5, 120)
+        values[[3, 40, 41]] = np.nan
+        # A gap longer than a window leaves windows with one value or none
+        values[60:74] = np.nan
+        self.assertMatchesLoop(self.frame(values), chunk_size=11)
+
+    def test_series_shorter_than_a_window(self):
+        for n_rows in (0, 5, 13):
+            self.assertMatchesLoop(self.frame(np.arange(n_rows, dtype=np.float64)))
+        # The first series long enough gives exactly one window
+        X, y = self.dp.build_window_features(self.frame(np.arange(14, dtype=np.float64)))
+        self.assertEqual((X.shape, y.tolist()), ((1, 16), [10.0]))
+
+    def test_multi_output_builder_agrees_on_so2(self):
+        data = self.frame(np.random.default_rng(2).normal(8.0, 1.5, 100))
+        X_ref, y_ref = reference_window_features(self.dp, data)
+        X, Y = self.dp.build_multi_window_features(data, ["so2"], chunk_size=13)
+        np.testing.assert_array_equal(X, X_ref)
+        # Its per-day targets average to the 7-day target
+        np.testing.assert_allclose(Y.mean(axis=1), y_ref, rtol=1e-12)
+
+
+def write_granule(path, so2, start):
+    """HDF5 granule of so2 (rows, cols) on a 1-degree grid, one scan line per minute"""
+    rows, cols = so2.shape
+    latitude, longitude = np.meshgrid(np.arange(rows, dtype=np.float64),
+                                      np.arange(cols, dtype=np.float64), indexing="ij")
+    times = pd.Timestamp(start).timestamp() + 60.0 * np.repeat(np.arange(rows), cols)
+    with h5py.File(path, "w") as f:
+        f.create_dataset("SO2", data=so2)
+        f.create_dataset("Latitude", data=latitude)
+        f.create_dataset("Longitude", data=longitude)
+        f.create_dataset("Time", data=times.reshape(rows, cols))
+
+
+class SatelliteStreamTests(TestCase):
+    """RunningStats and stream_satellite_data against the in-memory batch path"""
+
+    def setUp(self):
+        self.dp = _processor_module()
+
+    def test_running_stats_merge_matches_pandas(self):
+        rng = np.random.default_rng(0)
+        batches = [rng.normal(3.0, 2.0, size) for size in (1, 50, 0, 7, 400)]
+        batches[3][2] = np.nan
+        stats = self.dp.RunningStats()
+        for batch in batches:
+            stats.update(batch)
+
+        values = pd.Series(np.concatenate(batches))
+        self.assertEqual(stats.count, values.count())
+        self.assertAlmostEqual(stats.mean, values.mean(), places=12)
+        self.assertAlmostEqual(stats.std(), values.std(ddof=1), places=12)
+        self.assertTrue(np.isnan(self.dp.RunningStats().update([1.0]).std()))
+
+    def test_stream_concatenates_to_the_batch_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        rng = np.random.default_rng(1)
+        for i in range(3):
+            so2 = rng.normal(1.0, 0.5, (20, 6))
+            so2[i, i] = np.nan
+            # Far outside 3 sigma of the combined data
+            so2[-1, -1] = 50.0
+            write_granule(os.path.join(directory, f"granule_{i}.h5"), so2, f"2024-01-0{i + 1}")
+
+        processor = self.dp.AirQualityDataProcessor()
+        with redirect_stdout(StringIO()):
+            streamed = list(processor.stream_satellite_data(directory, read_bytes=1024))
+            batch = self.dp.AirQualityDataProcessor().process_satellite_data(directory)
+
+        self.assertEqual(len(streamed), 3)
+        self.assertEqual(processor.satellite_so2_stats.count, 3 * (20 * 6 - 1))
+        pd.testing.assert_frame_equal(pd.concat(streamed, ignore_index=True),
+                                      batch.reset_index(drop=True))
+        self.assertLess(batch["so2"].max(), 50.0)
+
+
+class FrameCacheTests(TestCase):
+    """Processed-frame caching in AirQualityDataProcessor and data_cache.FrameCache"""
+
+    def setUp(self):
+        self.dp = _processor_module()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.cache_dir = os.path.join(self.tmp, "cache")
+        self.csv = os.path.join(self.tmp, "ground.csv")
+        with open(self.csv, "w") as f:
+            f.write("date,so2\n")
+            for day in range(1, 11):
+                f.write(f"2024-01-{day:02d},{day / 2}\n")
+        self.granules = os.path.join(self.tmp, "granules")
+        os.makedirs(self.granules)
+        for i in range(3):
+            self.write_granule(i)
+
+    def write_granule(self, i, offset=0.0):
+        so2 = np.arange(12, dtype=np.float64).reshape(4, 3) + i + offset
+        write_granule(os.path.join(self.granules, f"granule_{i}.h5"), so2, f"2024-01-0{i + 1}")
+
+    def process(self, method, path):
+        """(frame, printed output) of a processor method run with the cache"""
+        with redirect_stdout(StringIO()) as out:
+            frame = getattr(self.dp.AirQualityDataProcessor(cache_dir=self.cache_dir), method)(path)
+        return frame, out.getvalue()
+
+    def touch(self, path):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_unchanged_source_is_a_hit(self):
+        first, output = self.process("process_ground_data", self.csv)
+        self.assertNotIn("from cache", output)
+        cached, output = self.process("process_ground_data", self.csv)
+        self.assertIn("Loaded ground data from cache", output)
+        pd.testing.assert_frame_equal(cached, first, check_index_type=False)
+
+    def test_size_or_mtime_change_is_a_miss(self):
+        cache = self.dp.FrameCache(self.cache_dir)
+        self.process("process_ground_data", self.csv)
+        self.assertIsNotNone(cache.load("ground", self.csv, [self.dp.fingerprint(self.csv)]))
+
+        self.touch(self.csv)
+        self.assertIsNone(cache.load("ground", self.csv, [self.dp.fingerprint(self.csv)]))
+        self.assertNotIn("from cache", self.process("process_ground_data", self.csv)[1])
+
+        with open(self.csv, "a") as f:
+            f.write("2024-01-11,9.0\n")
+        frame, output = self.process("process_ground_data", self.csv)
+        self.assertNotIn("from cache", output)
+        self.assertEqual(frame["so2"].iloc[-1], 9.0)
+
+    def test_changed_granule_is_the_only_one_read(self):
+        self.assertIn("0 granules cached, 3 to read",
+                      self.process("process_satellite_data", self.granules)[1])
+        self.assertIn("Loaded satellite data from cache",
+                      self.process("process_satellite_data", self.granules)[1])
+
+        self.write_granule(1, offset=0.5)
+        self.touch(os.path.join(self.granules, "granule_1.h5"))
+        with mock.patch.object(self.dp, "read_satellite_granule",
+                               wraps=self.dp.read_satellite_granule) as read:
+            frame, output = self.process("process_satellite_data", self.granules)
+        self.assertIn("2 granules cached, 1 to read", output)
+        self.assertEqual([os.path.basename(call.args[0]) for call in read.call_args_list],
+                         ["granule_1.h5"])
+
+        with redirect_stdout(StringIO()):
+            uncached = self.dp.AirQualityDataProcessor().process_satellite_data(self.granules)
+        pd.testing.assert_frame_equal(frame.reset_index(drop=True),
+                                      uncached.reset_index(drop=True))
+
+    def test_deleted_granules_are_pruned(self):
+        self.process("process_satellite_data", self.granules)
+        granule_entries = os.path.join(self.cache_dir, "granules")
+        self.assertEqual(len(os.listdir(granule_entries)), 3)
+
+        os.remove(os.path.join(self.granules, "granule_2.h5"))
+        frame, output = self.process("process_satellite_data", self.granules)
+        self.assertIn("2 granules cached, 0 to read", output)
+        self.assertEqual(len(os.listdir(granule_entries)), 2)
+        self.assertEqual(self.dp.FrameCache(self.cache_dir).prune_missing("granules"), 0)
+        self.assertEqual(len(frame), 2 * 12)
+
+
+class SpatialGridTests(TestCase):
+    """spatial_index.SpatialGrid binning, merging and queries"""
+
+    def setUp(self):
+        self.SpatialGrid = _processor_module().SpatialGrid
+
+    def pixels(self, latitude, longitude, so2, date="2024-01-01"):
+        return pd.DataFrame({"latitude": latitude, "longitude": longitude, "so2": so2,
+                             "date": pd.to_datetime(date)})
+
+    def test_cells_bin_from_the_south_west_corner(self):
+        grid = self.SpatialGrid(10.0)
+        ids = grid.cell_ids([-90.0, 0.0, 5.0, 90.0, 0.0], [-180.0, 0.0, -5.0, 179.9, 180.0])
+        # 36 columns per row; 180 wraps to -180 and the north pole stays in the last row
+        self.assertEqual(ids.tolist(), [0, 9 * 36 + 18, 9 * 36 + 17, 17 * 36 + 35, 9 * 36])
+        latitude, longitude = grid.cell_centers(ids[:3])
+        self.assertEqual((latitude.tolist(), longitude.tolist()),
+                         ([-85.0, 5.0, 5.0], [-175.0, 5.0, -5.0]))
+
+    def test_batches_merge_into_cell_days(self):
+        rng = np.random.default_rng(0)
+        batches = [
+            self.pixels(rng.uniform(0, 2, 50), rng.uniform(0, 2, 50), rng.normal(1, 0.3, 50),
+                        date)
+            for date in ("2024-01-02", "2024-01-01", "2024-01-02")
+        ]
+        grid = self.SpatialGrid(1.0)
+        for batch in batches:
+            grid.add(batch)
+
+        pixels = pd.concat(batches, ignore_index=True)
+        pixels["cell"] = grid.cell_ids(pixels["latitude"], pixels["longitude"])
+        expected = pixels.assign(sum_sq=pixels["so2"] ** 2).groupby(["cell", "date"]).agg(
+            count=("so2", "size"), sum=("so2", "sum"), sum_sq=("sum_sq", "sum"),
+            min=("so2", "min"), max=("so2", "max"))
+        self.assertEqual(grid.cells.tolist(), sorted(set(pixels["cell"])))
+        self.assertEqual(len(grid.days), len(expected))
+        np.testing.assert_array_equal(grid.count, expected["count"])
+        for name in ("sum", "sum_sq", "min", "max"):
+            np.testing.assert_allclose(getattr(grid, name), expected[name], rtol=1e-12)
+
+    def test_bbox_across_the_antimeridian(self):
+        grid = self.SpatialGrid(1.0).add(
+            self.pixels([0.5, 0.5, 0.5, 20.5], [175.5, -175.5, 0.5, 179.5], [1.0] * 4))
+        cells = grid.cells_in_bbox(-10, 10, 170, -170)
+        self.assertEqual(sorted(cells.tolist()),
+                         sorted(grid.cell_ids([0.5, 0.5], [175.5, -175.5]).tolist()))
+        self.assertEqual(len(grid.cells_in_bbox(-90, 90, -180, 180)), 4)
+
+    def test_nearest_cell(self):
+        grid = self.SpatialGrid(1.0).add(
+            self.pixels([0.5, 0.5], [-179.5, 170.5], [1.0, 2.0]))
+        self.assertIsNone(self.SpatialGrid(1.0).nearest_cell(0, 0))
+        self.assertEqual(grid.nearest_cell(0.2, 170.9), int(grid.cell_ids(0.5, 170.5)))
+        # Closer across the antimeridian than along the same hemisphere
+        self.assertEqual(grid.nearest_cell(0.5, 178.0), int(grid.cell_ids(0.5, -179.5)))
+
+    def test_save_load_round_trip(self):
+        grid = self.SpatialGrid(2.5).add(
+            self.pixels([1.0, 1.5, -40.0], [10.0, 10.5, 100.0], [1.0, 3.0, 2.0]))
+        path = os.path.join(tempfile.mkdtemp(), "grid.npz")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        grid.save(path)
+
+        loaded = self.SpatialGrid.load(path)
+        self.assertEqual(loaded.cell_size, 2.5)
+        for name in ("cells", "cell_offsets", "days", "count", "sum", "sum_sq", "min", "max"):
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(grid, name))
+        cell = loaded.nearest_cell(1.0, 10.0)
+        pd.testing.assert_frame_equal(loaded.cell_frame(cell), grid.cell_frame(cell))
+        self.assertEqual(loaded.cell_frame(cell)["so2"].tolist(), [2.0])
+
+
+class StageProfilerTests(TestCase):
+    """profiling.StageProfiler as data_processing.py --profile uses it"""
+
+    def setUp(self):
+        self.StageProfiler = _processor_module().StageProfiler
+
+    def test_nested_and_recorded_stages(self):
+        profiler = self.StageProfiler()
+        with profiler.stage("train"):
+            with profiler.stage("windows"):
+                pass
+            profiler.record("fit_RandomForest", wall_seconds=2.5, predict_seconds=0.1)
+        with profiler.stage("save"):
+            pass
+        profiler.record("upload", wall_seconds=1.0)
+
+        self.assertEqual([(entry["name"], entry["depth"]) for entry in profiler.stages],
+                         [("train", 0), ("train/windows", 1), ("train/fit_RandomForest", 1),
+                          ("save", 0), ("upload", 0)])
+        recorded = profiler.stages[2]
+        self.assertEqual(recorded, {"name": "train/fit_RandomForest", "depth": 1,
+                                    "external": True, "wall_seconds": 2.5,
+                                    "predict_seconds": 0.1})
+        self.assertGreaterEqual(profiler.stages[0]["wall_seconds"],
+                                profiler.stages[1]["wall_seconds"])
+        self.assertIn("  windows", profiler.summary())
+
+    def test_disabled_profiler_is_a_no_op(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        profile_dir = os.path.join(tmp, "profiles")
+        profiler = self.StageProfiler(enabled=False, trace_memory=True, cprofile_dir=profile_dir)
+        with profiler.stage("train") as entry:
+            profiler.record("fit", wall_seconds=1.0)
+        self.assertIsNone(entry)
+        self.assertEqual(profiler.stages, [])
+        self.assertFalse(profiler.trace_memory)
+        self.assertFalse(os.path.exists(profile_dir))
+
+    def test_json_report_fields(self):
+        was_tracing = tracemalloc.is_tracing()
+        profiler = self.StageProfiler(trace_memory=True)
+        if not was_tracing:
+            self.addCleanup(tracemalloc.stop)
+        with profiler.stage("read"):
+            with profiler.stage("parse"):
+                data = np.ones(1_000_000)
+            del data
+
+        path = os.path.join(tempfile.mkdtemp(), "profile.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        profiler.write_report(path)
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual(set(report), {"started_at", "python", "platform", "cpu_count",
+                                       "trace_memory", "wall_seconds", "cpu_seconds",
+                                       "peak_rss_bytes", "stages"})
+        self.assertTrue(report["trace_memory"])
+        read, parse = report["stages"]
+        self.assertLessEqual({"name", "depth", "wall_seconds", "cpu_seconds",
+                              "children_cpu_seconds", "peak_rss_bytes", "traced_peak_bytes"},
+                             set(parse))
+        # The child's allocation counts towards its parent's peak as well
+        self.assertGreaterEqual(parse["traced_peak_bytes"], 8_000_000)
+        self.assertGreaterEqual(read["traced_peak_bytes"], parse["traced_peak_bytes"])
+
+
+class TimeSeriesSelectionTests(TestCase):
+    """time_series_splitter folds and the model selection built on them"""
+
+    def setUp(self):
+        self.dp = _processor_module()
+
+    def test_folds_are_time_ordered_with_a_gap(self):
+        gap = self.dp.PREDICTION_DAYS - 1
+        for mode in ("expanding", "sliding"):
+            splitter = self.dp.time_series_splitter(100, mode)
+            folds = list(splitter.split(np.zeros((100, 1))))
+            self.assertEqual(len(folds), 5)
+            for train, test in folds:
+                # Training windows end gap samples before the test windows start
+                self.assertFalse(set(train) & set(test))
+                self.assertEqual(test.min() - train.max() - 1, gap)
+            sizes = {len(train) for train, _ in folds}
+            self.assertEqual(len(sizes) == 1, mode == "sliding")
+
+    def test_fold_count_shrinks_for_short_series(self):
+        counts = {n: self.dp.time_series_splitter(n) for n in (40, 30, 20, 15)}
+        self.assertEqual({n: splitter and splitter.get_n_splits()
+                          for n, splitter in counts.items()},
+                         {40: 5, 30: 3, 20: 2, 15: None})
+
+    def test_short_series_falls_back_to_a_shuffled_split(self):
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir)
+        processor = self.dp.AirQualityDataProcessor(model_dir=model_dir)
+        rng = np.random.default_rng(0)
+        dates = pd.date_range("2024-01-01", periods=28, freq="D")
+        # 28 rows give 15 windows, too few for two folds
+        processor.ground_data = self.dp.add_time_features(
+            pd.DataFrame({"date": dates, "so2": rng.normal(8.0, 1.5, 28)}))
+
+        with redirect_stdout(StringIO()) as out:
+            report = processor.train_models(n_jobs=1, cv="expanding")["ground"]
+        self.assertIn("Too few windows (15) for time-series CV", out.getvalue())
+        self.assertEqual(report["selection"], "holdout")
+
+    def test_search_requires_cv(self):
+        stderr = StringIO()
+        with mock.patch("sys.argv", ["data_processing.py", "--search"]), \
+                mock.patch("sys.stderr", stderr), self.assertRaises(SystemExit) as exit:
+            self.dp.main()
+        self.assertEqual(exit.exception.code, 2)
+        self.assertIn("--search requires --cv", stderr.getvalue())
+
+
+class ServedModelsMixin:
+    """Serve linear test models from a temporary directory"""
+
+    def setUp(self):
+        super().setUp()
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir)
+        write_model(model_dir, "ground", 1.0, slope=2.0)
+        write_model(model_dir, "satellite", -1.0, slope=0.5)
+        patcher = mock.patch.object(views, "registry", ModelRegistry(model_dir, check_interval=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+def add_points(data_type, values, end=None):
+    """One DataPoint per hour ending at end (default now), oldest first
+
+    Rolled up the way load_datapoints does after its bulk inserts.
+    """
+    end = end or timezone.now()
+    points = DataPoint.objects.bulk_create([
+        DataPoint(data_type=data_type, so2_value=value,
+                  timestamp=end - timedelta(hours=len(values) - 1 - i))
+        for i, value in enumerate(values)
+    ])
+    rollups.apply_points(points)
+    return points
+
+
+class BatchPredictionTests(ServedModelsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.scenarios = [
+            {"so2_mean": mean, "so2_std": 1.0, "so2_min": 0.5, "so2_max": 9.0, "so2_median": mean,
+             "year": 2024, "month": month, "day": 15, "day_of_week": 2, "hour": 12}
+            for mean, month in ((3.0, 1), (8.5, 6), (12.0, 11))
+        ]
+
+    def test_matches_single_predictions_in_input_order(self):
+        response = self.client.post(reverse("predict_custom_batch"), self.scenarios,
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 3)
+
+        for i, scenario in enumerate(self.scenarios):
+            single = self.client.post(reverse("predict_custom"), scenario,
+                                      content_type="application/json").data
+            for data_type in ("ground", "satellite"):
+                self.assertAlmostEqual(response.data[data_type]["predictions"][i],
+                                       single[data_type]["prediction"])
+                self.assertEqual(single[data_type]["model_name"], "LinearRegression")
+        self.assertAlmostEqual(response.data["ground"]["predictions"][1], 1.0 + 2.0 * 8.5)
+        self.assertEqual(response.data["ground"]["model_name"], "LinearRegression")
+
+    def test_columnar_payload(self):
+        columns = {field: [s[field] for s in self.scenarios] for field in self.scenarios[0]}
+        columnar = self.client.post(reverse("predict_custom_batch"), {"columns": columns},
+                                    content_type="application/json")
+        rows = self.client.post(reverse("predict_custom_batch"), {"scenarios": self.scenarios},
+                                content_type="application/json")
+        self.assertEqual(columnar.data, rows.data)
+
+    def test_rejects_malformed_batches(self):
+        for payload in ([], {"columns": {"so2_mean": [1.0], "so2_std": [1.0, 2.0]}},
+                        [{"so2_mean": "high"}]):
+            response = self.client.post(reverse("predict_custom_batch"), payload,
+                                        content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+
+def write_multi_model(model_dir, data_type, pollutants, horizons=7):
+    """Dump a multi-output linear model whose target k is k + mean of the first pollutant"""
+    n_features = 5 * len(pollutants) + 11
+    X = np.random.default_rng(0).normal(size=(64, n_features))
+    scaler = StandardScaler().fit(X)
+    Y = np.arange(len(pollutants) * horizons) + X[:, :1]
+    joblib.dump(LinearRegression().fit(scaler.transform(X), Y),
+                os.path.join(model_dir, f"{data_type}_multi_model.pkl"))
+    joblib.dump(scaler, os.path.join(model_dir, f"{data_type}_multi_scaler.pkl"))
+    schema = {"pollutants": pollutants, "horizons": list(range(1, horizons + 1)),
+              "window_size": 7, "std_ddof": 1, "features": [f"f{i}" for i in range(n_features)]}
+    with open(os.path.join(model_dir, f"{data_type}_multi_schema.json"), "w") as f:
+        json.dump(schema, f)
+
+
+class MultiOutputPredictionTests(TestCase):
+    def setUp(self):
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir)
+        write_multi_model(model_dir, "ground", ["so2", "co"])
+        patcher = mock.patch.object(views, "registry", ModelRegistry(model_dir, check_interval=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.recent = {"so2": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0], "co": [0.5] * 7}
+
+    def post(self, payload):
+        return self.client.post(reverse("predict_multi"), payload, content_type="application/json")
+
+    def test_predicts_every_pollutant_and_day(self):
+        response = self.post({"data_type": "ground", "recent": self.recent, "month": 6})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["horizons"], list(range(1, 8)))
+        predictions = response.data["predictions"]
+        self.assertEqual(list(predictions), ["so2", "co"])
+        np.testing.assert_allclose(predictions["so2"], 4.0 + np.arange(7))
+        np.testing.assert_allclose(predictions["co"], 4.0 + np.arange(7, 14))
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.post({"data_type": "ocean", "recent": self.recent}).status_code, 400)
+        self.assertEqual(self.post({"recent": {"so2": self.recent["so2"]}}).status_code, 400)
+        self.assertEqual(self.post({"recent": {"so2": [1.0], "co": [1.0]}}).status_code, 400)
+        short = {pollutant: values[1:] for pollutant, values in self.recent.items()}
+        self.assertEqual(self.post({"recent": short}).status_code, 400)
+        missing = self.post({"data_type": "satellite", "recent": self.recent})
+        self.assertEqual(missing.status_code, 404)
+
+    def test_features_match_training_windows(self):
+        dp = _processor_module()
+        rng = np.random.default_rng(1)
+        frame = dp.add_time_features(pd.DataFrame({
+            "date": pd.date_range("2024-03-01 06:00", periods=20, freq="D"),
+            "so2": rng.normal(5.0, 1.0, 20),
+            "co": rng.normal(1.0, 0.2, 20),
+        }))
+        schema = {"pollutants": ["so2", "co"], "window_size": 7, "std_ddof": 1}
+        windows, _ = dp.build_multi_window_features(frame, schema["pollutants"], window_size=7)
+
+        # Window 5 covers rows 5-11; the client sends everything up to row 11
+        last = frame.iloc[11]
+        payload = {"recent": {pollutant: frame[pollutant][:12].tolist()
+                              for pollutant in schema["pollutants"]},
+                   **{field: int(last[field]) for field in TIME_FIELDS}}
+        np.testing.assert_allclose(multi_output_features(payload, schema)[0], windows[5])
+
+    def test_model_info_lists_pollutants(self):
+        info = self.client.get(reverse("get_model_info")).json()
+        self.assertEqual(info["ground_multi"]["pollutants"], ["so2", "co"])
+        self.assertEqual(info["ground_multi"]["features"], 21)
+        self.assertFalse(info["satellite_multi"]["available"])
+
+
+class PredictionCacheTests(ServedModelsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        prediction_cache.clear()
+        self.addCleanup(prediction_cache.clear)
+        add_points("ground", [4.0, 5.0, 6.0, 5.0, 4.0, 5.0, 6.0, 5.0])
+
+    def get_ground(self):
+        response = self.client.get(reverse("get_predictions"))
+        self.assertEqual(response.status_code, 200)
+        return response.json()["ground"]
+
+    def test_second_request_is_a_hit(self):
+        first = self.get_ground()
+        second = self.get_ground()
+        self.assertFalse(first["cache"]["hit"])
+        self.assertTrue(second["cache"]["hit"])
+        self.assertEqual(first["prediction"], second["prediction"])
+
+    def test_new_data_points_invalidate(self):
+        self.get_ground()
+        DataPoint.objects.create(data_type="ground", so2_value=50.0, timestamp=timezone.now())
+        refreshed = self.get_ground()
+        self.assertFalse(refreshed["cache"]["hit"])
+
+        # bulk_create sends no signals; the newer latest timestamp still misses
+        add_points("ground", [60.0])
+        self.assertFalse(self.get_ground()["cache"]["hit"])
+
+    def test_hit_reads_only_the_latest_timestamp(self):
+        self.get_ground()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.get_ground()["cache"]["hit"])
+        # One MAX(timestamp) per served data type, no COUNT over the table
+        sqls = [query["sql"] for query in queries.captured_queries]
+        self.assertEqual(len(sqls), 2)
+        self.assertTrue(all("MAX" in sql and "COUNT" not in sql for sql in sqls))
+
+    def test_other_data_type_writes_keep_entry(self):
+        self.get_ground()
+        DataPoint.objects.create(data_type="satellite", so2_value=1.0, timestamp=timezone.now())
+        self.assertTrue(self.get_ground()["cache"]["hit"])
+
+    def test_lru_expiry_and_eviction(self):
+        backend = LocMemLRUBackend(max_entries=2)
+        backend.set("a", 1, ttl=60)
+        backend.set("b", 2, ttl=60)
+        backend.get("a")
+        backend.set("c", 3, ttl=60)
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("a"), 1)
+
+        backend.set("d", 4, ttl=-1)
+        self.assertIsNone(backend.get("d"))
+
+        # Generation counters are not entries and are never evicted
+        backend.incr("generation")
+        for key in "efg":
+            backend.set(key, 0, ttl=60)
+        self.assertEqual(backend.counter("generation"), 1)
+
+
+class AsyncViewTests(ServedModelsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        prediction_cache.clear()
+        self.addCleanup(prediction_cache.clear)
+        add_points("ground", [4.0, 5.0, 6.0, 5.0, 4.0, 5.0, 6.0, 5.0])
+        add_points("satellite", [2.0] * 8)
+
+    async def test_predictions_run_inference_on_the_pool(self):
+        threads = set()
+        get = views.registry.get
+
+        def recording_get(data_type):
+            threads.add(threading.current_thread().name)
+            return get(data_type)
+
+        with mock.patch.object(views.registry, "get", recording_get):
+            response = await self.async_client.get(reverse("get_predictions"))
+        self.assertEqual(response.status_code, 200)
+        predictions = response.json()
+        self.assertAlmostEqual(predictions["ground"]["prediction"], 1.0 + 2.0 * 5.0)
+        self.assertAlmostEqual(predictions["satellite"]["prediction"], -1.0 + 0.5 * 2.0)
+        self.assertEqual(predictions["ground"]["model_name"], "LinearRegression")
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith("inference") for name in threads))
+
+    async def test_model_info(self):
+        response = await self.async_client.get(reverse("get_model_info"))
+        self.assertEqual(response.json()["ground"]["available"], True)
+
+        response = await self.async_client.post(reverse("get_model_info"))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_saturated_pool_is_unavailable(self):
+        with mock.patch.object(views, "inference_pool", InferencePool(1, max_pending=0)):
+            response = await self.async_client.get(reverse("get_predictions"))
+        self.assertEqual(response.status_code, 503)
+
+
+class PredictNextSevenDaysTests(ServedModelsMixin, TestCase):
+    def test_fixed_query_count_and_features(self):
+        values = [4.0, 5.5, 6.0, 5.0, 4.5, 5.0, 7.0, 6.5, 5.0, 4.0]
+        end = timezone.now().replace(minute=0, second=0, microsecond=0)
+        add_points("ground", values, end=end)
+        # Outside the 7-day window
+        DataPoint.objects.create(data_type="ground", so2_value=99.0,
+                                 timestamp=end - timedelta(days=8))
+
+        with self.assertNumQueries(2):
+            count, latest, so2_values = views.recent_window("ground")
+        self.assertEqual((count, latest), (len(values), end))
+        self.assertEqual(sorted(so2_values), sorted(values))
+
+        with self.assertNumQueries(2):
+            prediction = views.predict_next_7_days("ground")
+        # The ground test model is 1 + 2 * so2_mean
+        self.assertAlmostEqual(prediction, 1.0 + 2.0 * np.mean(values))
+
+    def test_too_few_points_skips_the_fetch(self):
+        add_points("ground", [1.0, 2.0, 3.0])
+        with self.assertNumQueries(1):
+            self.assertIsNone(views.predict_next_7_days("ground"))
+
+    @override_settings(PREDICTION_WINDOW_SOURCE="rollup")
+    def test_rollup_window_reads_one_query(self):
+        values = [4.0, 5.5, 6.0, 5.0, 4.5, 5.0, 7.0, 6.5, 5.0, 4.0]
+        end = timezone.now().replace(minute=30, second=0, microsecond=0)
+        add_points("ground", values, end=end)
+        DataPoint.objects.create(data_type="ground", so2_value=99.0,
+                                 timestamp=end - timedelta(days=8))
+
+        with self.assertNumQueries(1):
+            count, latest, stats = views.rollup_window("ground")
+        self.assertEqual((count, latest), (len(values), end))
+        self.assertAlmostEqual(stats["so2_mean"], np.mean(values))
+        self.assertAlmostEqual(stats["so2_std"], np.std(values))
+        self.assertEqual((stats["so2_min"], stats["so2_max"]), (min(values), max(values)))
+
+        with self.assertNumQueries(1):
+            prediction = views.predict_next_7_days("ground")
+        self.assertAlmostEqual(prediction, 1.0 + 2.0 * np.mean(values))
+
+
+class DataPointPaginationTests(TestCase):
+    def setUp(self):
+        # Two rows per timestamp so pages split ties on id
+        end = timezone.now()
+        add_points("ground", [float(i) for i in range(15)], end=end)
+        add_points("ground", [float(i) for i in range(15)], end=end)
+        add_points("satellite", [1.0, 2.0], end=end)
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        params = {"type": "ground", "limit": 4}
+        while True:
+            response = self.client.get(reverse("get_data_points"), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data), 4)
+            seen.extend(row["id"] for row in response.data)
+            if "X-Next-Cursor" not in response:
+                break
+            self.assertIn('rel="next"', response["Link"])
+            params["cursor"] = response["X-Next-Cursor"]
+
+        expected = DataPoint.objects.filter(data_type="ground").order_by("-timestamp", "-id")
+        self.assertEqual(seen, list(expected.values_list("id", flat=True)))
+
+    def test_columnar_matches_serializer(self):
+        params = {"type": "ground", "limit": 20}
+        rows = self.client.get(reverse("get_data_points"), params).json()
+        response = self.client.get(reverse("get_data_points"), params,
+                                   HTTP_ACCEPT="application/vnd.airquality.columns+json")
+        self.assertEqual(response["Content-Type"], "application/vnd.airquality.columns+json")
+        payload = response.json()
+        self.assertEqual(payload["count"], 20)
+        self.assertEqual(
+            [dict(zip(payload["columns"], values)) for values in zip(*payload["columns"].values())],
+            rows,
+        )
+
+        params["cursor"] = response["X-Next-Cursor"]
+        rest = self.client.get(reverse("get_data_points"), dict(params, format="columns")).json()
+        self.assertEqual(rest["count"], 10)
+        self.assertEqual(DataPoint.objects.filter(data_type="ground").count(),
+                         len(set(payload["columns"]["id"] + rest["columns"]["id"])))
+
+    def test_responses_are_compressed(self):
+        response = self.client.get(reverse("get_data_points"), {"format": "columns"},
+                                   HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content))["count"], 32)
+
+    def test_limit_is_capped(self):
+        with self.settings(DATA_POINTS_MAX_PAGE_SIZE=5):
+            response = self.client.get(reverse("get_data_points"), {"limit": 10**9})
+        self.assertEqual(len(response.data), 5)
+
+    def test_bad_parameters_are_client_errors(self):
+        for params in ({"limit": "0"}, {"limit": "many"}, {"cursor": "not-a-cursor"}):
+            response = self.client.get(reverse("get_data_points"), params)
+            self.assertEqual(response.status_code, 400)
+
+
+class LoadDataPointsTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.csv = os.path.join(self.tmp, "ground.csv")
+        self.write_csv([8.5, 9.2, 7.8, 8.1, 9.0])
+
+    def write_csv(self, values, dates=None):
+        dates = dates or [f"2023-01-{day:02d}" for day in range(1, len(values) + 1)]
+        with open(self.csv, "w") as f:
+            f.write("date,so2\n")
+            for date, value in zip(dates, values):
+                f.write(f"{date},{value}\n")
+
+    def load(self, *args):
+        out = StringIO()
+        call_command("load_datapoints", "--ground-csv", self.csv, "--batch-size", "2",
+                     *args, stdout=out)
+        return out.getvalue()
+
+    def test_load_is_idempotent(self):
+        self.load()
+        self.assertEqual(DataPoint.objects.filter(data_type="ground").count(), 5)
+        self.assertIn("already loaded", self.load())
+
+        self.load("--restart")
+        self.assertEqual(DataPoint.objects.filter(data_type="ground").count(), 5)
+
+    def test_changed_source_updates_in_place(self):
+        self.load()
+        ids = set(DataPoint.objects.values_list("id", flat=True))
+        self.write_csv([8.5, 9.2, 1.0, 8.1, 9.0, 6.6])
+
+        output = self.load()
+        self.assertIn("1 created, 1 updated", output)
+        self.assertTrue(ids < set(DataPoint.objects.values_list("id", flat=True)))
+        self.assertEqual(DataPoint.objects.get(timestamp__day=3).so2_value, 1.0)
+        self.assertEqual(DataPointRollup.objects.get(granularity="day", bucket__day=3).so2_sum, 1.0)
+
+    def test_resumes_after_checkpoint(self):
+        self.load()
+        checkpoint = LoadCheckpoint.objects.get()
+        checkpoint.rows_done = 3
+        checkpoint.completed = False
+        checkpoint.save()
+        DataPoint.objects.filter(timestamp__day__gt=3).delete()
+
+        output = self.load()
+        self.assertIn("resuming after 3 rows", output)
+        self.assertIn("2 created, 0 updated, 2 rows", output)
+        self.assertEqual(DataPoint.objects.count(), 5)
+
+    def test_reload_after_retention_keeps_expired_days_expired(self):
+        today = timezone.now().date()
+        days = [today - timedelta(days=n) for n in (60, 59, 58, 2, 1)]
+        self.write_csv([1.0, 2.0, 3.0, 4.0, 5.0], [day.isoformat() for day in days])
+        daily = DataPointRollup.objects.filter(granularity="day", data_type="ground")
+        # Loaded while ground rows were kept forever, then expired
+        self.load()
+        policy = {"ground": {"RAW_DAYS": 30, "HOURLY_DAYS": None}}
+        with self.settings(DATAPOINT_RETENTION=policy):
+            call_command("apply_retention", stdout=StringIO())
+            self.assertEqual(DataPoint.objects.count(), 2)
+            self.assertEqual(sum(daily.values_list("so2_sum", flat=True)), 15.0)
+
+            # A new row changes the fingerprint, so the whole file is read again
+            self.write_csv([1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+                           [day.isoformat() for day in days + [today]])
+            output = self.load()
+        self.assertIn("1 created, 0 updated, 6 rows", output)
+        self.assertIn("skipped 3 rows older than the 30-day raw retention", output)
+        self.assertEqual(DataPoint.objects.count(), 3)
+        self.assertEqual(sorted(daily.values_list("count", flat=True)), [1, 1, 1, 1, 1, 1])
+        self.assertEqual(sum(daily.values_list("so2_sum", flat=True)), 21.0)
+
+    def test_upsert_reads_only_the_batch_timestamps(self):
+        self.assertEqual(upsert_datapoints("satellite", []), ([], []))
+        start = timezone.now().replace(microsecond=0)
+        DataPoint.objects.create(data_type="satellite", so2_value=1.0, latitude=1.0,
+                                 longitude=2.0, timestamp=start)
+        DataPoint.objects.create(data_type="satellite", so2_value=5.0, latitude=1.0,
+                                 longitude=2.0, timestamp=start + timedelta(days=10))
+        rows = [(start, 2.0, 1.0, 2.0), (start + timedelta(days=20), 3.0, 1.0, 2.0)]
+
+        with mock.patch("predictions.loading.LOOKUP_CHUNK", 1), \
+                CaptureQueriesContext(connection) as queries:
+            created, updated = upsert_datapoints("satellite", rows)
+        lookups = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(lookups), 2)
+        self.assertTrue(all(" IN (" in sql for sql in lookups))
+        self.assertEqual(([p.so2_value for p in created], [p.so2_value for p in updated]),
+                         ([3.0], [2.0]))
+        self.assertEqual(sorted(DataPoint.objects.values_list("so2_value", flat=True)),
+                         [2.0, 3.0, 5.0])
+
+class RollupTests(TestCase):
+    def rollup_values(self, granularity):
+        return sorted(DataPointRollup.objects.filter(granularity=granularity).values_list(
+            "data_type", "cell", "bucket", "count", "so2_sum", "so2_min", "so2_max", "latest"
+        ))
+
+    def assertMatchesRebuild(self):
+        incremental = {g: self.rollup_values(g) for g in rollups.GRANULARITIES}
+        rollups.rebuild_all()
+        for granularity in rollups.GRANULARITIES:
+            self.assertEqual(incremental[granularity], self.rollup_values(granularity))
+
+    @override_settings(ROLLUP_CELL_SIZE=1.0)
+    def test_incremental_maintenance_matches_rebuild(self):
+        end = timezone.now()
+        add_points("ground", [float(i) for i in range(30)], end=end)
+        add_points("satellite", [1.0, 2.0, 3.0], end=end)
+        point = DataPoint.objects.create(data_type="satellite", so2_value=9.0, latitude=10.5,
+                                         longitude=-20.5, timestamp=end)
+        self.assertEqual(
+            DataPointRollup.objects.get(granularity="hour", cell="10:-21").so2_max, 9.0
+        )
+        self.assertMatchesRebuild()
+
+        point.so2_value = 0.5
+        point.save()
+        DataPoint.objects.filter(data_type="ground").first().delete()
+        self.assertMatchesRebuild()
+
+    def test_naive_and_string_timestamps_roll_up_in_utc(self):
+        with warnings.catch_warnings():
+            # Django warns about naive datetimes when it saves them
+            warnings.simplefilter("ignore", RuntimeWarning)
+            DataPoint.objects.create(data_type="ground", so2_value=1.0,
+                                     timestamp="2024-01-01T23:30")
+            point = DataPoint.objects.create(data_type="ground", so2_value=3.0,
+                                             timestamp=datetime(2024, 1, 1, 23, 45))
+        self.assertTrue(timezone.is_aware(point.timestamp))
+
+        rollup = DataPointRollup.objects.get(granularity="hour")
+        self.assertEqual(rollup.bucket, datetime(2024, 1, 1, 23, tzinfo=dt_timezone.utc))
+        self.assertEqual((rollup.count, rollup.so2_sum), (2, 4.0))
+        self.assertMatchesRebuild()
+
+        point.delete()
+        self.assertEqual(DataPointRollup.objects.get(granularity="day").count, 1)
+
+    def test_median_is_weighted_over_bucket_means(self):
+        # Bucket means 1, 2, 10 with weights 1, 3, 1: the median sits in bucket 2
+        summaries = [(1, 1.0, 1.0, 1.0, 1.0), (3, 6.0, 14.0, 1.0, 3.0), (1, 10.0, 100.0, 10.0, 10.0)]
+        self.assertEqual(rollup_window_stats(summaries)["so2_median"], 2.0)
+
+    def test_data_points_by_granularity(self):
+        end = timezone.now().replace(hour=12)
+        add_points("ground", [1.0, 2.0, 3.0, 4.0], end=end)
+
+        response = self.client.get(reverse("get_data_points"),
+                                   {"type": "ground", "granularity": "day"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["count"], 4)
+        self.assertAlmostEqual(response.data[0]["so2_mean"], 2.5)
+        columns = self.client.get(
+            reverse("get_data_points"), {"type": "ground", "granularity": "day", "format": "columns"}
+        ).json()["columns"]
+        self.assertEqual((columns["count"], columns["so2_mean"]), ([4], [2.5]))
+
+        response = self.client.get(reverse("get_data_points"),
+                                   {"type": "ground", "granularity": "hour", "limit": 3})
+        self.assertEqual(len(response.data), 3)
+        self.assertIn("X-Next-Cursor", response)
+        response = self.client.get(reverse("get_data_points"),
+                                   {"granularity": "week"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RollupMigrationTests(TransactionTestCase):
+    before = [("predictions", "0003_loadcheckpoint")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill_matches_rebuild(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        HistoricalDataPoint = executor.loader.project_state(self.before).apps.get_model(
+            "predictions", "DataPoint")
+        start = datetime(2024, 1, 1, 22, tzinfo=dt_timezone.utc)
+        HistoricalDataPoint.objects.bulk_create([
+            HistoricalDataPoint(data_type=data_type, so2_value=float(i), timestamp=start
+                                + timedelta(minutes=37 * i))
+            for i in range(10) for data_type in ("ground", "satellite")
+        ])
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([("predictions", "0004_datapointrollup")])
+        fields = ("granularity", "data_type", "cell", "bucket", "count", "so2_sum",
+                  "so2_sum_sq", "so2_min", "so2_max", "latest")
+        backfilled = sorted(DataPointRollup.objects.values_list(*fields))
+        self.assertEqual(len({row[3] for row in backfilled if row[0] == "day"}), 2)
+
+        DataPointRollup.objects.all().delete()
+        rollups.rebuild_all()
+        self.assertEqual(backfilled, sorted(DataPointRollup.objects.values_list(*fields)))
+
+
+@override_settings(DATAPOINT_RETENTION={"satellite": {"RAW_DAYS": 30, "HOURLY_DAYS": 60}})
+class RetentionTests(TestCase):
+    def setUp(self):
+        # Midday, so each group of hourly points falls within one day
+        now = timezone.now().replace(hour=12)
+        add_points("satellite", [1.0, 2.0, 3.0], end=now - timedelta(days=90))
+        add_points("satellite", [4.0, 5.0], end=now - timedelta(days=40))
+        add_points("satellite", [6.0], end=now)
+        add_points("ground", [7.0], end=now - timedelta(days=90))
+
+    def retain(self, *args):
+        out = StringIO()
+        call_command("apply_retention", "--batch-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.retain("--dry-run")
+        self.assertIn("satellite: would delete 5 raw points", output)
+        self.assertEqual(DataPoint.objects.count(), 7)
+
+    def test_raw_rows_expire_and_daily_rollups_remain(self):
+        output = self.retain()
+        self.assertIn("satellite: deleted 5 raw points", output)
+        self.assertIn("satellite: deleted 3 hourly rollups", output)
+        self.assertEqual(
+            sorted(DataPoint.objects.values_list("data_type", "so2_value")),
+            [("ground", 7.0), ("satellite", 6.0)],
+        )
+
+        daily = DataPointRollup.objects.filter(granularity="day", data_type="satellite")
+        self.assertEqual(sorted(daily.values_list("count", flat=True)), [1, 2, 3])
+        self.assertEqual(
+            DataPointRollup.objects.filter(granularity="hour", data_type="satellite").count(), 3
+        )
+
+        # A rebuild from the raw table keeps the expired days' history
+        rollups.rebuild_all()
+        self.assertEqual(sorted(daily.values_list("count", flat=True)), [1, 2, 3])
+
+    def test_policies_protect_the_prediction_window(self):
+        with self.settings(DATAPOINT_RETENTION={"satellite": {"RAW_DAYS": 3}}):
+            with self.assertRaises(CommandError):
+                self.retain()
+
+
+class EventStreamTests(ServedModelsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        prediction_cache.clear()
+        self.addCleanup(prediction_cache.clear)
+        self.points = add_points("ground", [5.0] * 8)
+        self.broadcaster = EventBroadcaster(poll_interval=0.01, queue_size=10,
+                                            predict=views.prediction_entry)
+
+    def stream(self, data_types=("ground",), **kwargs):
+        return event_stream(self.broadcaster, data_types, heartbeat=0.05, max_seconds=2, **kwargs)
+
+    async def next_event(self, stream):
+        message = await asyncio.wait_for(stream.__anext__(), timeout=2)
+        fields = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+        if "data" in fields:
+            fields["data"] = json.loads(fields["data"])
+        return fields
+
+    async def test_new_points_and_predictions_are_pushed(self):
+        stream = self.stream()
+        self.assertEqual((await self.next_event(stream))["retry"], "3000")
+        self.assertEqual(await stream.__anext__(), ": heartbeat\n\n")
+
+        await sync_to_async(add_points)("satellite", [1.0])
+        point = await DataPoint.objects.acreate(data_type="ground", so2_value=6.0,
+                                                timestamp=timezone.now())
+        event = await self.next_event(stream)
+        self.assertEqual((event["event"], event["id"]), ("datapoint", str(point.id)))
+        self.assertEqual(event["data"]["so2_value"], 6.0)
+
+        event = await self.next_event(stream)
+        self.assertEqual(event["event"], "prediction")
+        self.assertEqual(event["data"]["data_type"], "ground")
+        await stream.aclose()
+
+    async def test_reconnect_replays_after_last_event_id(self):
+        stream = self.stream(last_event_id=self.points[5].id)
+        await stream.__anext__()
+        replayed = [await self.next_event(stream) for _ in range(2)]
+        self.assertEqual([int(event["id"]) for event in replayed],
+                         [self.points[6].id, self.points[7].id])
+        await stream.aclose()
+
+        stream = self.stream(last_event_id=self.points[0].id, replay_limit=3)
+        await stream.__anext__()
+        event = await self.next_event(stream)
+        self.assertEqual((event["event"], int(event["id"])), ("reset", self.points[-1].id))
+        await stream.aclose()
+
+    async def test_slow_client_is_reset(self):
+        self.broadcaster.queue_size = 2
+        stream = self.stream()
+        await stream.__anext__()
+        await sync_to_async(add_points)("ground", [1.0, 2.0, 3.0, 4.0])
+        while self.broadcaster.last_id < self.points[-1].id + 4:
+            await asyncio.sleep(0.01)
+
+        event = await self.next_event(stream)
+        self.assertEqual((event["event"], event["data"]["reason"]), ("reset", "lagged"))
+        self.assertEqual(int(event["id"]), self.points[-1].id + 4)
+        await stream.aclose()
+
+    async def test_view_validates_parameters(self):
+        response = await self.async_client.get(reverse("stream_events"), {"type": "radar"})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(reverse("stream_events"),
+                                                headers={"Last-Event-ID": "latest"})
+        self.assertEqual(response.status_code, 400)
+
+        with mock.patch.object(views, "broadcaster", self.broadcaster), \
+                self.settings(EVENT_STREAM={"MAX_SECONDS": 0.2, "HEARTBEAT": 0.05}):
+            response = await self.async_client.get(reverse("stream_events"),
+                                                    {"last_event_id": self.points[6].id})
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            body = "".join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertIn(f"id: {self.points[7].id}\n", body)
+
+    def test_view_refuses_wsgi_requests(self):
+        response = self.client.get(reverse("stream_events"))
+        self.assertEqual(response.status_code, 501)
+        self.assertIn("ASGI", response.json()["error"])
+
+
+class MetricsTests(ServedModelsMixin, TestCase):
+    def sample(self, name, **labels):
+        """Value of one sample line from /metrics, 0 if absent"""
+        body = self.client.get(reverse("metrics")).content.decode()
+        selector = ",".join(f'{key}="{value}"' for key, value in labels.items())
+        prefix = f"{name}{{{selector}}} " if labels else f"{name} "
+        for line in body.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return 0.0
+
+    def test_requests_queries_and_inference_are_recorded(self):
+        add_points("ground", [1.0, 2.0])
+        before = self.sample("predictions_http_request_duration_seconds_count",
+                             view="get_data_points", method="GET", status="200")
+        queries = self.sample("predictions_http_request_db_queries_sum", view="get_data_points")
+        self.client.get(reverse("get_data_points"))
+        self.assertEqual(
+            self.sample("predictions_http_request_duration_seconds_count",
+                        view="get_data_points", method="GET", status="200"),
+            before + 1,
+        )
+        self.assertEqual(
+            self.sample("predictions_http_request_db_queries_sum", view="get_data_points"),
+            queries + 1,
+        )
+
+        stages = {
+            stage: self.sample("predictions_inference_duration_seconds_count",
+                               data_type="ground", stage=stage)
+            for stage in ("transform", "predict")
+        }
+        self.client.post(reverse("predict_custom"), {"so2_mean": 3.0}, content_type="application/json")
+        for stage, count in stages.items():
+            self.assertEqual(
+                self.sample("predictions_inference_duration_seconds_count",
+                            data_type="ground", stage=stage),
+                count + 1,
+            )
+
+    async def test_async_view_queries_are_attributed(self):
+        await sync_to_async(add_points)("ground", [5.0] * 8)
+        before = await sync_to_async(self.sample)("predictions_http_request_db_queries_sum",
+                                                  view="get_predictions")
+        await self.async_client.get(reverse("get_predictions"))
+        after = await sync_to_async(self.sample)("predictions_http_request_db_queries_sum",
+                                                 view="get_predictions")
+        self.assertGreater(after, before)
+
+    def test_caught_exceptions_are_counted_and_logged(self):
+        before = self.sample("predictions_http_exceptions_total",
+                             view="predict_custom", exception="ValueError")
+        with self.assertLogs("predictions.views", "ERROR"):
+            response = self.client.post(reverse("predict_custom"), {"so2_mean": "high"},
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(
+            self.sample("predictions_http_exceptions_total",
+                        view="predict_custom", exception="ValueError"),
+            before + 1,
+        )
+
+    def test_label_values_are_escaped(self):
+        histogram = metrics.Histogram("h", "help", ("view",), buckets=(1.0,))
+        histogram.observe(0.5, view='a"b')
+        self.assertIn('h_bucket{view="a\\"b",le="1.0"} 1', list(histogram.samples()))
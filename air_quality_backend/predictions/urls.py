@@ -4,6 +4,9 @@ from . import views
 urlpatterns = [
     path('predictions/', views.get_predictions, name='get_predictions'),
     path('predict-custom/', views.predict_custom, name='predict_custom'),
+    path('predict-custom/batch/', views.predict_custom_batch, name='predict_custom_batch'),
+    path('predict-multi/', views.predict_multi, name='predict_multi'),
     path('data-points/', views.get_data_points, name='get_data_points'),
     path('model-info/', views.get_model_info, name='get_model_info'),
+    path('stream/', views.stream_events, name='stream_events'),
 ]
@@ -1,78 +1,157 @@
 from django.shortcuts import render
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
-from .models import PredictionResult, DataPoint
-from .serializers import PredictionResultSerializer, DataPointSerializer
-import joblib
+from rest_framework.settings import api_settings
+from .models import PredictionResult, DataPoint, DataPointRollup
+from .serializers import PredictionResultSerializer, DataPointSerializer, DataPointRollupSerializer
+from .registry import ModelRegistry
+from .features import (
+    scenario_columns,
+    build_feature_matrix,
+    multi_output_features,
+    window_feature_vector,
+    rollup_window_stats,
+    stats_feature_vector,
+)
+from .cache import prediction_cache
+from .columnar import (
+    DATAPOINT_COLUMNS,
+    ROLLUP_FETCH_COLUMNS,
+    compress_response,
+    data_point_renderers,
+    datapoint_columns,
+    rollup_columns,
+)
+from .inference import PoolSaturated, inference_pool
+from .metrics import inference_latency, record_exception, render as render_metrics
+from .pagination import keyset_page, page_size
+from .registry import DATA_TYPES, MULTI_OUTPUT_TYPES
+from .rollups import GRANULARITIES, window_summaries
+from .streaming import EventBroadcaster, event_stream, stream_settings
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+import asyncio
+import logging
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import os
 
 
-# Load models and scalers
-def load_models():
-    models = {}
-    scalers = {}
+logger = logging.getLogger(__name__)
 
-    # Get the project root directory (parent of air_quality_backend)
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Models are loaded on first use and hot-swapped when retrained
+registry = ModelRegistry.from_settings()
 
-    # Load ground model
-    ground_model_path = os.path.join(project_root, "ground_model.pkl")
-    ground_scaler_path = os.path.join(project_root, "ground_scaler.pkl")
+# Placeholder confidence per data type
+CONFIDENCE = {"ground": 0.85, "satellite": 0.80}
 
-    if os.path.exists(ground_model_path):
-        models["ground"] = joblib.load(ground_model_path)
-        scalers["ground"] = joblib.load(ground_scaler_path)
 
-    # Load satellite model
-    satellite_model_path = os.path.join(project_root, "satellite_model.pkl")
-    satellite_scaler_path = os.path.join(project_root, "satellite_scaler.pkl")
+async def get_predictions(request):
+    """Get predictions for both ground and satellite data
 
-    if os.path.exists(satellite_model_path):
-        models["satellite"] = joblib.load(satellite_model_path)
-        scalers["satellite"] = joblib.load(satellite_scaler_path)
-
-    return models, scalers
-
-
-models, scalers = load_models()
-
-
-@api_view(["GET"])
-def get_predictions(request):
-    """Get predictions for both ground and satellite data"""
+    An async view: the two data types are predicted concurrently, with
+    their queries on the async ORM and model loading and inference on the
+    bounded inference pool. 503 when that pool is saturated.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
     try:
-        predictions = {}
-
-        # Get ground prediction
-        if "ground" in models:
-            ground_prediction = predict_next_7_days("ground")
-            if ground_prediction is not None:
-                predictions["ground"] = {
-                    "prediction": ground_prediction,
-                    "confidence": 0.85,  # Placeholder confidence
-                    "model_name": "RandomForest",
-                    "data_type": "ground",
-                }
-
-        # Get satellite prediction
-        if "satellite" in models:
-            satellite_prediction = predict_next_7_days("satellite")
-            if satellite_prediction is not None:
-                predictions["satellite"] = {
-                    "prediction": satellite_prediction,
-                    "confidence": 0.80,  # Placeholder confidence
-                    "model_name": "RandomForest",
-                    "data_type": "satellite",
-                }
+        entries = await asyncio.gather(
+            prediction_entry("ground"),
+            prediction_entry("satellite"),
+        )
+        predictions = {entry["data_type"]: entry for entry in entries if entry is not None}
+        return JsonResponse(predictions, status=status.HTTP_200_OK)
+
+    except PoolSaturated as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except Exception as e:
+        logger.exception("get_predictions failed")
+        record_exception(e)
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        return Response(predictions, status=status.HTTP_200_OK)
 
-    except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+async def prediction_entry(data_type):
+    """get_predictions entry for one data type, or None without a model or data"""
+    loaded = await inference_pool.run(registry.get, data_type)
+    if loaded is None:
+        return None
+    prediction, cache_info = await cached_prediction(data_type, loaded.version)
+    if prediction is None:
+        return None
+    return {
+        "prediction": prediction,
+        "confidence": CONFIDENCE[data_type],
+        "model_name": model_name(loaded),
+        "data_type": data_type,
+        "cache": cache_info,
+    }
+
+
+# One poller per process feeds every open stream
+broadcaster = EventBroadcaster.from_settings(predict=prediction_entry)
+
+
+async def stream_events(request):
+    """Server-sent events of new DataPoints and the predictions they refresh
+
+    'datapoint' events carry a DataPoint and its id as the event id, so a
+    reconnecting EventSource resumes after the last one it saw
+    (Last-Event-ID, or ?last_event_id=). 'prediction' events carry a
+    get_predictions entry. ?type= takes a data type, a comma-separated
+    list of them, or both (the default).
+
+    Only served under ASGI (uvicorn air_quality_backend.asgi:application).
+    Django's WSGI handler collects an async stream in full before sending
+    any of it, and runs each request on an event loop of its own, which
+    the process-wide broadcaster's queues cannot be shared across, so
+    under runserver or another WSGI server the view answers 501.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "the event stream needs an ASGI server, e.g. "
+                      "uvicorn air_quality_backend.asgi:application"},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+
+    requested = request.GET.get("type", "both")
+    data_types = DATA_TYPES if requested == "both" else tuple(requested.split(","))
+    if not set(data_types) <= set(DATA_TYPES):
+        return JsonResponse({"error": f"type must be both or one of {', '.join(DATA_TYPES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return JsonResponse({"error": "last event id must be an integer"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+    config = stream_settings()
+    response = StreamingHttpResponse(
+        event_stream(
+            broadcaster,
+            data_types,
+            last_event_id,
+            heartbeat=config["HEARTBEAT"],
+            max_seconds=config["MAX_SECONDS"],
+            replay_limit=config["REPLAY_LIMIT"],
+            retry_ms=config["RETRY_MS"],
+        ),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @api_view(["POST"])
@@ -94,146 +173,458 @@ def predict_custom(request):
         hour = int(data.get("hour", datetime.now().hour))
 
         # Create feature vector
-        feature_vector = [
-            so2_mean,
-            so2_std,
-            so2_min,
-            so2_max,
-            so2_median,
-            year,
-            month,
-            day,
-            day_of_week,
-            hour,
-            np.sin(2 * np.pi * month / 12),
-            np.cos(2 * np.pi * month / 12),
-            np.sin(2 * np.pi * day / 31),
-            np.cos(2 * np.pi * day / 31),
-            np.sin(2 * np.pi * hour / 24),
-            np.cos(2 * np.pi * hour / 24),
-        ]
+        feature_vector = build_feature_matrix({
+            "so2_mean": np.array([so2_mean]),
+            "so2_std": np.array([so2_std]),
+            "so2_min": np.array([so2_min]),
+            "so2_max": np.array([so2_max]),
+            "so2_median": np.array([so2_median]),
+            "year": np.array([year]),
+            "month": np.array([month]),
+            "day": np.array([day]),
+            "day_of_week": np.array([day_of_week]),
+            "hour": np.array([hour]),
+        })
 
         predictions = {}
 
         # Make prediction with ground model
-        if "ground" in models:
-            feature_vector_scaled = scalers["ground"].transform([feature_vector])
-            ground_prediction = models["ground"].predict(feature_vector_scaled)[0]
+        ground = registry.get("ground")
+        if ground is not None:
+            ground_prediction = run_model(ground, feature_vector)[0]
             predictions["ground"] = {
                 "prediction": ground_prediction,
                 "confidence": 0.85,
-                "model_name": "RandomForest",
+                "model_name": model_name(ground),
                 "data_type": "ground",
             }
 
         # Make prediction with satellite model
-        if "satellite" in models:
-            feature_vector_scaled = scalers["satellite"].transform([feature_vector])
-            satellite_prediction = models["satellite"].predict(feature_vector_scaled)[0]
+        satellite = registry.get("satellite")
+        if satellite is not None:
+            satellite_prediction = run_model(satellite, feature_vector)[0]
             predictions["satellite"] = {
                 "prediction": satellite_prediction,
                 "confidence": 0.80,
-                "model_name": "RandomForest",
+                "model_name": model_name(satellite),
                 "data_type": "satellite",
             }
 
         return Response(predictions, status=status.HTTP_200_OK)
 
     except Exception as e:
+        logger.exception("predict_custom failed")
+        record_exception(e)
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@api_view(["GET"])
-def get_data_points(request):
-    """Get recent data points for visualization"""
+@api_view(["POST"])
+def predict_custom_batch(request):
+    """Predict many custom scenarios with one transform/predict call per model
+
+    Body: a list of predict_custom style objects, {"scenarios": [...]}, or
+    {"columns": {"so2_mean": [...], ...}}. Predictions come back as one
+    array per model, in input order.
+    """
     try:
-        data_type = request.GET.get("type", "both")
-        limit = int(request.GET.get("limit", 100))
+        columns = scenario_columns(request.data, max_rows=settings.PREDICTION_BATCH_MAX_SCENARIOS)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if data_type == "both":
-            data_points = DataPoint.objects.all()[:limit]
-        else:
-            data_points = DataPoint.objects.filter(data_type=data_type)[:limit]
+    try:
+        features = build_feature_matrix(columns)
+        predictions = {"count": len(features)}
+
+        for data_type, confidence in CONFIDENCE.items():
+            loaded = registry.get(data_type)
+            if loaded is not None:
+                values = run_model(loaded, features)
+                predictions[data_type] = {
+                    "predictions": values.tolist(),
+                    "confidence": confidence,
+                    "model_name": model_name(loaded),
+                    "data_type": data_type,
+                }
+
+        return Response(predictions, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        logger.exception("predict_custom_batch failed")
+        record_exception(e)
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        serializer = DataPointSerializer(data_points, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+@api_view(["POST"])
+def predict_multi(request):
+    """Predict every pollutant for each of the next 7 days with one model call
+
+    Body: {"data_type": "ground" | "satellite", "recent": {pollutant:
+    [readings, oldest first], ...}} plus optional predict_custom time
+    fields for the last reading. The pollutants and window length the
+    model expects are listed by get_model_info. Served by the
+    <type>_multi models that data_processing.py --multi-output trains.
+    """
+    data_type = request.data.get("data_type", "ground") if isinstance(request.data, dict) else None
+    if data_type not in DATA_TYPES:
+        return Response({"error": f"data_type must be one of {', '.join(DATA_TYPES)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        loaded = registry.get(f"{data_type}_multi")
+        if loaded is None or loaded.schema is None:
+            return Response({"error": f"no multi-output model for {data_type}"},
+                            status=status.HTTP_404_NOT_FOUND)
+        try:
+            features = multi_output_features(request.data, loaded.schema)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        values = run_model(loaded, features)[0]
+        horizons = loaded.schema["horizons"]
+        predictions = {
+            pollutant: values[i * len(horizons):(i + 1) * len(horizons)].tolist()
+            for i, pollutant in enumerate(loaded.schema["pollutants"])
+        }
+        return Response({
+            "data_type": data_type,
+            "model_version": loaded.version,
+            "horizons": horizons,
+            "predictions": predictions,
+            "timestamp": timezone.now(),
+        }, status=status.HTTP_200_OK)
 
     except Exception as e:
+        logger.exception("predict_multi failed")
+        record_exception(e)
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@compress_response
 @api_view(["GET"])
-def get_model_info(request):
-    """Get information about available models"""
+@renderer_classes(data_point_renderers(api_settings.DEFAULT_RENDERER_CLASSES))
+def get_data_points(request):
+    """Get recent data points for visualization
+
+    Newest first, at most limit rows (capped at DATA_POINTS_MAX_PAGE_SIZE).
+    When more rows exist the X-Next-Cursor and Link headers carry the
+    cursor for the next page; pass it back as ?cursor=.
+
+    ?granularity=hour or day returns DataPointRollup summaries (count,
+    mean, std, min, max per bucket) instead of raw points, for the whole
+    data type or, with ?cell=, one ROLLUP_CELL_SIZE grid cell.
+
+    Accept: application/vnd.airquality.columns+json (or ?format=columns)
+    returns {"count": n, "columns": {field: [...]}} built straight from
+    values_list rows, skipping the serializer; application/msgpack and
+    application/vnd.apache.arrow.stream do the same when msgpack or
+    pyarrow is installed. Responses are brotli or gzip compressed when
+    the client accepts it.
+    """
     try:
-        model_info = {}
-
-        if "ground" in models:
-            model_info["ground"] = {
-                "available": True,
-                "model_type": "RandomForest",
-                "features": 16,
-                "last_trained": "2024-01-01",  # Placeholder
-            }
+        data_type = request.GET.get("type", "both")
+        granularity = request.GET.get("granularity", "raw")
+        try:
+            limit = page_size(request.GET.get("limit"))
+        except ValueError:
+            return Response({"error": "limit must be a positive integer"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if granularity == "raw":
+            data_points = DataPoint.objects.all()
+            serializer_class, order_field = DataPointSerializer, "timestamp"
+            fields, to_columns = DATAPOINT_COLUMNS, datapoint_columns
+        elif granularity in GRANULARITIES:
+            data_points = DataPointRollup.objects.filter(
+                granularity=granularity, cell=request.GET.get("cell", "")
+            )
+            serializer_class, order_field = DataPointRollupSerializer, "bucket"
+            fields, to_columns = ROLLUP_FETCH_COLUMNS, rollup_columns
         else:
-            model_info["ground"] = {"available": False}
-
-        if "satellite" in models:
-            model_info["satellite"] = {
-                "available": True,
-                "model_type": "RandomForest",
-                "features": 16,
-                "last_trained": "2024-01-01",  # Placeholder
-            }
+            return Response({"error": "granularity must be raw, hour or day"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if data_type != "both":
+            data_points = data_points.filter(data_type=data_type)
+
+        columnar = getattr(request.accepted_renderer, "columnar", False)
+        if columnar:
+            order_index = fields.index(order_field)
+            data_points = data_points.values_list(*fields)
+            key = lambda row: (row[order_index], row[0])
         else:
-            model_info["satellite"] = {"available": False}
+            key = None
+
+        try:
+            data_points, next_cursor = keyset_page(
+                data_points, request.GET.get("cursor"), limit, key=key, field=order_field
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(model_info, status=status.HTTP_200_OK)
+        if columnar:
+            data = {"count": len(data_points), "columns": to_columns(data_points)}
+        else:
+            data = serializer_class(data_points, many=True).data
+        response = Response(data, status=status.HTTP_200_OK)
+        if next_cursor:
+            query = request.GET.copy()
+            query["cursor"] = next_cursor
+            response["X-Next-Cursor"] = next_cursor
+            response["Link"] = f'<{request.build_absolute_uri("?" + query.urlencode())}>; rel="next"'
+        return response
 
     except Exception as e:
+        logger.exception("get_data_points failed")
+        record_exception(e)
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+async def get_model_info(request):
+    """Get information about available models: version, training time, metrics and data"""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        data_types = DATA_TYPES + MULTI_OUTPUT_TYPES
+        described = await asyncio.gather(
+            *(inference_pool.run(describe_model, data_type) for data_type in data_types)
+        )
+        return JsonResponse(dict(zip(data_types, described)), status=status.HTTP_200_OK)
+
+    except PoolSaturated as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except Exception as e:
+        logger.exception("get_model_info failed")
+        record_exception(e)
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def model_name(loaded):
+    """Class name of a loaded model, as recorded in its bundle when it has one"""
+    if loaded.metadata is not None and "model_type" in loaded.metadata:
+        return loaded.metadata["model_type"]
+    return type(loaded.model).__name__
+
+
+def describe_model(data_type):
+    """get_model_info entry for data_type, from its bundle's metadata when it has one"""
+    entry = registry.get(data_type)
+    if entry is None:
+        return {"available": False}
+
+    info = {
+        "available": True,
+        "version": entry.version,
+        "model_type": model_name(entry),
+        "features": getattr(entry.model, "n_features_in_", None),
+        "compiled": entry.compiled is not None,
+    }
+    if entry.schema is not None:
+        info["features"] = len(entry.schema["features"])
+        for key in ("pollutants", "horizons", "window_size"):
+            if key in entry.schema:
+                info[key] = entry.schema[key]
+
+    metadata = entry.metadata
+    if metadata is None:
+        # Loose files carry no metadata; the model file's mtime is when it was trained
+        try:
+            mtime = os.path.getmtime(entry.model_path)
+        except OSError:
+            info["last_trained"] = None
+        else:
+            info["last_trained"] = datetime.fromtimestamp(mtime, tz=dt_timezone.utc).isoformat(
+                timespec="seconds")
+        return info
+
+    metrics = metadata["metrics"]
+    info.update(
+        last_trained=metadata["created_at"],
+        method=metadata["info"].get("method"),
+        metrics={
+            "best_model": metrics.get("best_model"),
+            "best_r2": metrics.get("best_r2"),
+            "r2": {name: scores["r2"] for name, scores in metrics.get("models", {}).items()},
+            "n_samples": metrics.get("n_samples"),
+        },
+        timings=metadata["timings"],
+        data=metadata["data"],
+        storage={
+            "compression": metadata["compression"],
+            "mmap": metadata["mmap"],
+            "bytes": sum(metadata["sizes"].values()),
+        },
+        environment=metadata["environment"],
+    )
+    return info
+
+
+def prometheus_metrics(request):
+    """Request, query and inference metrics of this process, for Prometheus"""
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def cached_prediction(data_type, model_version):
+    """apredict_next_7_days through the prediction cache, with hit/miss metadata"""
+    # MAX over the (data_type, timestamp) index is a single seek; a COUNT
+    # here would scan every point of the type on each request, hits included
+    state = await DataPoint.objects.filter(data_type=data_type).aaggregate(
+        latest=Max("timestamp")
+    )
+    return await prediction_cache.get_or_compute(
+        data_type,
+        model_version,
+        state["latest"],
+        lambda: apredict_next_7_days(data_type),
+    )
+
+
+def _recent_data(data_type):
+    seven_days_ago = timezone.now() - timedelta(days=7)
+    return DataPoint.objects.filter(data_type=data_type, timestamp__gte=seven_days_ago)
+
+
+def recent_window(data_type):
+    """Count, latest timestamp and SO2 values of the last 7 days
+
+    Runs a fixed two queries however dense the data is: one aggregate for
+    the count and latest timestamp, then, only if there is enough data, one
+    flat values_list fetch straight into a NumPy array.
+    """
+    recent_data = _recent_data(data_type)
+
+    state = recent_data.aggregate(count=Count("id"), latest=Max("timestamp"))
+    if state["count"] < 7:
+        return state["count"], state["latest"], None
+
+    so2_values = np.fromiter(
+        recent_data.order_by().values_list("so2_value", flat=True).iterator(chunk_size=10000),
+        dtype=np.float64,
+    )
+    return state["count"], state["latest"], so2_values
+
+
+async def arecent_window(data_type):
+    """recent_window on the async ORM"""
+    recent_data = _recent_data(data_type)
+
+    state = await recent_data.aaggregate(count=Count("id"), latest=Max("timestamp"))
+    if state["count"] < 7:
+        return state["count"], state["latest"], None
+
+    so2_values = np.array(
+        [value async for value in recent_data.order_by().values_list(
+            "so2_value", flat=True
+        ).aiterator(chunk_size=10000)],
+        dtype=np.float64,
+    )
+    return state["count"], state["latest"], so2_values
+
+
+def _summarize_window(summaries):
+    count = sum(row[0] for row in summaries)
+    latest = max((row[5] for row in summaries), default=None)
+    if count < 7:
+        return count, latest, None
+    return count, latest, rollup_window_stats(summaries)
+
+
+def rollup_window(data_type):
+    """Count, latest timestamp and window stats of the last 7 days' hourly rollups
+
+    One query over at most 169 DataPointRollup rows. The window starts at
+    the top of the hour seven days ago rather than to the microsecond.
+    """
+    summaries = window_summaries(data_type, timezone.now() - timedelta(days=7))
+    return _summarize_window(list(summaries))
+
+
+async def arollup_window(data_type):
+    """rollup_window on the async ORM"""
+    summaries = window_summaries(data_type, timezone.now() - timedelta(days=7))
+    return _summarize_window([row async for row in summaries])
+
+
+def _window_vector(window, source):
+    count, latest, values = window
+    if values is None:
+        return None
+    if source == "rollup":
+        return stats_feature_vector(values, latest)
+    return window_feature_vector(values, latest)
+
+
+def window_features(data_type):
+    """(1, 16) feature vector of the last 7 days, None with too few points"""
+    source = settings.PREDICTION_WINDOW_SOURCE
+    window = rollup_window(data_type) if source == "rollup" else recent_window(data_type)
+    return _window_vector(window, source)
+
+
+async def awindow_features(data_type):
+    """window_features on the async ORM"""
+    source = settings.PREDICTION_WINDOW_SOURCE
+    if source == "rollup":
+        window = await arollup_window(data_type)
+    else:
+        window = await arecent_window(data_type)
+    return _window_vector(window, source)
+
+
+def run_model(loaded, features):
+    """Scale features and predict with a LoadedModel, timing each stage
+
+    Uses the compiled export, which includes the scaler, when the registry
+    loaded one: always for linear models, and for trees up to
+    PREDICTION_COMPILED_MAX_ROWS rows, beyond which sklearn is faster.
+    """
+    compiled = loaded.compiled
+    if compiled is not None and (
+        compiled.kind == "linear" or len(features) <= settings.PREDICTION_COMPILED_MAX_ROWS
+    ):
+        with inference_latency.time(data_type=loaded.data_type, stage="compiled"):
+            return compiled.predict(features)
+    with inference_latency.time(data_type=loaded.data_type, stage="transform"):
+        features_scaled = loaded.scaler.transform(features)
+    with inference_latency.time(data_type=loaded.data_type, stage="predict"):
+        return loaded.model.predict(features_scaled)
+
+
+def infer(data_type, feature_vector):
+    """Scale features and predict with the model version current at the call"""
+    loaded = registry.get(data_type)
+    if loaded is None:
+        return None
+    return run_model(loaded, feature_vector)[0]
+
+
 def predict_next_7_days(data_type):
     """Predict next 7 days using the last 7 days of data"""
     try:
         # Get the last 7 days of data from the database
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        recent_data = DataPoint.objects.filter(
-            data_type=data_type, timestamp__gte=seven_days_ago
-        ).order_by("timestamp")
+        feature_vector = window_features(data_type)
+        if feature_vector is None:
+            return None
+
+        return infer(data_type, feature_vector)
 
-        if len(recent_data) < 7:
+    except Exception as e:
+        logger.exception("prediction failed", extra={"data_type": data_type})
+        record_exception(e)
+        return None
+
+
+async def apredict_next_7_days(data_type):
+    """predict_next_7_days with async queries and inference on the pool"""
+    try:
+        feature_vector = await awindow_features(data_type)
+        if feature_vector is None:
             return None
 
-        # Create feature vector from recent data
-        so2_values = [point.so2_value for point in recent_data]
-
-        feature_vector = [
-            np.mean(so2_values),
-            np.std(so2_values),
-            np.min(so2_values),
-            np.max(so2_values),
-            np.median(so2_values),
-            recent_data.last().timestamp.year,
-            recent_data.last().timestamp.month,
-            recent_data.last().timestamp.day,
-            recent_data.last().timestamp.weekday(),
-            recent_data.last().timestamp.hour,
-            np.sin(2 * np.pi * recent_data.last().timestamp.month / 12),
-            np.cos(2 * np.pi * recent_data.last().timestamp.month / 12),
-            np.sin(2 * np.pi * recent_data.last().timestamp.day / 31),
-            np.cos(2 * np.pi * recent_data.last().timestamp.day / 31),
-            np.sin(2 * np.pi * recent_data.last().timestamp.hour / 24),
-            np.cos(2 * np.pi * recent_data.last().timestamp.hour / 24),
-        ]
-
-        # Scale features and predict
-        feature_vector_scaled = scalers[data_type].transform([feature_vector])
-        prediction = models[data_type].predict(feature_vector_scaled)[0]
-
-        return prediction
+        return await inference_pool.run(infer, data_type, feature_vector)
 
+    except PoolSaturated:
+        raise
     except Exception as e:
-        print(f"Error in prediction: {str(e)}")
+        logger.exception("prediction failed", extra={"data_type": data_type})
+        record_exception(e)
         return None
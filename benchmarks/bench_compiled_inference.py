@@ -0,0 +1,79 @@
+"""Latency of the compiled NumPy predictor against the joblib-loaded sklearn model.
+
+Trains the candidate models on synthetic 7-day windows, loads them back
+the way the backend registry does (joblib, mmap_mode='r'), checks that
+the compiled export predicts the same and times both paths per batch
+size. Run from the repository root:
+
+    python -m benchmarks.bench_compiled_inference --rows 20000 --batch 1 100 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from data_processing import BACKEND_DIR, build_window_features, candidate_models
+from benchmarks.synthetic import make_feature_frame
+
+sys.path.append(BACKEND_DIR)
+from predictions.compiled import CompiledModel, compile_model  # noqa: E402
+
+
+def best_of(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000, help='hourly rows to build windows from')
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 100, 10_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    X, y = build_window_features(make_feature_frame(args.rows))
+    scaler = StandardScaler().fit(X)
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'model':<18} {'batch':>7} {'sklearn ms':>11} {'compiled ms':>12} {'speedup':>8}")
+        for name, model in candidate_models(n_jobs=-1).items():
+            model.fit(scaler.transform(X), y)
+            model_path = os.path.join(tmp, f'{name}_model.pkl')
+            scaler_path = os.path.join(tmp, f'{name}_scaler.pkl')
+            compiled_path = os.path.join(tmp, f'{name}_compiled.npz')
+            joblib.dump(model, model_path)
+            joblib.dump(scaler, scaler_path)
+            compile_model(model, scaler).save(compiled_path)
+
+            loaded = joblib.load(model_path, mmap_mode='r')
+            loaded_scaler = joblib.load(scaler_path, mmap_mode='r')
+            compiled = CompiledModel.load(compiled_path)
+
+            for batch in args.batch:
+                rows = X[rng.integers(0, len(X), batch)]
+                reference = loaded.predict(loaded_scaler.transform(rows))
+                # Folding the scaler into linear coefficients reorders the
+                # float arithmetic; trees take the same branches exactly
+                tolerance = 1e-6 if compiled.kind == 'linear' else 1e-9
+                np.testing.assert_allclose(compiled.predict(rows), reference,
+                                           rtol=tolerance, atol=tolerance)
+
+                sklearn_seconds = best_of(
+                    lambda: loaded.predict(loaded_scaler.transform(rows)), args.repeat)
+                compiled_seconds = best_of(lambda: compiled.predict(rows), args.repeat)
+                print(f"{name:<18} {batch:>7,} {sklearn_seconds * 1e3:>11.3f} "
+                      f"{compiled_seconds * 1e3:>12.3f} {sklearn_seconds / compiled_seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""get_data_points throughput per response format, in rows per second.
+
+Fills a throwaway SQLite database with synthetic DataPoints, then times
+full requests through the view (query, encoding, compression) for the
+DRF serializer path and each columnar format available. Run from the
+repository root:
+
+    python -m benchmarks.bench_data_points_format --rows 200000 --limit 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_datapoint_queries import fill, setup_django
+
+FORMATS = {
+    'serializer (JSON)': 'application/json',
+    'columns (JSON)': 'application/vnd.airquality.columns+json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def time_format(client, accept, limit, repeat, encoding):
+    """(best seconds, body bytes) for one page of limit rows"""
+    headers = {'HTTP_ACCEPT': accept}
+    if encoding:
+        headers['HTTP_ACCEPT_ENCODING'] = encoding
+    best, size = np.inf, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get('/api/data-points/', {'limit': limit}, **headers)
+        body = response.content
+        best = min(best, time.perf_counter() - start)
+        size = len(body)
+    assert response.status_code == 200 and accept in response['Content-Type']
+    assert response.get('Content-Encoding', '') == encoding
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--limit', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, 'bench.sqlite3'))
+        from django.conf import settings
+        from django.core.management import call_command
+        from django.test import Client
+
+        settings.DATA_POINTS_MAX_PAGE_SIZE = max(settings.DATA_POINTS_MAX_PAGE_SIZE, args.limit)
+        settings.ALLOWED_HOSTS = ['*']
+        call_command('migrate', verbosity=0)
+        print(f"Filling {args.rows:,} rows...")
+        fill(args.rows)
+        client = Client()
+
+        from predictions import columnar
+        installed = {'msgpack': columnar.msgpack, 'arrow': columnar.pa, 'br': columnar.brotli}
+
+        print(f"\n{'format':<20} {'encoding':<9} {'ms/page':>9} {'rows/s':>11} {'bytes':>11}")
+        for name, accept in FORMATS.items():
+            for encoding in ('', 'gzip', 'br'):
+                if installed.get(name, True) is None or installed.get(encoding, True) is None:
+                    print(f"{name:<20} {encoding or 'none':<9} (not installed)")
+                    continue
+                seconds, size = time_format(client, accept, args.limit, args.repeat, encoding)
+                print(f"{name:<20} {encoding or 'none':<9} {seconds * 1e3:>9.1f} "
+                      f"{args.limit / seconds:>11,.0f} {size:>11,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""DataPoint query latency on a large SQLite table, before and after the indexes.
+
+Builds a throwaway SQLite database with the 0001 schema, fills it with
+synthetic rows (90% satellite), times the API's hot queries, applies the
+0002 index migration and times them again. Run from the repository root:
+
+    python -m benchmarks.bench_datapoint_queries --rows 10000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'air_quality_backend')
+
+
+def setup_django(db_path):
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'air_quality_backend.settings')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    import django
+    django.setup()
+
+
+def fill(n_rows, batch=500_000, seed=42):
+    """Insert n_rows synthetic points spread over the last year"""
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    rng = np.random.default_rng(seed)
+    end = np.datetime64(timezone.now().replace(tzinfo=None), 's')
+    year = 365 * 86400
+    with connection.cursor() as cursor:
+        for start in range(0, n_rows, batch):
+            n = min(batch, n_rows - start)
+            timestamps = (end - rng.integers(0, year, n).astype('timedelta64[s]')).astype(str)
+            data_types = np.where(rng.random(n) < 0.9, 'satellite', 'ground')
+            rows = zip(
+                data_types.tolist(),
+                rng.gamma(2.0, 0.5, n).tolist(),
+                rng.uniform(-90, 90, n).tolist(),
+                rng.uniform(-180, 180, n).tolist(),
+                np.char.replace(timestamps, 'T', ' ').tolist(),
+                np.char.replace(timestamps, 'T', ' ').tolist(),
+            )
+            with transaction.atomic():
+                cursor.executemany(
+                    'INSERT INTO predictions_datapoint '
+                    '(data_type, so2_value, latitude, longitude, timestamp, created_at) '
+                    'VALUES (%s, %s, %s, %s, %s, %s)', rows)
+            print(f"  inserted {start + n:,} rows", end='\r')
+    print()
+
+
+def queries():
+    """The view queries being measured, as name -> callable"""
+    from datetime import timedelta
+    from django.db.models import Count, Max
+    from django.utils import timezone
+    from predictions.models import DataPoint
+    from predictions.pagination import keyset_page, encode_cursor
+
+    ground = DataPoint.objects.filter(data_type='ground')
+    middle = ground.order_by('timestamp').values_list('timestamp', 'id')[ground.count() // 2]
+    middle_cursor = encode_cursor(*middle)
+    week_ago = timezone.now() - timedelta(days=7)
+
+    return {
+        'ground, first page (100)': lambda: keyset_page(ground, None, 100),
+        'ground, mid-table keyset page': lambda: keyset_page(ground, middle_cursor, 100),
+        'ground, mid-table OFFSET page': lambda: list(ground.order_by('-timestamp')[
+            ground.count() // 2:ground.count() // 2 + 100]),
+        'all types, first page (100)': lambda: keyset_page(DataPoint.objects.all(), None, 100),
+        '7-day window count/latest': lambda: DataPoint.objects.filter(
+            data_type='satellite', timestamp__gte=week_ago
+        ).aggregate(count=Count('id'), latest=Max('timestamp')),
+        '1x1 degree bounding box': lambda: DataPoint.objects.filter(
+            latitude__range=(10, 11), longitude__range=(20, 21)
+        ).count(),
+    }
+
+
+def time_queries(repeat):
+    results = {}
+    for name, query in queries().items():
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db', default=None, help='database file (default: a temporary file)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(args.db or os.path.join(tmp, 'bench.sqlite3'))
+        from django.core.management import call_command
+
+        call_command('migrate', 'predictions', '0001', verbosity=0)
+        print(f"Filling {args.rows:,} rows...")
+        fill(args.rows)
+        before = time_queries(args.repeat)
+
+        start = time.perf_counter()
+        call_command('migrate', 'predictions', '0002', verbosity=0)
+        print(f"Index migration took {time.perf_counter() - start:.1f}s")
+        after = time_queries(args.repeat)
+
+    print(f"\n{'query':<32} {'before ms':>11} {'after ms':>10} {'speedup':>9}")
+    for name in before:
+        print(f"{name:<32} {before[name] * 1e3:>11.2f} {after[name] * 1e3:>10.2f} "
+              f"{before[name] / after[name]:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
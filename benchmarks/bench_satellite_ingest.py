@@ -0,0 +1,61 @@
+"""Serial vs process-pool ingestion benchmark for process_satellite_data.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_satellite_ingest --granules 64 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from data_processing import AirQualityDataProcessor
+from benchmarks.synthetic import write_satellite_granules
+
+
+def run(h5_directory, workers, read_bytes='default'):
+    processor = AirQualityDataProcessor()
+    kwargs = {'workers': workers}
+    if read_bytes != 'default':
+        kwargs['read_bytes'] = read_bytes
+    start = time.perf_counter()
+    df = processor.process_satellite_data(h5_directory, **kwargs)
+    return df, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--granules', type=int, default=64)
+    parser.add_argument('--rows', type=int, default=2000, help='scanlines per granule')
+    parser.add_argument('--cols', type=int, default=60, help='pixels per scanline')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        write_satellite_granules(tmp, args.granules, rows=args.rows, cols=args.cols)
+        size_mb = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 1e6
+        print(f"{args.granules} granules, {size_mb:.1f} MB on disk")
+        
+        # Whole-dataset serial reads are the original ingestion path
+        baseline, baseline_seconds = run(tmp, None, read_bytes=None)
+        results = [('serial, whole datasets', baseline_seconds)]
+        
+        chunked, seconds = run(tmp, None)
+        pd.testing.assert_frame_equal(chunked, baseline)
+        results.append(('serial, chunked', seconds))
+        
+        for workers in args.workers:
+            parallel, seconds = run(tmp, workers)
+            pd.testing.assert_frame_equal(parallel, baseline)
+            results.append((f"{workers} workers, chunked", seconds))
+    
+    print(f"\n{'mode':<26} {'seconds':>8} {'rows/s':>12} {'speedup':>8}")
+    for mode, seconds in results:
+        print(f"{mode:<26} {seconds:>8.2f} {len(baseline) / seconds:>12,.0f} "
+              f"{baseline_seconds / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
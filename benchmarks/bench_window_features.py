@@ -0,0 +1,84 @@
+"""Throughput benchmark for build_window_features against the original loop.
+
+Parity with the loop is tested in air_quality_backend/predictions/tests.py
+(WindowFeatureTests). Run from the repository root:
+
+    python -m benchmarks.bench_window_features --rows 10000 1000000 10000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from data_processing import build_window_features
+from benchmarks.synthetic import make_feature_frame
+
+
+def reference_window_features(data, target_column='so2', window_size=7, prediction_days=7):
+    """The original row-by-row iloc loop, timed for comparison"""
+    features = []
+    targets = []
+    
+    for i in range(window_size, len(data) - prediction_days + 1):
+        window_data = data.iloc[i-window_size:i]
+        
+        feature_vector = [
+            window_data[target_column].mean(),
+            window_data[target_column].std(),
+            window_data[target_column].min(),
+            window_data[target_column].max(),
+            window_data[target_column].median()
+        ]
+        
+        last_day = window_data.iloc[-1]
+        feature_vector.extend([
+            last_day['year'],
+            last_day['month'],
+            last_day['day'],
+            last_day['day_of_week'],
+            last_day['hour'],
+            last_day['month_sin'],
+            last_day['month_cos'],
+            last_day['day_sin'],
+            last_day['day_cos'],
+            last_day['hour_sin'],
+            last_day['hour_cos']
+        ])
+        
+        next_7_days = data.iloc[i:i+prediction_days]
+        features.append(feature_vector)
+        targets.append(next_7_days[target_column].mean())
+    
+    return np.array(features), np.array(targets)
+
+
+def bench(func, data, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--loop-rows', type=int, default=10_000,
+                        help='largest size the reference loop is timed at')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    print(f"{'rows':>12} {'vectorized rows/s':>20} {'loop rows/s':>14} {'speedup':>9}")
+    for n_rows in args.rows:
+        data = make_feature_frame(n_rows)
+        seconds = bench(build_window_features, data, args.repeat)
+        line = f"{n_rows:>12,} {n_rows / seconds:>20,.0f}"
+        if n_rows <= args.loop_rows:
+            loop_seconds = bench(reference_window_features, data, 1)
+            line += f" {n_rows / loop_seconds:>14,.0f} {loop_seconds / seconds:>8,.0f}x"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""End-to-end benchmark suite on synthetic data, with JSON results.
+
+Generates a ground sensor CSV and OMPS-like HDF5 granules at the chosen
+scale, then times process_ground_data, process_satellite_data,
+prepare_7day_prediction_data and train_models, and the API endpoints
+through the Django test client against a throwaway SQLite database.
+Results are written as JSON; --baseline compares against an earlier
+results file. Run from the repository root:
+
+    python -m benchmarks.suite --scale small --output results.json
+    python -m benchmarks.suite --scale small --baseline results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_datapoint_queries import fill, setup_django
+from benchmarks.synthetic import write_ground_csv, write_satellite_granules
+from data_processing import AirQualityDataProcessor
+from profiling import StageProfiler
+
+# ground_rows: hourly CSV rows; granules x rows x cols: satellite pixels;
+# db_rows: DataPoints behind the API benchmarks
+SCALES = {
+    'tiny': {'ground_rows': 2_000, 'granules': 2, 'rows': 50, 'cols': 30, 'db_rows': 20_000},
+    'small': {'ground_rows': 20_000, 'granules': 8, 'rows': 200, 'cols': 60, 'db_rows': 200_000},
+    'medium': {'ground_rows': 100_000, 'granules': 32, 'rows': 500, 'cols': 60,
+               'db_rows': 1_000_000},
+    'large': {'ground_rows': 500_000, 'granules': 128, 'rows': 1000, 'cols': 60,
+              'db_rows': 10_000_000},
+}
+
+STAGES = ('ground', 'satellite', 'windows', 'train', 'api')
+
+SCENARIO = {'so2_mean': 8.0, 'so2_std': 1.5, 'so2_min': 5.0, 'so2_max': 11.0,
+            'so2_median': 8.0, 'year': 2024, 'month': 6, 'day': 15, 'day_of_week': 5,
+            'hour': 12}
+
+ENDPOINTS = {
+    'GET predictions': ('get', '/api/predictions/', None),
+    'GET model-info': ('get', '/api/model-info/', None),
+    'GET data-points (100)': ('get', '/api/data-points/', {'limit': 100}),
+    'GET data-points (1000, columns)': ('get', '/api/data-points/', {'limit': 1000}),
+    'GET data-points hourly rollups': ('get', '/api/data-points/',
+                                       {'granularity': 'hour', 'limit': 1000}),
+    'POST predict-custom': ('post', '/api/predict-custom/', SCENARIO),
+    'POST predict-custom/batch (1000)': ('post', '/api/predict-custom/batch/',
+                                         {'columns': {k: [v] * 1000 for k, v in SCENARIO.items()}}),
+}
+HEADERS = {
+    'GET data-points (1000, columns)': {'HTTP_ACCEPT': 'application/vnd.airquality.columns+json'},
+}
+
+
+def timed(profiler, name, fn, repeat=1):
+    """Run fn repeat times, the first under profiler; returns (result, entry)"""
+    with profiler.stage(name) as entry:
+        result = fn()
+    seconds = [entry['wall_seconds']]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    entry['seconds'] = min(seconds)
+    entry['repeat'] = repeat
+    return result, entry
+
+
+def run_pipeline(workdir, scale, stages, profiler, jobs, repeat):
+    """Time the data_processing stages; returns {name: result}"""
+    results = {}
+    processor = AirQualityDataProcessor(profiler=profiler, model_dir=workdir)
+
+    csv_path = write_ground_csv(os.path.join(workdir, 'ground.csv'), scale['ground_rows'])
+    h5_dir = os.path.join(workdir, 'granules')
+    os.makedirs(h5_dir)
+    write_satellite_granules(h5_dir, scale['granules'], rows=scale['rows'], cols=scale['cols'])
+
+    if 'ground' in stages or 'windows' in stages or 'train' in stages:
+        df, entry = timed(profiler, 'process_ground_data',
+                          lambda: processor.process_ground_data(csv_path), repeat)
+        results['process_ground_data'] = dict(entry, rows=scale['ground_rows'])
+    if 'satellite' in stages or 'windows' in stages or 'train' in stages:
+        df, entry = timed(profiler, 'process_satellite_data',
+                          lambda: processor.process_satellite_data(h5_dir), repeat)
+        results['process_satellite_data'] = dict(
+            entry, rows=scale['granules'] * scale['rows'] * scale['cols'])
+
+    if 'windows' in stages:
+        for data_type in ('ground', 'satellite'):
+            data = getattr(processor, f'{data_type}_data')
+            (X, _), entry = timed(profiler, f'prepare_7day_prediction_data[{data_type}]',
+                                  lambda: processor.prepare_7day_prediction_data(data), repeat)
+            results[f'prepare_7day_prediction_data[{data_type}]'] = dict(entry, rows=len(X))
+
+    if 'train' in stages:
+        report, entry = timed(profiler, 'train_models', lambda: processor.train_models(n_jobs=jobs))
+        results['train_models'] = dict(entry, rows=sum(r['n_samples'] for r in report.values()),
+                                       best_r2={k: r['best_r2'] for k, r in report.items()})
+    return results
+
+
+def run_api(workdir, scale, repeat):
+    """Time the endpoints through the test client; returns {name: result}"""
+    setup_django(os.path.join(workdir, 'bench.sqlite3'))
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+
+    settings.ALLOWED_HOSTS = ['*']
+    settings.PREDICTION_MODEL_DIR = workdir
+    call_command('migrate', verbosity=0)
+    print(f"Filling {scale['db_rows']:,} DataPoints...")
+    fill(scale['db_rows'])
+    call_command('rebuild_rollups', verbosity=0)
+    client = Client()
+
+    results = {}
+    for name, (method, url, payload) in ENDPOINTS.items():
+        headers = HEADERS.get(name, {})
+        if method == 'get':
+            request = lambda: client.get(url, payload, **headers)
+        else:
+            request = lambda: client.post(url, json.dumps(payload), content_type='application/json')
+        seconds = []
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            response = request()
+            seconds.append(time.perf_counter() - start)
+        results[name] = {
+            'status': response.status_code,
+            'bytes': len(response.content),
+            'first_seconds': seconds[0],
+            'seconds': min(seconds[1:]),
+            'median_seconds': statistics.median(seconds[1:]),
+            'repeat': repeat,
+        }
+    return results
+
+
+def compare(results, baseline):
+    """Lines comparing every benchmark's best seconds with the baseline's"""
+    lines = [f"{'benchmark':<44} {'baseline s':>11} {'now s':>11} {'change':>8}"]
+    for section in ('pipeline', 'api'):
+        old = baseline.get(section, {})
+        for name, result in results[section].items():
+            if name not in old:
+                continue
+            before, now = old[name]['seconds'], result['seconds']
+            lines.append(f"{name:<44} {before:>11.4f} {now:>11.4f} "
+                         f"{(now - before) / before:>+8.1%}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per fast benchmark; the best is reported')
+    parser.add_argument('--jobs', type=int, default=-1, help='n_jobs for train_models')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='trace Python allocations per pipeline stage (slower)')
+    parser.add_argument('--output', default=None, help='write the results JSON here')
+    parser.add_argument('--baseline', default=None, help='earlier results JSON to compare with')
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    profiler = StageProfiler(trace_memory=args.profile_memory)
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = run_pipeline(tmp, scale, args.stages, profiler, args.jobs, args.repeat)
+        api = run_api(tmp, scale, args.repeat) if 'api' in args.stages else {}
+
+    environment = profiler.report()
+    profile = environment.pop('stages')
+    results = {
+        'scale': args.scale,
+        'params': scale,
+        'stages': args.stages,
+        'environment': environment,
+        'pipeline': pipeline,
+        'api': api,
+        'profile': profile,
+    }
+
+    print(f"\n{'benchmark':<44} {'seconds':>10} {'rows/s':>12}")
+    for name, result in list(pipeline.items()) + list(api.items()):
+        rate = f"{result['rows'] / result['seconds']:>12,.0f}" if 'rows' in result else ''
+        print(f"{name:<44} {result['seconds']:>10.4f} {rate}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"\nResults written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            print('\n' + compare(results, json.load(f)))
+
+
+if __name__ == '__main__':
+    main()
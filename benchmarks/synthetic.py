@@ -0,0 +1,78 @@
+"""Synthetic data generators for offline benchmarks"""
+import numpy as np
+import pandas as pd
+
+from data_processing import add_time_features
+
+
+def make_feature_frame(n_rows, seed=42, nan_fraction=0.0):
+    """Hourly SO2 series with the time feature columns already added"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2000-01-01', periods=n_rows, freq='h')
+    so2 = 8.0 + 2.0 * np.sin(np.arange(n_rows) / 24.0) + rng.normal(0, 1.5, n_rows)
+    if nan_fraction:
+        so2[rng.random(n_rows) < nan_fraction] = np.nan
+    
+    df = pd.DataFrame({'date': dates, 'so2': so2})
+    return add_time_features(df)
+
+
+def write_satellite_granules(directory, n_granules, rows=1000, cols=60, seed=42,
+                             start='2024-01-01', chunks=(100, 60)):
+    """Write OMPS-like granules with SO2/Latitude/Longitude/Time datasets.
+    
+    Each granule is one daily pass of rows x cols pixels; a small fraction
+    of SO2 values are NaN so the cleaning steps have work to do. Returns
+    the written file paths.
+    """
+    import os
+    import h5py
+    
+    rng = np.random.default_rng(seed)
+    start_ts = pd.Timestamp(start).timestamp()
+    chunks = tuple(min(c, s) for c, s in zip(chunks, (rows, cols))) if chunks else None
+    paths = []
+    for g in range(n_granules):
+        day_start = start_ts + g * 86400
+        so2 = rng.gamma(2.0, 0.5, size=(rows, cols))
+        so2[rng.random((rows, cols)) < 0.02] = np.nan
+        lat = np.linspace(-60, 60, rows)[:, None] + rng.normal(0, 0.05, (rows, cols))
+        lon = ((np.linspace(-180, 180, cols)[None, :] + g * 25.0 + 180) % 360) - 180
+        lon = np.broadcast_to(lon, (rows, cols)) + rng.normal(0, 0.05, (rows, cols))
+        time = day_start + np.broadcast_to(np.linspace(0, 6000, rows)[:, None], (rows, cols))
+        
+        path = os.path.join(directory, f"OMPS_SYNTH_{g:04d}.h5")
+        with h5py.File(path, 'w') as f:
+            for name, values in (('SO2', so2), ('Latitude', lat), ('Longitude', lon), ('Time', time)):
+                f.create_dataset(name, data=values, chunks=chunks)
+        paths.append(path)
+    return paths
+
+
+def write_ground_csv(path, n_rows, seed=42, freq='h', end='2024-12-31', nan_fraction=0.01):
+    """Write a ground sensor CSV in the layout of ground_sensor_data.csv.
+    
+    One row per freq period ending at end, with a daily SO2 cycle plus
+    noise, correlated co/no2/o3/pm2_5/pm10/nh3 columns and a small
+    fraction of missing values for the median fill. Returns path.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end, periods=n_rows, freq=freq)
+    hours = dates.hour.to_numpy() + dates.dayofyear.to_numpy() * 24
+    so2 = np.maximum(8.0 + 2.0 * np.sin(hours * 2 * np.pi / 24) + rng.normal(0, 1.5, n_rows), 0)
+    columns = {
+        'so2': so2,
+        'co': 0.25 * so2 + rng.normal(0, 0.2, n_rows),
+        'no2': 5.0 * so2 + rng.normal(0, 3.0, n_rows),
+        'o3': 130.0 - 1.5 * so2 + rng.normal(0, 5.0, n_rows),
+        'pm2_5': 4.0 * so2 + rng.normal(0, 2.0, n_rows),
+        'pm10': 7.5 * so2 + rng.normal(0, 4.0, n_rows),
+        'nh3': 1.4 * so2 + rng.normal(0, 1.0, n_rows),
+    }
+    df = pd.DataFrame({'date': dates.strftime('%Y-%m-%d %H:%M:%S')})
+    for name, values in columns.items():
+        values = np.round(values, 1)
+        values[rng.random(n_rows) < nan_fraction] = np.nan
+        df[name] = values
+    df.to_csv(path, index=False)
+    return path
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Bump when the processing steps change what a cached frame contains
+CACHE_VERSION = 1
+
+
+def fingerprint(path):
+    """Identify a source file by absolute path, size and modification time"""
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+
+class FrameCache:
+    """Persistent columnar cache of processed DataFrames.
+
+    Every entry is a directory holding one .npy file per column plus a
+    meta.json recording the dtypes and the fingerprints of the source files
+    it was built from. An entry is only used while those fingerprints still
+    match, and hits are loaded with memory mapping (copy-on-write) so
+    columns are paged in from disk on demand instead of being parsed.
+
+    Layout: <cache_dir>/<namespace>/<sha1 of key>/{meta.json,<n>.npy}
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, namespace, key):
+        digest = hashlib.sha1(os.path.abspath(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, namespace, digest)
+
+    def _read_meta(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, namespace, key, sources):
+        """Return the cached frame for key if it was built from sources, else None"""
+        entry_dir = self._entry_dir(namespace, key)
+        meta = self._read_meta(entry_dir)
+        if meta is None or meta['version'] != CACHE_VERSION or meta['sources'] != sources:
+            return None
+
+        columns = {}
+        for i, column in enumerate(meta['columns']):
+            path = os.path.join(entry_dir, f"{i}.npy")
+            if column['kind'] == 'object':
+                # Object columns cannot be memory mapped
+                values = np.load(path, allow_pickle=True)
+            else:
+                values = np.load(path, mmap_mode='c')
+                if column['kind'] == 'datetime':
+                    values = values.view(column['dtype'])
+            columns[column['name']] = values
+
+        index = np.load(os.path.join(entry_dir, 'index.npy'), mmap_mode='c')
+        return pd.DataFrame(columns, index=pd.Index(index), copy=False)
+
+    def store(self, namespace, key, sources, df):
+        """Write df as the entry for key, replacing any previous version"""
+        entry_dir = self._entry_dir(namespace, key)
+        parent = os.path.dirname(entry_dir)
+        os.makedirs(parent, exist_ok=True)
+
+        # Write into a scratch directory first so readers never see a
+        # half-written entry
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+        columns = []
+        for i, name in enumerate(df.columns):
+            values = df[name].to_numpy()
+            if values.dtype.kind == 'M':
+                kind = 'datetime'
+                dtype = str(values.dtype)
+                values = values.view('int64')
+            elif values.dtype.kind == 'O':
+                kind = 'object'
+                dtype = 'object'
+            else:
+                kind = 'numeric'
+                dtype = str(values.dtype)
+            np.save(os.path.join(tmp_dir, f"{i}.npy"), values, allow_pickle=(kind == 'object'))
+            columns.append({'name': name, 'kind': kind, 'dtype': dtype})
+
+        np.save(os.path.join(tmp_dir, 'index.npy'), df.index.to_numpy(dtype=np.int64))
+        meta = {
+            'version': CACHE_VERSION,
+            'key': os.path.abspath(key),
+            'sources': sources,
+            'rows': len(df),
+            'columns': columns
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.replace(tmp_dir, entry_dir)
+
+    def prune_missing(self, namespace):
+        """Remove entries in namespace whose source key no longer exists on disk"""
+        namespace_dir = os.path.join(self.cache_dir, namespace)
+        if not os.path.isdir(namespace_dir):
+            return 0
+
+        removed = 0
+        for name in os.listdir(namespace_dir):
+            entry_dir = os.path.join(namespace_dir, name)
+            meta = self._read_meta(entry_dir)
+            if meta is not None and not os.path.exists(meta['key']):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                removed += 1
+        return removed
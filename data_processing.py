@@ -2,153 +2,639 @@ import pandas as pd
 import numpy as np
 import h5py
 import os
+import sys
+import hashlib
+import importlib
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-import joblib
-from sklearn.model_selection import train_test_split
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.model_selection import train_test_split, TimeSeriesSplit, cross_validate
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingGridSearchCV
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from numpy.lib.stride_tricks import sliding_window_view
 import warnings
 warnings.filterwarnings('ignore')
 
-class AirQualityDataProcessor:
+from data_cache import FrameCache, fingerprint
+from profiling import StageProfiler
+from spatial_index import SpatialGrid
+
+# Use last 7 days to predict next 7 days
+WINDOW_SIZE = 7
+PREDICTION_DAYS = 7
+
+# Time features taken from the last day of each window, in feature order
+TIME_FEATURE_COLUMNS = [
+    'year', 'month', 'day', 'day_of_week', 'hour',
+    'month_sin', 'month_cos', 'day_sin', 'day_cos', 'hour_sin', 'hour_cos'
+]
+
+# Pollutant columns of the ground sensor CSV, predicted together by the
+# multi-output models
+POLLUTANT_COLUMNS = ['so2', 'co', 'no2', 'o3', 'pm2_5', 'pm10', 'nh3']
+WINDOW_STATS = ['mean', 'std', 'min', 'max', 'median']
+
+
+def add_time_features(df):
+    """Add calendar and cyclical time features derived from the date column"""
+    df['year'] = df['date'].dt.year
+    df['month'] = df['date'].dt.month
+    df['day'] = df['date'].dt.day
+    df['day_of_week'] = df['date'].dt.dayofweek
+    df['hour'] = df['date'].dt.hour
+    
+    # Cyclical encoding for time features
+    df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
+    df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
+    df['day_sin'] = np.sin(2 * np.pi * df['day'] / 31)
+    df['day_cos'] = np.cos(2 * np.pi * df['day'] / 31)
+    df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
+    df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
+    return df
+
+
+def build_window_features(data, target_column='so2', window_size=WINDOW_SIZE,
+                          prediction_days=PREDICTION_DAYS, chunk_size=1_000_000):
+    """Build the 16-column window feature matrix and targets in one pass.
+    
+    Equivalent to walking data.iloc[i-window_size:i] for every row, but all
+    windows are taken as strided views of the underlying arrays. Windows are
+    reduced in chunks of chunk_size so the temporary copies made by the
+    median stay bounded on very long series. Data must already be sorted.
+    """
+    values = data[target_column].to_numpy(dtype=np.float64)
+    time_values = data[TIME_FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    
+    n_windows = len(values) - window_size - prediction_days + 1
+    n_features = 5 + len(TIME_FEATURE_COLUMNS)
+    if n_windows <= 0:
+        return np.empty((0, n_features)), np.empty(0)
+    
+    # Window i covers rows [i, i + window_size), its target the following
+    # prediction_days rows
+    windows = sliding_window_view(values[:len(values) - prediction_days], window_size)
+    horizons = sliding_window_view(values[window_size:], prediction_days)
+    
+    mean, std, vmin, vmax, median = _window_reducers(values)
+    
+    features = np.empty((n_windows, n_features))
+    targets = np.empty(n_windows)
+    for start in range(0, n_windows, chunk_size):
+        stop = min(start + chunk_size, n_windows)
+        chunk = windows[start:stop]
+        features[start:stop, 0] = mean(chunk, axis=1)
+        features[start:stop, 1] = std(chunk, axis=1, ddof=1)
+        features[start:stop, 2] = vmin(chunk, axis=1)
+        features[start:stop, 3] = vmax(chunk, axis=1)
+        features[start:stop, 4] = median(chunk, axis=1)
+        targets[start:stop] = mean(horizons[start:stop], axis=1)
+    
+    # Time features from the last day in each window
+    features[:, 5:] = time_values[window_size - 1:window_size - 1 + n_windows]
+    
+    return features, targets
+
+
+def _window_reducers(values):
+    """mean, std, min, max and median functions matching pandas' NaN handling"""
+    # pandas skips NaN in its reductions, so only pay for the nan-aware
+    # variants when there is something to skip
+    if np.isnan(values).any():
+        return np.nanmean, np.nanstd, np.nanmin, np.nanmax, np.nanmedian
+    return np.mean, np.std, np.min, np.max, np.median
+
+
+def multi_output_feature_names(columns):
+    """Feature names of build_multi_window_features, in column order"""
+    return [f'{column}_{stat}' for column in columns for stat in WINDOW_STATS] + TIME_FEATURE_COLUMNS
+
+
+def multi_output_target_names(columns, prediction_days=PREDICTION_DAYS):
+    """Target names of build_multi_window_features: every column at every day ahead"""
+    return [f'{column}_day{day}' for column in columns for day in range(1, prediction_days + 1)]
+
+
+def build_multi_window_features(data, columns, window_size=WINDOW_SIZE,
+                                prediction_days=PREDICTION_DAYS, chunk_size=1_000_000):
+    """Window features and per-day targets for several pollutant columns at once.
+    
+    The features are the five window stats of every column followed by
+    the time features of the window's last row; for a single 'so2' column
+    they equal build_window_features. The targets are the value of every
+    column on each of the prediction_days rows after the window, ordered
+    as multi_output_target_names. Windows with a missing target are
+    dropped. Data must already be sorted.
+    """
+    time_values = data[TIME_FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    n_windows = len(data) - window_size - prediction_days + 1
+    n_stats = len(WINDOW_STATS)
+    n_features = n_stats * len(columns) + len(TIME_FEATURE_COLUMNS)
+    if n_windows <= 0:
+        return np.empty((0, n_features)), np.empty((0, len(columns) * prediction_days))
+    
+    features = np.empty((n_windows, n_features))
+    targets = np.empty((n_windows, len(columns) * prediction_days))
+    for j, column in enumerate(columns):
+        values = data[column].to_numpy(dtype=np.float64)
+        windows = sliding_window_view(values[:len(values) - prediction_days], window_size)
+        mean, std, vmin, vmax, median = _window_reducers(values)
+        
+        first = j * n_stats
+        for start in range(0, n_windows, chunk_size):
+            stop = min(start + chunk_size, n_windows)
+            chunk = windows[start:stop]
+            features[start:stop, first] = mean(chunk, axis=1)
+            features[start:stop, first + 1] = std(chunk, axis=1, ddof=1)
+            features[start:stop, first + 2] = vmin(chunk, axis=1)
+            features[start:stop, first + 3] = vmax(chunk, axis=1)
+            features[start:stop, first + 4] = median(chunk, axis=1)
+        
+        # Row i + window_size + d - 1 is day d after window i
+        targets[:, j * prediction_days:(j + 1) * prediction_days] = sliding_window_view(
+            values[window_size:], prediction_days)
+    
+    features[:, n_stats * len(columns):] = time_values[window_size - 1:window_size - 1 + n_windows]
+    
+    complete = ~np.isnan(targets).any(axis=1)
+    if not complete.all():
+        features, targets = features[complete], targets[complete]
+    return features, targets
+
+
+# Target size of each HDF5 read; slices are rounded to whole chunks
+SATELLITE_READ_BYTES = 64 * 1024 * 1024
+
+
+def _satellite_dataset_names(f):
+    """Resolve the SO2/latitude/longitude/time dataset names in a granule"""
+    if 'SO2' not in f and 'so2' not in f:
+        return None
+    return {
+        'so2': 'SO2' if 'SO2' in f else 'so2',
+        'latitude': 'Latitude' if 'Latitude' in f else 'lat',
+        'longitude': 'Longitude' if 'Longitude' in f else 'lon',
+        'timestamp': 'Time' if 'Time' in f else 'time'
+    }
+
+
+def _granule_frame(arrays):
+    """Flatten raw granule arrays into rows and drop incomplete ones"""
+    frame = pd.DataFrame({column: values.flatten() for column, values in arrays.items()})
+    frame['date'] = pd.to_datetime(frame['timestamp'], unit='s')
+    return frame.dropna()
+
+
+def read_satellite_granule(file_path, read_bytes=SATELLITE_READ_BYTES):
+    """Read one HDF5 granule into so2/latitude/longitude/timestamp/date rows.
+    
+    When all four datasets share a shape they are read in slices along the
+    first axis, aligned to the SO2 chunk layout and sized to about
+    read_bytes, and incomplete rows are dropped slice by slice. Otherwise,
+    or with read_bytes=None, each dataset is read whole. Returns None for
+    files without an SO2 dataset.
+    """
+    with h5py.File(file_path, 'r') as f:
+        names = _satellite_dataset_names(f)
+        if names is None:
+            return None
+        datasets = {column: f[name] for column, name in names.items()}
+        
+        so2 = datasets['so2']
+        if read_bytes is None or so2.ndim == 0 or len({ds.shape for ds in datasets.values()}) > 1:
+            return _granule_frame({column: ds[:] for column, ds in datasets.items()})
+        
+        row_bytes = sum(ds.dtype.itemsize for ds in datasets.values()) * int(np.prod(so2.shape[1:]))
+        step = max(1, read_bytes // max(row_bytes, 1))
+        if so2.chunks:
+            step = max(1, step // so2.chunks[0]) * so2.chunks[0]
+        
+        frames = [
+            _granule_frame({column: ds[start:start + step] for column, ds in datasets.items()})
+            for start in range(0, max(so2.shape[0], 1), step)
+        ]
+    
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def satellite_granule_names(h5_directory):
+    """List the .h5 granules in a directory, in directory order"""
+    return [filename for filename in os.listdir(h5_directory) if filename.endswith('.h5')]
+
+
+def iter_satellite_granules(h5_directory, workers=None, read_bytes=SATELLITE_READ_BYTES,
+                            filenames=None):
+    """Yield (filename, frame) for every readable .h5 granule, in directory order.
+    
+    With workers > 1 (or -1 for all cores) granules are read by a process
+    pool. At most two granules per worker are in flight, so finished frames
+    never pile up faster than the caller consumes them. filenames restricts
+    the read to a subset of the directory.
+    """
+    if filenames is None:
+        filenames = satellite_granule_names(h5_directory)
+    if workers is not None and workers < 0:
+        workers = os.cpu_count()
+    
+    if not workers or workers == 1:
+        for filename in filenames:
+            try:
+                frame = read_satellite_granule(os.path.join(h5_directory, filename), read_bytes)
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+                continue
+            if frame is not None:
+                yield filename, frame
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        queued = iter(filenames)
+        pending = deque()
+        
+        def submit_next():
+            filename = next(queued, None)
+            if filename is not None:
+                path = os.path.join(h5_directory, filename)
+                pending.append((filename, executor.submit(read_satellite_granule, path, read_bytes)))
+        
+        for _ in range(2 * workers):
+            submit_next()
+        
+        while pending:
+            filename, future = pending.popleft()
+            submit_next()
+            try:
+                frame = future.result()
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+                continue
+            if frame is not None:
+                yield filename, frame
+
+
+def candidate_models(n_jobs=None):
+    """Fresh instances of the models compared for each data source"""
+    return {
+        'RandomForest': RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs),
+        'GradientBoosting': GradientBoostingRegressor(n_estimators=100, random_state=42),
+        'LinearRegression': LinearRegression()
+    }
+
+
+# Hyperparameter grids explored by successive halving, which grows
+# n_estimators from HALVING_MIN_ESTIMATORS by HALVING_FACTOR each round and
+# only keeps the best 1/HALVING_FACTOR of the candidates
+PARAM_GRIDS = {
+    'RandomForest': {
+        'max_depth': [None, 10, 20],
+        'min_samples_leaf': [1, 5, 20],
+        'max_features': [1.0, 'sqrt']
+    },
+    'GradientBoosting': {
+        'learning_rate': [0.05, 0.1, 0.2],
+        'max_depth': [2, 3, 5],
+        'subsample': [1.0, 0.8]
+    }
+}
+HALVING_MIN_ESTIMATORS = 20
+HALVING_MAX_ESTIMATORS = 300
+HALVING_FACTOR = 3
+
+
+def multi_output_models(n_jobs=None):
+    """Candidates fitting every target at once; one forest is shared by all targets
+    
+    GradientBoostingRegressor only fits a single output, and wrapping it
+    per target would mean one ensemble per pollutant and day, so it is not
+    a candidate here.
+    """
+    return {
+        'RandomForest': RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs),
+        'LinearRegression': LinearRegression()
+    }
+
+
+def split_jobs(n_tasks, n_jobs):
+    """(outer, inner) n_jobs for n_tasks model fits run in parallel
+
+    The outer Parallel runs up to n_tasks workers and the cores n_jobs
+    allows are shared out between them, so each estimator gets
+    cores // outer (at least one) instead of all of them in every worker.
+    """
+    cores = effective_n_jobs(n_jobs)
+    outer = min(n_tasks, cores)
+    return outer, max(1, cores // outer)
+
+
+def time_series_splitter(n_samples, mode='expanding', n_splits=5):
+    """Time-ordered CV folds over window samples, or None if there are too few
+    
+    Consecutive windows share target days, so PREDICTION_DAYS - 1 samples
+    are left out between each training block and its test block. 'sliding'
+    caps every training block at the size of the first one; 'expanding'
+    trains on everything before the test block. n_splits is reduced when
+    the series is too short for it.
+    """
+    gap = PREDICTION_DAYS - 1
+    for k in range(n_splits, 1, -1):
+        test_size = n_samples // (k + 1)
+        first_train_size = n_samples - gap - k * test_size
+        if test_size >= 2 and first_train_size >= 2:
+            max_train_size = first_train_size if mode == 'sliding' else None
+            return TimeSeriesSplit(n_splits=k, gap=gap, test_size=test_size,
+                                   max_train_size=max_train_size)
+    return None
+
+
+def _cv_candidate(model, X, y, splitter):
+    """Score one candidate on every time-ordered fold"""
+    cv = cross_validate(model, X, y, cv=splitter, scoring='r2')
+    return {
+        'fit_seconds': float(cv['fit_time'].sum()),
+        'predict_seconds': float(cv['score_time'].sum()),
+        'r2': float(np.mean(cv['test_score'])),
+        'r2_std': float(np.std(cv['test_score'])),
+        'r2_folds': cv['test_score'].tolist()
+    }
+
+
+def _search_candidate(model, param_grid, X, y, splitter, n_jobs):
+    """Successive-halving grid search over n_estimators for one model family"""
+    search = HalvingGridSearchCV(
+        model, param_grid, resource='n_estimators', factor=HALVING_FACTOR,
+        min_resources=HALVING_MIN_ESTIMATORS, max_resources=HALVING_MAX_ESTIMATORS,
+        cv=splitter, scoring='r2', refit=False, n_jobs=n_jobs, random_state=42
+    )
+    start = time.perf_counter()
+    search.fit(X, y)
+    
+    results = search.cv_results_
+    best = search.best_index_
+    fold_scores = [results[f'split{k}_test_score'][best] for k in range(splitter.get_n_splits())]
+    summary = {
+        'fit_seconds': time.perf_counter() - start,
+        'predict_seconds': float(np.sum(results['mean_score_time'])),
+        'r2': float(results['mean_test_score'][best]),
+        'r2_std': float(results['std_test_score'][best]),
+        'r2_folds': [float(score) for score in fold_scores],
+        'best_params': search.best_params_,
+        'n_candidates': search.n_candidates_,
+        'n_resources': search.n_resources_
+    }
+    trials = [
+        {
+            'iter': int(results['iter'][i]),
+            'n_estimators': int(results['n_resources'][i]),
+            'params': results['params'][i],
+            'mean_r2': float(results['mean_test_score'][i]),
+            'std_r2': float(results['std_test_score'][i])
+        }
+        for i in range(len(results['params']))
+    ]
+    return summary, trials
+
+
+def _fit_candidate(model, X_train, y_train, X_test, y_test):
+    """Fit one candidate model and time/score it on the held-out split"""
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    y_pred = model.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+    
+    return model, {
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'r2': float(r2_score(y_test, y_pred))
+    }
+
+
+# Trained models are published as versioned bundles by the backend's
+# ArtifactStore, whose models_manifest.json the model registry reads; the
+# trailing rows of each model's training data are kept in the bundle so
+# later updates can complete windows that straddle the new rows
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'air_quality_backend')
+CONTEXT_ROWS = WINDOW_SIZE + PREDICTION_DAYS - 1
+
+
+def _backend_module(name):
+    """Import a Django-free module of the backend's predictions app"""
+    if BACKEND_DIR not in sys.path:
+        sys.path.append(BACKEND_DIR)
+    return importlib.import_module(f'predictions.{name}')
+
+
+def artifact_store(model_dir='.'):
+    """The backend's ArtifactStore for model_dir
+    
+    The bundle layout is defined by predictions/artifacts.py, next to the
+    registry that loads it; the backend settings decide how many versions
+    are kept and which pinned ones must never be pruned.
+    """
+    return _backend_module('artifacts').ArtifactStore.from_settings(model_dir)
+
+
+def data_fingerprint(data, columns=None):
+    """Rows, date range and content hash of the frame a model is trained on"""
+    data = data.sort_values('date')
+    columns = [column for column in ['date'] + (columns or POLLUTANT_COLUMNS) if column in data.columns]
+    hashes = pd.util.hash_pandas_object(data[columns], index=False).to_numpy()
+    return {
+        'rows': int(len(data)),
+        'columns': columns,
+        'start': str(data['date'].iloc[0]) if len(data) else None,
+        'end': str(data['date'].iloc[-1]) if len(data) else None,
+        'sha256': hashlib.sha256(hashes.tobytes()).hexdigest()
+    }
+
+
+class RunningStats:
+    """Single-pass mean/variance over batches (Chan et al. parallel update).
+    
+    Each batch is reduced with NumPy and merged into the running totals, so
+    the global statistics never need more than one batch in memory. std()
+    uses ddof=1 to match pandas.
+    """
+    
     def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        n = len(values)
+        if n == 0:
+            return self
+        
+        batch_mean = values.mean()
+        batch_m2 = np.square(values - batch_mean).sum()
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+        return self
+    
+    def std(self, ddof=1):
+        if self.count <= ddof:
+            return np.nan
+        return np.sqrt(self.m2 / (self.count - ddof))
+
+
+class AirQualityDataProcessor:
+    def __init__(self, cache_dir=None, profiler=None, model_dir='.', compress=0):
         self.ground_data = None
         self.satellite_data = None
+        self.spatial_grid = None
+        # RunningStats of satellite SO2, set by stream_satellite_data
+        self.satellite_so2_stats = None
         self.ground_model = None
         self.satellite_model = None
         self.ground_scaler = StandardScaler()
         self.satellite_scaler = StandardScaler()
+        # data_type -> (model, scaler, schema) of the multi-output models
+        self.multi_output = {}
+        # Processed frames are cached on disk when a cache directory is given
+        self.cache = FrameCache(cache_dir) if cache_dir else None
+        # Stage timings are only measured when an enabled profiler is given
+        self.profiler = profiler or StageProfiler(enabled=False)
+        # Trained models are published as bundles under model_dir; compress
+        # (1-9) trades memory-mapped loading for smaller files
+        self.model_dir = model_dir
+        self.compress = compress
+        self._store = None
+    
+    @property
+    def store(self):
+        """ArtifactStore of model_dir, created when a model is first published or loaded
+        
+        Creating it reads the backend settings, so processing that never
+        touches a model does not depend on them.
+        """
+        if self._store is None:
+            self._store = artifact_store(self.model_dir)
+        return self._store
         
     def process_ground_data(self, csv_file_path):
         """Process ground sensor data - extract last 1 year and clean"""
         print("Processing ground sensor data...")
         
-        # Read the CSV file
-        df = pd.read_csv(csv_file_path)
+        if self.cache is not None:
+            sources = [fingerprint(csv_file_path)]
+            df = self.cache.load('ground', csv_file_path, sources)
+            if df is not None:
+                self.ground_data = df
+                print(f"Loaded ground data from cache: {df.shape}")
+                return df
         
-        # Convert date column to datetime
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-        elif 'Date' in df.columns:
-            df['date'] = pd.to_datetime(df['Date'])
-        else:
-            # Try to find date column
-            date_cols = [col for col in df.columns if 'date' in col.lower() or 'time' in col.lower()]
-            if date_cols:
-                df['date'] = pd.to_datetime(df[date_cols[0]])
+        with self.profiler.stage('read_csv'):
+            # Read the CSV file
+            df = pd.read_csv(csv_file_path)
+        
+            # Convert date column to datetime
+            if 'date' in df.columns:
+                df['date'] = pd.to_datetime(df['date'])
+            elif 'Date' in df.columns:
+                df['date'] = pd.to_datetime(df['Date'])
             else:
-                raise ValueError("No date column found in the dataset")
+                # Try to find date column
+                date_cols = [col for col in df.columns if 'date' in col.lower() or 'time' in col.lower()]
+                if date_cols:
+                    df['date'] = pd.to_datetime(df[date_cols[0]])
+                else:
+                    raise ValueError("No date column found in the dataset")
         
-        # Sort by date
-        df = df.sort_values('date')
-        
-        # Get the last 1 year of data
-        latest_date = df['date'].max()
-        one_year_ago = latest_date - timedelta(days=365)
-        df = df[df['date'] >= one_year_ago].copy()
-        
-        print(f"Ground data shape after filtering: {df.shape}")
-        print(f"Date range: {df['date'].min()} to {df['date'].max()}")
-        
-        # Clean the data
-        # Remove rows with all NaN values
-        df = df.dropna(how='all')
-        
-        # Handle missing values in numeric columns
-        numeric_columns = df.select_dtypes(include=[np.number]).columns
-        for col in numeric_columns:
-            if col != 'date':
-                # Fill missing values with median
-                df[col] = df[col].fillna(df[col].median())
-        
-        # Create additional features
-        df['year'] = df['date'].dt.year
-        df['month'] = df['date'].dt.month
-        df['day'] = df['date'].dt.day
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['hour'] = df['date'].dt.hour
-        
-        # Cyclical encoding for time features
-        df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
-        df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
-        df['day_sin'] = np.sin(2 * np.pi * df['day'] / 31)
-        df['day_cos'] = np.cos(2 * np.pi * df['day'] / 31)
-        df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
-        df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
+        with self.profiler.stage('clean'):
+            # Sort by date
+            df = df.sort_values('date')
+        
+            # Get the last 1 year of data
+            latest_date = df['date'].max()
+            one_year_ago = latest_date - timedelta(days=365)
+            df = df[df['date'] >= one_year_ago].copy()
+        
+            print(f"Ground data shape after filtering: {df.shape}")
+            print(f"Date range: {df['date'].min()} to {df['date'].max()}")
+        
+            # Clean the data
+            # Remove rows with all NaN values
+            df = df.dropna(how='all')
+        
+            # Handle missing values in numeric columns
+            numeric_columns = df.select_dtypes(include=[np.number]).columns
+            for col in numeric_columns:
+                if col != 'date':
+                    # Fill missing values with median
+                    df[col] = df[col].fillna(df[col].median())
+        
+        with self.profiler.stage('features'):
+            # Create additional features
+            add_time_features(df)
+        
+        if self.cache is not None:
+            with self.profiler.stage('cache_store'):
+                self.cache.store('ground', csv_file_path, sources, df)
         
         self.ground_data = df
         print("Ground data processing completed!")
         return df
     
-    def process_satellite_data(self, h5_directory):
-        """Process NASA satellite data - extract SO2, lat, lon, timestamps"""
+    def process_satellite_data(self, h5_directory, workers=None, read_bytes=SATELLITE_READ_BYTES):
+        """Process NASA satellite data - extract SO2, lat, lon, timestamps
+        
+        workers > 1 reads granules concurrently in a process pool, and
+        read_bytes bounds the size of each HDF5 read (None reads whole
+        datasets).
+        """
         print("Processing satellite data...")
         
-        satellite_data = []
-        
-        # Process all HDF5 files in the directory
-        for filename in os.listdir(h5_directory):
-            if filename.endswith('.h5'):
-                file_path = os.path.join(h5_directory, filename)
-                try:
-                    with h5py.File(file_path, 'r') as f:
-                        # Extract SO2 data and coordinates
-                        if 'SO2' in f or 'so2' in f:
-                            so2_key = 'SO2' if 'SO2' in f else 'so2'
-                            so2_data = f[so2_key][:]
-                            
-                            # Extract latitude and longitude
-                            lat_data = f['Latitude'][:] if 'Latitude' in f else f['lat'][:]
-                            lon_data = f['Longitude'][:] if 'Longitude' in f else f['lon'][:]
-                            
-                            # Extract timestamps
-                            time_data = f['Time'][:] if 'Time' in f else f['time'][:]
-                            
-                            # Create DataFrame for this file
-                            file_data = pd.DataFrame({
-                                'so2': so2_data.flatten(),
-                                'latitude': lat_data.flatten(),
-                                'longitude': lon_data.flatten(),
-                                'timestamp': time_data.flatten()
-                            })
-                            
-                            # Convert timestamp to datetime
-                            file_data['date'] = pd.to_datetime(file_data['timestamp'], unit='s')
-                            
-                            satellite_data.append(file_data)
-                            
-                except Exception as e:
-                    print(f"Error processing {filename}: {str(e)}")
-                    continue
+        if self.cache is not None:
+            filenames = satellite_granule_names(h5_directory)
+            sources = [fingerprint(os.path.join(h5_directory, filename)) for filename in filenames]
+            df = self.cache.load('satellite', h5_directory, sources)
+            if df is not None:
+                self.satellite_data = df
+                print(f"Loaded satellite data from cache: {df.shape}")
+                return df
+            with self.profiler.stage('read_hdf5'):
+                satellite_data = self._read_granules_cached(h5_directory, filenames, workers, read_bytes)
+        else:
+            # Process all HDF5 files in the directory
+            with self.profiler.stage('read_hdf5'):
+                satellite_data = [
+                    frame for _, frame in iter_satellite_granules(h5_directory, workers, read_bytes)
+                ]
         
         if satellite_data:
-            # Combine all satellite data
-            df = pd.concat(satellite_data, ignore_index=True)
-            
-            # Clean the data
-            df = df.dropna()
+            with self.profiler.stage('clean'):
+                # Combine all satellite data (rows with missing values are
+                # already dropped per granule)
+                df = pd.concat(satellite_data, ignore_index=True)
+                
+                # Remove outliers (SO2 values > 3 standard deviations from mean)
+                so2_mean = df['so2'].mean()
+                so2_std = df['so2'].std()
+                df = df[abs(df['so2'] - so2_mean) <= 3 * so2_std]
             
-            # Remove outliers (SO2 values > 3 standard deviations from mean)
-            so2_mean = df['so2'].mean()
-            so2_std = df['so2'].std()
-            df = df[abs(df['so2'] - so2_mean) <= 3 * so2_std]
+            with self.profiler.stage('features'):
+                # Create additional features
+                add_time_features(df)
             
-            # Create additional features
-            df['year'] = df['date'].dt.year
-            df['month'] = df['date'].dt.month
-            df['day'] = df['date'].dt.day
-            df['day_of_week'] = df['date'].dt.dayofweek
-            df['hour'] = df['date'].dt.hour
-            
-            # Cyclical encoding
-            df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
-            df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
-            df['day_sin'] = np.sin(2 * np.pi * df['day'] / 31)
-            df['day_cos'] = np.cos(2 * np.pi * df['day'] / 31)
-            df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
-            df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
+            if self.cache is not None:
+                with self.profiler.stage('cache_store'):
+                    self.cache.store('satellite', h5_directory, sources, df)
             
             self.satellite_data = df
             print(f"Satellite data shape: {df.shape}")
@@ -159,6 +645,83 @@ class AirQualityDataProcessor:
             
         return self.satellite_data
     
+    def _read_granules_cached(self, h5_directory, filenames, workers, read_bytes):
+        """Load granule frames from the cache, reading only new or changed granules"""
+        frames = {}
+        sources = {}
+        missing = []
+        for filename in filenames:
+            path = os.path.join(h5_directory, filename)
+            sources[filename] = [fingerprint(path)]
+            frame = self.cache.load('granules', path, sources[filename])
+            if frame is None:
+                missing.append(filename)
+            else:
+                frames[filename] = frame
+        
+        print(f"{len(frames)} granules cached, {len(missing)} to read")
+        for filename, frame in iter_satellite_granules(h5_directory, workers, read_bytes, missing):
+            self.cache.store('granules', os.path.join(h5_directory, filename), sources[filename], frame)
+            frames[filename] = frame
+        
+        self.cache.prune_missing('granules')
+        return [frames[filename] for filename in filenames if filename in frames]
+    
+    def stream_satellite_data(self, h5_directory, workers=None, read_bytes=SATELLITE_READ_BYTES):
+        """Yield cleaned, feature-engineered satellite batches one granule at a time
+        
+        The 3-sigma SO2 filter needs global statistics, so granules are read
+        twice: the first pass only feeds a RunningStats estimator, the second
+        filters and adds time features per granule. Memory stays bounded by
+        the granules in flight rather than the whole dataset.
+        """
+        print("Streaming satellite data...")
+        
+        stats = RunningStats()
+        for _, frame in iter_satellite_granules(h5_directory, workers, read_bytes):
+            stats.update(frame['so2'].to_numpy())
+        
+        if stats.count == 0:
+            print("No satellite data found!")
+            return
+        
+        so2_mean = stats.mean
+        so2_std = stats.std()
+        self.satellite_so2_stats = stats
+        print(f"SO2 mean = {so2_mean:.4f}, std = {so2_std:.4f} over {stats.count} rows")
+        
+        for _, frame in iter_satellite_granules(h5_directory, workers, read_bytes):
+            # Remove outliers (SO2 values > 3 standard deviations from mean)
+            batch = frame[abs(frame['so2'] - so2_mean) <= 3 * so2_std].copy()
+            if len(batch):
+                yield add_time_features(batch)
+    
+    def build_spatial_grid(self, cell_size=1.0, batches=None):
+        """Bin satellite pixels into a lat/lon grid of per-cell daily aggregates
+        
+        Uses self.satellite_data unless an iterable of batches (for example
+        stream_satellite_data) is given.
+        """
+        print(f"Building {cell_size} degree spatial grid...")
+        grid = SpatialGrid(cell_size)
+        if batches is None:
+            batches = [self.satellite_data] if self.satellite_data is not None else []
+        for batch in batches:
+            grid.add(batch)
+        
+        self.spatial_grid = grid
+        print(f"{len(grid.cells)} populated cells, {len(grid.days)} cell-days")
+        return grid
+    
+    def satellite_series_at(self, latitude, longitude):
+        """Daily SO2 series of the grid cell nearest to a location, with time features"""
+        if self.spatial_grid is None:
+            self.build_spatial_grid()
+        cell = self.spatial_grid.nearest_cell(latitude, longitude)
+        if cell is None:
+            return None
+        return add_time_features(self.spatial_grid.cell_frame(cell))
+    
     def prepare_7day_prediction_data(self, data, target_column='so2'):
         """Prepare data for 7-day prediction using last 7 days to predict next 7 days"""
         print(f"Preparing 7-day prediction data for {target_column}...")
@@ -166,146 +729,358 @@ class AirQualityDataProcessor:
         # Sort by date
         data = data.sort_values('date')
         
-        # Create features for 7-day prediction
-        features = []
-        targets = []
+        return build_window_features(data, target_column)
+    
+    def train_models(self, n_jobs=-1, cv=None, n_splits=5, search=False):
+        """Train models for both ground and satellite data
         
-        # Use last 7 days to predict next 7 days
-        window_size = 7
-        prediction_days = 7
+        Candidate models are fitted concurrently, one process per candidate
+        up to the n_jobs cores, with the cores left over shared out among the
+        forests (see split_jobs); per-model timings and scores are collected
+        in self.training_report.
         
-        for i in range(window_size, len(data) - prediction_days + 1):
-            # Features: last 7 days of data
-            window_data = data.iloc[i-window_size:i]
-            
-            # Create features from the window
-            feature_vector = []
-            
-            # Statistical features from the window
-            feature_vector.extend([
-                window_data[target_column].mean(),
-                window_data[target_column].std(),
-                window_data[target_column].min(),
-                window_data[target_column].max(),
-                window_data[target_column].median()
-            ])
-            
-            # Time features from the last day in window
-            last_day = window_data.iloc[-1]
-            feature_vector.extend([
-                last_day['year'],
-                last_day['month'],
-                last_day['day'],
-                last_day['day_of_week'],
-                last_day['hour'],
-                last_day['month_sin'],
-                last_day['month_cos'],
-                last_day['day_sin'],
-                last_day['day_cos'],
-                last_day['hour_sin'],
-                last_day['hour_cos']
-            ])
-            
-            # Target: next 7 days average
-            next_7_days = data.iloc[i:i+prediction_days]
-            target_value = next_7_days[target_column].mean()
-            
-            features.append(feature_vector)
-            targets.append(target_value)
+        cv='expanding' or 'sliding' selects the model on time-ordered folds
+        instead of one shuffled split and refits the winner on all windows;
+        search=True additionally tunes the forests with successive halving.
+        """
+        print("Training models...")
+        self.training_report = {}
+        
+        for data_type in ('ground', 'satellite'):
+            data = getattr(self, f'{data_type}_data')
+            if data is not None:
+                print(f"Training {data_type} data model...")
+                with self.profiler.stage(f'train_{data_type}'):
+                    report = self._train_data_type(data_type, data, n_jobs, cv, n_splits, search)
+                if report is not None:
+                    self.training_report[data_type] = report
+                    print(f"Best {data_type} model: {report['best_model']} with R² = {report['best_r2']:.4f}")
         
-        return np.array(features), np.array(targets)
+        return self.training_report
     
-    def train_models(self):
-        """Train models for both ground and satellite data"""
-        print("Training models...")
+    def _train_data_type(self, data_type, data, n_jobs, cv=None, n_splits=5, search=False):
+        """Fit every candidate on one data source, keep the best and publish it"""
+        train_start = start = time.perf_counter()
+        with self.profiler.stage('windows'):
+            X, y = self.prepare_7day_prediction_data(data, 'so2')
+        window_seconds = time.perf_counter() - start
+        if len(X) == 0:
+            return None
         
-        # Train ground data model
-        if self.ground_data is not None:
-            print("Training ground data model...")
-            X_ground, y_ground = self.prepare_7day_prediction_data(self.ground_data, 'so2')
-            
-            if len(X_ground) > 0:
-                # Scale features
-                X_ground_scaled = self.ground_scaler.fit_transform(X_ground)
-                
-                # Split data
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X_ground_scaled, y_ground, test_size=0.2, random_state=42
-                )
-                
-                # Train multiple models and select the best
-                models = {
-                    'RandomForest': RandomForestRegressor(n_estimators=100, random_state=42),
-                    'GradientBoosting': GradientBoostingRegressor(n_estimators=100, random_state=42),
-                    'LinearRegression': LinearRegression()
-                }
-                
-                best_model = None
-                best_score = -np.inf
-                best_name = ""
-                
-                for name, model in models.items():
-                    model.fit(X_train, y_train)
-                    y_pred = model.predict(X_test)
-                    r2 = r2_score(y_test, y_pred)
-                    
-                    print(f"{name} - R² Score: {r2:.4f}")
-                    
-                    if r2 > best_score:
-                        best_score = r2
-                        best_model = model
-                        best_name = name
-                
-                self.ground_model = best_model
-                print(f"Best ground model: {best_name} with R² = {best_score:.4f}")
-                
-                # Save the model and scaler
-                joblib.dump(self.ground_model, 'ground_model.pkl')
-                joblib.dump(self.ground_scaler, 'ground_scaler.pkl')
-        
-        # Train satellite data model
-        if self.satellite_data is not None:
-            print("Training satellite data model...")
-            X_satellite, y_satellite = self.prepare_7day_prediction_data(self.satellite_data, 'so2')
+        # Scale features
+        scaler = getattr(self, f'{data_type}_scaler')
+        start = time.perf_counter()
+        with self.profiler.stage('scale'):
+            X_scaled = scaler.fit_transform(X)
+        timings = {'windows': window_seconds, 'scale': time.perf_counter() - start}
+        
+        report = {
+            'n_samples': int(len(X)),
+            'n_features': int(X.shape[1]),
+            'window_seconds': window_seconds
+        }
+        
+        splitter = time_series_splitter(len(X), cv, n_splits) if cv else None
+        if cv and splitter is None:
+            print(f"Too few windows ({len(X)}) for time-series CV, using a random split")
+        
+        start = time.perf_counter()
+        with self.profiler.stage('select'):
+            if splitter is not None:
+                cv_results = self._select_time_series(X_scaled, y, splitter, n_jobs, search)
+                cv_results['mode'] = cv
+                report['selection'] = f'{cv}_cv'
+                report['models'] = cv_results['models']
+            else:
+                report['selection'] = 'holdout'
+                fitted, report['models'] = self._select_holdout(X_scaled, y, n_jobs)
             
-            if len(X_satellite) > 0:
-                # Scale features
-                X_satellite_scaled = self.satellite_scaler.fit_transform(X_satellite)
-                
-                # Split data
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X_satellite_scaled, y_satellite, test_size=0.2, random_state=42
-                )
-                
-                # Train multiple models and select the best
-                models = {
-                    'RandomForest': RandomForestRegressor(n_estimators=100, random_state=42),
-                    'GradientBoosting': GradientBoostingRegressor(n_estimators=100, random_state=42),
-                    'LinearRegression': LinearRegression()
-                }
-                
-                best_model = None
-                best_score = -np.inf
-                best_name = ""
-                
-                for name, model in models.items():
-                    model.fit(X_train, y_train)
-                    y_pred = model.predict(X_test)
-                    r2 = r2_score(y_test, y_pred)
-                    
-                    print(f"{name} - R² Score: {r2:.4f}")
-                    
-                    if r2 > best_score:
-                        best_score = r2
-                        best_model = model
-                        best_name = name
-                
-                self.satellite_model = best_model
-                print(f"Best satellite model: {best_name} with R² = {best_score:.4f}")
-                
-                # Save the model and scaler
-                joblib.dump(self.satellite_model, 'satellite_model.pkl')
-                joblib.dump(self.satellite_scaler, 'satellite_scaler.pkl')
+            # Fits run in worker processes, so record the times they measured
+            for name, scores in report['models'].items():
+                self.profiler.record(f'fit_{name}', wall_seconds=scores['fit_seconds'],
+                                     predict_seconds=scores['predict_seconds'])
+        timings['select'] = time.perf_counter() - start
+        timings['fit'] = {name: scores['fit_seconds'] for name, scores in report['models'].items()}
+        
+        best_name = max(report['models'], key=lambda name: report['models'][name]['r2'])
+        report['best_model'] = best_name
+        report['best_r2'] = report['models'][best_name]['r2']
+        
+        if splitter is not None:
+            # Refit the winner on every window with its tuned parameters
+            params = report['models'][best_name].get('best_params', {})
+            start = time.perf_counter()
+            with self.profiler.stage('refit'):
+                best_model = candidate_models(n_jobs)[best_name].set_params(**params).fit(X_scaled, y)
+            timings['refit'] = time.perf_counter() - start
+        else:
+            best_model = fitted[best_name]
+        
+        setattr(self, f'{data_type}_model', best_model)
+        
+        # Publish the model, scaler and training report as one bundle, the
+        # base version later incremental updates build on
+        timings['total'] = time.perf_counter() - train_start
+        info = {'method': 'full', 'n_windows': int(len(X))}
+        if splitter is not None:
+            info['cv_results'] = cv_results
+        with self.profiler.stage('save'):
+            data = data.sort_values('date')
+            metadata = self.store.publish(
+                data_type, best_model, scaler, context=data.tail(CONTEXT_ROWS),
+                schema={'features': multi_output_feature_names(['so2']),
+                        'targets': [f'so2_next_{PREDICTION_DAYS}d_mean']},
+                metrics=report, timings=timings, data=data_fingerprint(data), info=info,
+                compress=self.compress
+            )
+        report['version'] = metadata['version']
+        
+        return report
+    
+    def _select_holdout(self, X, y, n_jobs):
+        """Score candidates on one shuffled 80/20 split"""
+        # Split data
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+        
+        # Arrays above max_nbytes are dumped once and memory mapped
+        # read-only by every worker instead of being pickled per task
+        outer, inner = split_jobs(len(candidate_models()), n_jobs)
+        models = candidate_models(inner)
+        results = Parallel(n_jobs=outer, max_nbytes='1M', mmap_mode='r')(
+            delayed(_fit_candidate)(model, X_train, y_train, X_test, y_test)
+            for model in models.values()
+        )
+        fitted = {name: model for name, (model, _) in zip(models, results)}
+        scores = {name: scores for name, (_, scores) in zip(models, results)}
+        return fitted, scores
+    
+    def _select_time_series(self, X, y, splitter, n_jobs, search):
+        """Score candidates on time-ordered folds, optionally tuning the forests
+        
+        StandardScaler is fitted on all windows before the folds; every
+        candidate is invariant to per-feature affine scaling, so this does
+        not leak fold statistics into the scores.
+        """
+        searched = {name: grid for name, grid in PARAM_GRIDS.items() if search}
+        plain = [name for name in candidate_models() if name not in searched]
+        outer, inner = split_jobs(len(plain), n_jobs)
+        # Searched forests stay single-threaded; the search parallelises them
+        models = candidate_models(1 if search else inner)
+        cv_results = {
+            'n_splits': splitter.get_n_splits(),
+            'gap': splitter.gap,
+            'max_train_size': splitter.max_train_size,
+            'models': {},
+            'search': {}
+        }
+        
+        results = Parallel(n_jobs=outer, max_nbytes='1M', mmap_mode='r')(
+            delayed(_cv_candidate)(models[name], X, y, splitter) for name in plain
+        )
+        cv_results['models'].update(zip(plain, results))
+        
+        for name, grid in searched.items():
+            summary, trials = _search_candidate(models[name], grid, X, y, splitter, n_jobs)
+            cv_results['models'][name] = summary
+            cv_results['search'][name] = trials
+        
+        return cv_results
+    
+    def update_models(self, new_data, extra_trees=20, max_trees=500):
+        """Fold newly arrived rows into the published models without retraining
+        
+        new_data maps data types to frames of new rows only, cleaned and
+        feature-engineered like process_ground_data/process_satellite_data
+        output. Windows are built from the stored context of the current
+        version plus the new rows, so only windows not seen before are used:
+        
+        - models with partial_fit (online regressors such as SGDRegressor)
+          update the scaler with StandardScaler.partial_fit and then the
+          model;
+        - forests and gradient boosting are warm-started with extra_trees
+          more trees or stages fitted on the new windows. The scaler is kept
+          as is, because the existing trees split on the scaled values it
+          produces. Forests drop their oldest trees beyond max_trees, so
+          they track recent data instead of growing without bound.
+        
+        Other models (LinearRegression) need a full train_models run. Each
+        update is published as a new bundle version, which the backend
+        registry picks up. Returns {data_type: bundle metadata}.
+        """
+        print("Updating models incrementally...")
+        updates = {}
+        for data_type, frame in new_data.items():
+            with self.profiler.stage(f'update_{data_type}'):
+                metadata = self._update_data_type(data_type, frame, extra_trees, max_trees)
+            if metadata is not None:
+                updates[data_type] = metadata
+                print(f"{data_type} model updated to version {metadata['version']} "
+                      f"({metadata['info']['method']}, {metadata['info']['n_windows']} new windows)")
+        return updates
+    
+    def _update_data_type(self, data_type, frame, extra_trees, max_trees):
+        """Update one published model with the windows completed by frame"""
+        base = self.store.load(data_type)
+        if base is None or base.context is None:
+            print(f"No published {data_type} model to update, run a full training first")
+            return None
+        previous, model, scaler, context = base
+        
+        data = pd.concat([context, frame], ignore_index=True).sort_values('date')
+        with self.profiler.stage('windows'):
+            X, y = build_window_features(data)
+        
+        start = time.perf_counter()
+        if len(X) == 0:
+            method = 'context_only'
+        elif hasattr(model, 'partial_fit'):
+            scaler.partial_fit(X)
+            model.partial_fit(scaler.transform(X), y)
+            method = 'partial_fit'
+        elif isinstance(model, (RandomForestRegressor, GradientBoostingRegressor)):
+            n_fitted = len(model.estimators_)
+            model.set_params(warm_start=True, n_estimators=n_fitted + extra_trees)
+            with self.profiler.stage('warm_start'):
+                model.fit(scaler.transform(X), y)
+            if isinstance(model, RandomForestRegressor) and len(model.estimators_) > max_trees:
+                model.estimators_ = model.estimators_[-max_trees:]
+                model.n_estimators = max_trees
+            model.set_params(warm_start=False)
+            method = 'warm_start'
+        else:
+            print(f"{type(model).__name__} cannot be updated incrementally, "
+                  f"run a full training for {data_type}")
+            return None
+        
+        setattr(self, f'{data_type}_model', model)
+        setattr(self, f'{data_type}_scaler', scaler)
+        info = {
+            'method': method,
+            'base_version': previous['version'],
+            'n_windows': int(len(X))
+        }
+        # Metrics stay those of the full training the updates build on
+        with self.profiler.stage('save'):
+            return self.store.publish(
+                data_type, model, scaler, context=data.tail(CONTEXT_ROWS),
+                schema=previous['schema'], metrics=previous['metrics'],
+                timings={'update': time.perf_counter() - start}, data=data_fingerprint(frame),
+                info=info, compress=self.compress
+            )
+    
+    def train_multi_output_models(self, n_jobs=-1, columns=None):
+        """Train one multi-output model per data source for every pollutant and day
+        
+        The window features of all pollutant columns present (columns,
+        default POLLUTANT_COLUMNS) are built in a single pass and each
+        candidate fits all pollutant x day-ahead targets at once. The
+        winner is published as a <type>_multi bundle whose schema names the
+        pollutants, horizons, features and targets.
+        """
+        print("Training multi-output models...")
+        self.multi_output_report = {}
+        
+        for data_type in ('ground', 'satellite'):
+            data = getattr(self, f'{data_type}_data')
+            if data is not None:
+                with self.profiler.stage(f'train_multi_{data_type}'):
+                    report = self._train_multi_output(data_type, data, n_jobs, columns)
+                if report is not None:
+                    self.multi_output_report[data_type] = report
+                    print(f"Best {data_type} multi-output model: {report['best_model']} "
+                          f"with mean R² = {report['best_r2']:.4f} over {report['n_targets']} targets")
+        
+        return self.multi_output_report
+    
+    def _train_multi_output(self, data_type, data, n_jobs, columns=None):
+        """Fit the multi-output candidates on one data source, keep the best and publish it"""
+        pollutants = [column for column in (columns or POLLUTANT_COLUMNS) if column in data.columns]
+        if not pollutants:
+            return None
+        
+        train_start = time.perf_counter()
+        data = data.sort_values('date')
+        with self.profiler.stage('windows'):
+            X, y = build_multi_window_features(data, pollutants)
+        if len(X) == 0:
+            return None
+        
+        scaler = StandardScaler()
+        with self.profiler.stage('scale'):
+            X_scaled = scaler.fit_transform(X)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X_scaled, y, test_size=0.2, random_state=42
+        )
+        
+        outer, inner = split_jobs(len(multi_output_models()), n_jobs)
+        models = multi_output_models(inner)
+        with self.profiler.stage('select'):
+            results = Parallel(n_jobs=outer, max_nbytes='1M', mmap_mode='r')(
+                delayed(_fit_candidate)(model, X_train, y_train, X_test, y_test)
+                for model in models.values()
+            )
+        fitted = {name: model for name, (model, _) in zip(models, results)}
+        scores = {name: scores for name, (_, scores) in zip(models, results)}
+        
+        targets = multi_output_target_names(pollutants)
+        best_name = max(scores, key=lambda name: scores[name]['r2'])
+        best_model = fitted[best_name]
+        per_target = r2_score(y_test, best_model.predict(X_test), multioutput='raw_values')
+        
+        schema = {
+            'pollutants': pollutants,
+            'horizons': list(range(1, PREDICTION_DAYS + 1)),
+            'window_size': WINDOW_SIZE,
+            'std_ddof': 1,
+            'features': multi_output_feature_names(pollutants),
+            'targets': targets
+        }
+        report = {
+            'n_samples': int(len(X)),
+            'n_features': int(X.shape[1]),
+            'n_targets': len(targets),
+            'models': scores,
+            'best_model': best_name,
+            'best_r2': scores[best_name]['r2'],
+            'target_r2': dict(zip(targets, per_target.tolist()))
+        }
+        self.multi_output[data_type] = (best_model, scaler, schema)
+        
+        with self.profiler.stage('save'):
+            metadata = self.store.publish(
+                f'{data_type}_multi', best_model, scaler, schema=schema, metrics=report,
+                timings={'fit': {name: scores[name]['fit_seconds'] for name in scores},
+                         'total': time.perf_counter() - train_start},
+                data=data_fingerprint(data, pollutants), info={'method': 'full'},
+                compress=self.compress
+            )
+        report['version'] = metadata['version']
+        
+        return report
+    
+    def predict_multi_output(self, data_type='ground'):
+        """{pollutant: [day 1, ..., day 7]} from the last window of data"""
+        data = getattr(self, f'{data_type}_data', None)
+        if data is None or data_type not in self.multi_output:
+            return None
+        model, scaler, schema = self.multi_output[data_type]
+        
+        window = data.sort_values('date').tail(schema['window_size'])
+        feature_vector = []
+        for column in schema['pollutants']:
+            values = window[column]
+            feature_vector.extend([values.mean(), values.std(), values.min(), values.max(),
+                                   values.median()])
+        feature_vector.extend(window.iloc[-1][TIME_FEATURE_COLUMNS].to_numpy(dtype=np.float64))
+        
+        prediction = model.predict(scaler.transform(np.array([feature_vector])))[0]
+        days = len(schema['horizons'])
+        return {
+            column: prediction[j * days:(j + 1) * days].tolist()
+            for j, column in enumerate(schema['pollutants'])
+        }
     
     def predict_next_7_days(self, data_type='ground'):
         """Predict next 7 days using the last 7 days of data"""
@@ -359,14 +1134,74 @@ class AirQualityDataProcessor:
         return prediction
 
 def main():
-    processor = AirQualityDataProcessor()
+    parser = argparse.ArgumentParser(description="Process air quality data and train 7-day SO2 models")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes used to read satellite granules (-1 for all cores)")
+    parser.add_argument('--cache-dir', default=None,
+                        help="directory for the processed-frame cache (disabled when omitted)")
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help="processes used to fit candidate models (-1 for all cores)")
+    parser.add_argument('--cv', choices=['expanding', 'sliding'], default=None,
+                        help="select models on time-ordered CV folds instead of a random split")
+    parser.add_argument('--cv-splits', type=int, default=5)
+    parser.add_argument('--search', action='store_true',
+                        help="tune the forests with successive halving (requires --cv)")
+    parser.add_argument('--multi-output', action='store_true',
+                        help="train multi-output models for every pollutant and day ahead "
+                             "instead of the single 7-day SO2 average")
+    parser.add_argument('--update-ground', metavar='CSV', default=None,
+                        help="fold the new rows in CSV into the published ground model "
+                             "instead of retraining")
+    parser.add_argument('--update-satellite', metavar='DIR', default=None,
+                        help="fold the new granules in DIR into the published satellite model "
+                             "instead of retraining")
+    parser.add_argument('--extra-trees', type=int, default=20,
+                        help="trees added to a forest per incremental update")
+    parser.add_argument('--model-dir', default='.',
+                        help="directory of the model manifest and artifacts/ bundles")
+    parser.add_argument('--compress', type=int, choices=range(10), default=0, metavar='LEVEL',
+                        help="zlib level for bundle pickles; 0 keeps them memory-mappable")
+    parser.add_argument('--profile', metavar='REPORT', default=None,
+                        help="time every pipeline stage and write a JSON report to REPORT")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="also trace Python allocations per stage (slower)")
+    parser.add_argument('--profile-dir', default=None,
+                        help="also dump a cProfile .prof file per stage into this directory")
+    args = parser.parse_args()
+    if args.search and not args.cv:
+        parser.error("--search requires --cv")
+    
+    profiler = StageProfiler(enabled=bool(args.profile or args.profile_dir),
+                             trace_memory=args.profile_memory,
+                             cprofile_dir=args.profile_dir)
+    processor = AirQualityDataProcessor(cache_dir=args.cache_dir, profiler=profiler,
+                                        model_dir=args.model_dir, compress=args.compress)
+    
+    if args.update_ground or args.update_satellite:
+        new_data = {}
+        if args.update_ground:
+            with profiler.stage('ground'):
+                new_data['ground'] = processor.process_ground_data(args.update_ground)
+        if args.update_satellite:
+            with profiler.stage('satellite'):
+                new_data['satellite'] = processor.process_satellite_data(
+                    args.update_satellite, workers=args.workers)
+        new_data = {data_type: df for data_type, df in new_data.items() if df is not None}
+        with profiler.stage('update'):
+            processor.update_models(new_data, extra_trees=args.extra_trees)
+        if profiler.enabled:
+            print(profiler.summary())
+            if args.profile:
+                profiler.write_report(args.profile)
+        return
     
     # Process ground data (assuming you have a CSV file)
     # You'll need to provide the path to your ground sensor CSV file
     ground_csv_path = "ground_sensor_data.csv"  # Update this path
     
     if os.path.exists(ground_csv_path):
-        processor.process_ground_data(ground_csv_path)
+        with profiler.stage('ground'):
+            processor.process_ground_data(ground_csv_path)
     else:
         print("Ground sensor data file not found. Please provide the correct path.")
     
@@ -374,12 +1209,22 @@ def main():
     satellite_data_path = "data/NASAdata"  # Update this path
     
     if os.path.exists(satellite_data_path):
-        processor.process_satellite_data(satellite_data_path)
+        with profiler.stage('satellite'):
+            processor.process_satellite_data(satellite_data_path, workers=args.workers)
     else:
         print("Satellite data directory not found. Please provide the correct path.")
     
     # Train models
-    processor.train_models()
+    with profiler.stage('train'):
+        if args.multi_output:
+            processor.train_multi_output_models(n_jobs=args.jobs)
+        else:
+            processor.train_models(n_jobs=args.jobs, cv=args.cv, n_splits=args.cv_splits,
+                                   search=args.search)
+    
+    for data_type in processor.multi_output:
+        for pollutant, days in processor.predict_multi_output(data_type).items():
+            print(f"{data_type} {pollutant} next 7 days: " + ", ".join(f"{v:.3f}" for v in days))
     
     # Make predictions
     if processor.ground_model is not None:
@@ -389,6 +1234,12 @@ def main():
     if processor.satellite_model is not None:
         satellite_prediction = processor.predict_next_7_days('satellite')
         print(f"Satellite data prediction for next 7 days: {satellite_prediction:.4f}")
+    
+    if profiler.enabled:
+        print(profiler.summary())
+        if args.profile:
+            profiler.write_report(args.profile)
+            print(f"Profile report written to {args.profile}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,185 @@
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """High-water resident set size of this process in bytes, or None where unknown"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+def _children_cpu():
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class StageProfiler:
+    """Wall time, CPU time and memory of named pipeline stages.
+
+    Stages nest: a stage opened inside another is reported as
+    'outer/inner'. Every stage records wall and CPU seconds, CPU seconds
+    of reaped child processes, the change in current RSS and the process
+    peak RSS when it ended (a high-water mark, so it only ever grows).
+    With trace_memory the peak of Python allocations inside the stage is
+    measured with tracemalloc, which slows allocation-heavy code down
+    noticeably. With cprofile_dir each stage is profiled with cProfile and
+    dumped to <index>_<stage>.prof; a parent's profile excludes the time
+    spent in its child stages.
+
+    Disabled profilers turn stage() into a no-op so the pipeline can be
+    instrumented unconditionally.
+    """
+
+    def __init__(self, enabled=True, trace_memory=False, cprofile_dir=None):
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.cprofile_dir = cprofile_dir if enabled else None
+        self.stages = []
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._stack = []
+        self._start = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if self.cprofile_dir:
+            os.makedirs(self.cprofile_dir, exist_ok=True)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name):
+        """Context manager measuring the block as stage name"""
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name):
+        parent = self._stack[-1] if self._stack else None
+        path = f"{parent['name']}/{name}" if parent else name
+        entry = {'name': path, 'depth': len(self._stack)}
+        index = len(self.stages)
+        self.stages.append(entry)
+
+        if parent is not None:
+            self._pause(parent)
+        frame = {'name': path, 'entry': entry, 'traced_peak': 0, 'profile': None}
+        if self.trace_memory:
+            frame['traced_start'] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        if self.cprofile_dir:
+            frame['profile'] = cProfile.Profile()
+        self._stack.append(frame)
+
+        rss_start = current_rss()
+        children_start = _children_cpu()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if frame['profile'] is not None:
+            frame['profile'].enable()
+        try:
+            yield entry
+        finally:
+            if frame['profile'] is not None:
+                frame['profile'].disable()
+            entry['wall_seconds'] = time.perf_counter() - wall_start
+            entry['cpu_seconds'] = time.process_time() - cpu_start
+            entry['children_cpu_seconds'] = _children_cpu() - children_start
+            rss_end = current_rss()
+            if rss_start is not None and rss_end is not None:
+                entry['rss_delta_bytes'] = rss_end - rss_start
+            entry['peak_rss_bytes'] = peak_rss()
+
+            self._stack.pop()
+            if self.trace_memory:
+                peak = max(frame['traced_peak'], tracemalloc.get_traced_memory()[1])
+                entry['traced_peak_bytes'] = peak - frame['traced_start']
+            if frame['profile'] is not None:
+                filename = f"{index:02d}_{path.replace('/', '.')}.prof"
+                entry['cprofile'] = os.path.join(self.cprofile_dir, filename)
+                frame['profile'].dump_stats(entry['cprofile'])
+            if parent is not None:
+                self._resume(parent, frame)
+
+    def _pause(self, frame):
+        # cProfile allows one active profiler per thread, and tracemalloc
+        # has a single peak counter; hand both over to the child stage
+        if frame['profile'] is not None:
+            frame['profile'].disable()
+        if self.trace_memory:
+            frame['traced_peak'] = max(frame['traced_peak'], tracemalloc.get_traced_memory()[1])
+
+    def _resume(self, frame, child):
+        if self.trace_memory:
+            frame['traced_peak'] = max(frame['traced_peak'],
+                                       child['traced_start'] + child['entry']['traced_peak_bytes'])
+            tracemalloc.reset_peak()
+        if frame['profile'] is not None:
+            frame['profile'].enable()
+
+    def record(self, name, **measurements):
+        """Add a stage measured elsewhere, such as a model fit run in a worker process"""
+        if not self.enabled:
+            return
+        parent = self._stack[-1]['name'] if self._stack else None
+        self.stages.append(dict({'name': f"{parent}/{name}" if parent else name,
+                                 'depth': len(self._stack), 'external': True}, **measurements))
+
+    def report(self):
+        """The run as a JSON-serialisable dict"""
+        return {
+            'started_at': self.started_at,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'trace_memory': self.trace_memory,
+            'wall_seconds': time.perf_counter() - self._start,
+            'cpu_seconds': time.process_time() - self._start_cpu,
+            'peak_rss_bytes': peak_rss(),
+            'stages': self.stages
+        }
+
+    def write_report(self, path):
+        report = self.report()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def summary(self):
+        """Human-readable table of the stages; peak MB is the tracemalloc peak when traced"""
+        lines = [f"{'stage':<48} {'wall s':>9} {'cpu s':>9} {'rss +MB':>9} {'peak MB':>9}"]
+        for entry in self.stages:
+            name = '  ' * entry['depth'] + entry['name'].rsplit('/', 1)[-1]
+            peak = entry.get('traced_peak_bytes', entry.get('peak_rss_bytes'))
+            lines.append(
+                f"{name:<48} {_cell(entry.get('wall_seconds'), '.3f')} "
+                f"{_cell(entry.get('cpu_seconds'), '.3f')} "
+                f"{_cell(entry.get('rss_delta_bytes'), '.1f', 2**20)} {_cell(peak, '.1f', 2**20)}"
+            )
+        return '\n'.join(lines)
+
+
+def _cell(value, spec, unit=1):
+    return f"{'-':>9}" if value is None else f"{value / unit:>9{spec}}"
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0
+_AGGREGATES = ('count', 'sum', 'sum_sq', 'min', 'max')
+
+
+class SpatialGrid:
+    """Fixed lat/lon grid holding per-cell daily SO2 aggregates.
+
+    Pixels are binned with vectorized floor division into cells of
+    cell_size degrees; cell ids are row * n_lon + col with row 0 at -90
+    latitude and col 0 at -180 longitude. Only populated (cell, day) pairs
+    are stored, sorted by cell and then day in flat arrays, with
+    cell_offsets marking where each populated cell's days start. That keeps
+    a year of global pixels down to a few arrays the size of the number of
+    cell-days, and turns per-location lookups into a binary search.
+    """
+
+    def __init__(self, cell_size=1.0):
+        self.cell_size = float(cell_size)
+        self.n_lat = int(np.ceil(180.0 / self.cell_size))
+        self.n_lon = int(np.ceil(360.0 / self.cell_size))
+
+        self.cells = np.empty(0, dtype=np.int64)
+        self.cell_offsets = np.zeros(1, dtype=np.int64)
+        self.days = np.empty(0, dtype=np.int32)
+        self.count = np.empty(0, dtype=np.int64)
+        self.sum = np.empty(0)
+        self.sum_sq = np.empty(0)
+        self.min = np.empty(0)
+        self.max = np.empty(0)
+
+    def cell_ids(self, latitude, longitude):
+        """Vectorized cell id for arrays of latitude/longitude"""
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        rows = np.clip(np.floor((latitude + 90.0) / self.cell_size), 0, self.n_lat - 1)
+        cols = np.floor(np.mod(longitude + 180.0, 360.0) / self.cell_size)
+        cols = np.clip(cols, 0, self.n_lon - 1)
+        return rows.astype(np.int64) * self.n_lon + cols.astype(np.int64)
+
+    def cell_centers(self, cell_ids):
+        """Latitude/longitude of the centre of each cell"""
+        rows, cols = np.divmod(np.asarray(cell_ids, dtype=np.int64), self.n_lon)
+        latitude = np.minimum(-90.0 + (rows + 0.5) * self.cell_size, 90.0)
+        longitude = np.minimum(-180.0 + (cols + 0.5) * self.cell_size, 180.0)
+        return latitude, longitude
+
+    def add(self, df, value_column='so2'):
+        """Fold a batch of pixels (latitude, longitude, date, value) into the aggregates
+
+        Batches can arrive in any order, e.g. straight from
+        stream_satellite_data; aggregates for cell-days already present are
+        merged rather than duplicated.
+        """
+        df = df.dropna(subset=[value_column, 'latitude', 'longitude'])
+        values = df[value_column].to_numpy(dtype=np.float64)
+        cells = self.cell_ids(df['latitude'].to_numpy(), df['longitude'].to_numpy())
+        days = df['date'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+        batch = self._reduce(cells, days, {
+            'count': np.ones(len(values), dtype=np.int64),
+            'sum': values,
+            'sum_sq': values * values,
+            'min': values,
+            'max': values
+        })
+
+        if len(self.days):
+            stored_cells = np.repeat(self.cells, np.diff(self.cell_offsets))
+            batch = self._reduce(
+                np.concatenate([stored_cells, batch[0]]),
+                np.concatenate([self.days.astype(np.int64), batch[1]]),
+                {name: np.concatenate([getattr(self, name), batch[2][name]]) for name in _AGGREGATES}
+            )
+
+        cells, days, aggregates = batch
+        self.cells, starts = np.unique(cells, return_index=True)
+        self.cell_offsets = np.append(starts, len(cells)).astype(np.int64)
+        self.days = days.astype(np.int32)
+        for name in _AGGREGATES:
+            setattr(self, name, aggregates[name])
+        return self
+
+    @staticmethod
+    def _reduce(cells, days, partials):
+        """Combine partial aggregates that share a (cell, day) key"""
+        order = np.lexsort((days, cells))
+        cells = cells[order]
+        days = days[order]
+        if len(cells) == 0:
+            return cells, days, {name: partials[name][order] for name in _AGGREGATES}
+
+        starts = np.flatnonzero(np.r_[True, (np.diff(cells) != 0) | (np.diff(days) != 0)])
+        reduced = {}
+        for name in _AGGREGATES:
+            values = partials[name][order]
+            if name == 'min':
+                reduced[name] = np.minimum.reduceat(values, starts)
+            elif name == 'max':
+                reduced[name] = np.maximum.reduceat(values, starts)
+            else:
+                reduced[name] = np.add.reduceat(values, starts)
+        return cells[starts], days[starts], reduced
+
+    def _cell_index(self, cell_id):
+        i = np.searchsorted(self.cells, cell_id)
+        if i == len(self.cells) or self.cells[i] != cell_id:
+            return None
+        return i
+
+    def _cell_slice(self, cell_id):
+        i = self._cell_index(cell_id)
+        if i is None:
+            return slice(0, 0)
+        return slice(self.cell_offsets[i], self.cell_offsets[i + 1])
+
+    def cells_in_bbox(self, lat_min, lat_max, lon_min, lon_max):
+        """Populated cells intersecting a bounding box
+
+        lon_min > lon_max is read as a box crossing the antimeridian.
+        """
+        rows, cols = np.divmod(self.cells, self.n_lon)
+        # Box edges are binned without wrapping so lon_max=180 stays in the
+        # last column
+        row_lo, row_hi = np.clip(np.floor((np.array([lat_min, lat_max]) + 90.0) / self.cell_size),
+                                 0, self.n_lat - 1)
+        col_lo, col_hi = np.clip(np.floor((np.array([lon_min, lon_max]) + 180.0) / self.cell_size),
+                                 0, self.n_lon - 1)
+
+        in_rows = (rows >= row_lo) & (rows <= row_hi)
+        if lon_min <= lon_max:
+            in_cols = (cols >= col_lo) & (cols <= col_hi)
+        else:
+            in_cols = (cols >= col_lo) | (cols <= col_hi)
+        return self.cells[in_rows & in_cols]
+
+    def nearest_cell(self, latitude, longitude):
+        """Cell containing a point if populated, else the populated cell whose
+        centre is closest along a great circle"""
+        if len(self.cells) == 0:
+            return None
+
+        cell = int(self.cell_ids(latitude, longitude))
+        if self._cell_index(cell) is not None:
+            return cell
+
+        lat, lon = np.radians(self.cell_centers(self.cells))
+        lat0, lon0 = np.radians(latitude), np.radians(longitude)
+        # Haversine; the argmin does not need the arcsin/radius scaling
+        h = (np.sin((lat - lat0) / 2) ** 2
+             + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2) ** 2)
+        return int(self.cells[np.argmin(h)])
+
+    def distance_km(self, cell_id, latitude, longitude):
+        """Great-circle distance from a point to a cell centre"""
+        lat, lon = np.radians(self.cell_centers(cell_id))
+        lat0, lon0 = np.radians(latitude), np.radians(longitude)
+        h = (np.sin((lat - lat0) / 2) ** 2
+             + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2) ** 2)
+        return float(2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h)))
+
+    def cell_frame(self, cell_id, value_column='so2'):
+        """Daily series for one cell: date, pixel count, mean/std/min/max
+
+        value_column holds the daily mean, so the frame can go straight into
+        build_window_features once time features are added.
+        """
+        s = self._cell_slice(cell_id)
+        count = self.count[s]
+        mean = self.sum[s] / count
+        # Sample variance from the running sums; clip rounding noise at 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = np.maximum(self.sum_sq[s] - count * mean * mean, 0) / (count - 1)
+        return pd.DataFrame({
+            'date': self.days[s].astype('datetime64[D]').astype('datetime64[ns]'),
+            'count': count,
+            value_column: mean,
+            f"{value_column}_std": np.where(count > 1, np.sqrt(var), np.nan),
+            f"{value_column}_min": self.min[s],
+            f"{value_column}_max": self.max[s]
+        })
+
+    def save(self, path):
+        """Write the grid to a single .npz file"""
+        np.savez(path, cell_size=self.cell_size, cells=self.cells,
+                 cell_offsets=self.cell_offsets, days=self.days,
+                 **{name: getattr(self, name) for name in _AGGREGATES})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            grid = cls(float(data['cell_size']))
+            for name in ('cells', 'cell_offsets', 'days') + _AGGREGATES:
+                setattr(grid, name, data[name])
+        return grid